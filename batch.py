@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""This is the NumPy batch module for working on many positions at once.
+
+PositionBatch keeps N positions as an (N, 12) array of uint64 piece
+bitboards, in the PIECE_SYMBOLS order used by Position, plus one array per
+FEN field.  Placements are decoded for the whole batch with array
+operations rather than one Position at a time, and the feature helpers
+return arrays ready to feed a model.  This module requires NumPy.
+"""
+import numpy
+
+from bitboard import PIECE_SYMBOLS
+from fen import CASTLING_SYMBOLS, EN_PASSANT_TARGETS, PACKED_CASTLING, Position
+
+# Placement digits become runs of spaces; rank separators stay so they can be checked
+DIGIT_EXPANSION = dict((ord(str(run)), ' ' * run) for run in range(1, 9))
+EXPANDED_LENGTH = 8 * 8 + 7
+SEPARATOR_COLUMNS = numpy.arange(8, EXPANDED_LENGTH, 9)
+SQUARE_COLUMNS = numpy.setdiff1d(numpy.arange(EXPANDED_LENGTH), SEPARATOR_COLUMNS)
+EMPTY = 12
+INVALID = 13
+# Maps each placement byte to its piece index, EMPTY for a space and INVALID otherwise
+PIECE_CODES = numpy.full(256, INVALID, dtype=numpy.uint8)
+PIECE_CODES[ord(' ')] = EMPTY
+for _index, _symbol in enumerate(PIECE_SYMBOLS):
+    PIECE_CODES[ord(_symbol)] = _index
+PIECE_VALUES = numpy.array([1, 3, 3, 5, 9, 0], dtype=numpy.int32)
+FILE_INDEX = dict((name, index) for index, name in enumerate('abcdefgh'))
+
+
+class PositionBatch(object):
+    """Many positions held as NumPy arrays"""
+
+    def __init__(self, bitboards, white_to_move, castling, en_passant_file,
+                 halfmove_clock, fullmove_number):
+        self.bitboards = bitboards
+        self.white_to_move = white_to_move
+        self.castling = castling
+        self.en_passant_file = en_passant_file
+        self.halfmove_clock = halfmove_clock
+        self.fullmove_number = fullmove_number
+
+
+    @classmethod
+    def from_fens(cls, fens):
+        """Build a batch from FEN strings, decoding every placement in one pass"""
+        fields = [fen.split(' ') for fen in fens]
+        for index, field in enumerate(fields):
+            if len(field) != 6:
+                raise ValueError('FEN %i must have six space-delimited fields: %s' % (index, fens[index]))
+        expanded = [field[0].translate(DIGIT_EXPANSION) for field in fields]
+        lengths = numpy.fromiter(map(len, expanded), dtype=numpy.int64, count=len(expanded))
+        bad = numpy.flatnonzero(lengths != EXPANDED_LENGTH)
+        if bad.size:
+            raise ValueError('Invalid FEN placement string in FEN %i: %s' % (bad[0], fens[bad[0]]))
+        try:
+            raw = numpy.frombuffer(''.join(expanded).encode('ascii'), dtype=numpy.uint8)
+        except UnicodeEncodeError:
+            raise ValueError('FEN placement strings must be ASCII')
+        raw = raw.reshape(len(fens), EXPANDED_LENGTH)
+        codes = PIECE_CODES[raw[:, SQUARE_COLUMNS]]
+        bad = numpy.flatnonzero((raw[:, SEPARATOR_COLUMNS] != ord('/')).any(axis=1) |
+                                (codes == INVALID).any(axis=1))
+        if bad.size:
+            raise ValueError('Invalid FEN placement string in FEN %i: %s' % (bad[0], fens[bad[0]]))
+        # The placement runs from a8 to h1, flip the ranks so square index a1 = 0
+        codes = codes.reshape(len(fens), 8, 8)[:, ::-1, :].reshape(len(fens), 1, 64)
+        planes = codes == numpy.arange(12, dtype=numpy.uint8).reshape(1, 12, 1)
+        bitboards = numpy.packbits(planes, axis=-1, bitorder='little').view('<u8').reshape(len(fens), 12)
+        white_to_move = numpy.array([field[1] == 'w' for field in fields], dtype=bool)
+        for index, field in enumerate(fields):
+            if field[1] not in ('w', 'b'):
+                raise ValueError('Invalid active color in FEN %i: %s' % (index, field[1]))
+            if not field[2] or not CASTLING_SYMBOLS.issuperset(field[2]):
+                raise ValueError('Invalid castling availability in FEN %i: %s' % (index, field[2]))
+            if field[3] not in EN_PASSANT_TARGETS:
+                raise ValueError('Invalid en passant target in FEN %i: %s' % (index, field[3]))
+        castling = numpy.array([sum(flag for right, flag in PACKED_CASTLING if right in field[2])
+                                for field in fields], dtype=numpy.uint8)
+        en_passant_file = numpy.array([FILE_INDEX[field[3][0]] if field[3] != '-' else -1
+                                       for field in fields], dtype=numpy.int8)
+        halfmove_clock = numpy.array([int(field[4]) for field in fields], dtype=numpy.int32)
+        fullmove_number = numpy.array([int(field[5]) for field in fields], dtype=numpy.int32)
+        return cls(bitboards, white_to_move, castling, en_passant_file,
+                   halfmove_clock, fullmove_number)
+
+
+    @classmethod
+    def from_positions(cls, positions):
+        """Build a batch from Position objects"""
+        positions = list(positions)
+        return cls(
+            numpy.array([position.bitboards for position in positions], dtype=numpy.uint64).reshape(len(positions), 12),
+            numpy.array([position.active == 'w' for position in positions], dtype=bool),
+            numpy.array([sum(flag for right, flag in PACKED_CASTLING if right in position.castling_availability)
+                         for position in positions], dtype=numpy.uint8),
+            numpy.array([FILE_INDEX[position.en_passant[0]] if position.en_passant != '-' else -1
+                         for position in positions], dtype=numpy.int8),
+            numpy.array([position.halfmove_clock for position in positions], dtype=numpy.int32),
+            numpy.array([position.fullmove_number for position in positions], dtype=numpy.int32),
+        )
+
+
+    def __len__(self):
+        return self.bitboards.shape[0]
+
+
+    def __getitem__(self, index):
+        """Return one position of the batch as a Position"""
+        active = 'w' if self.white_to_move[index] else 'b'
+        castling_availability = ''.join(right for right, flag in PACKED_CASTLING
+                                        if self.castling[index] & flag) or '-'
+        en_passant = '-'
+        if self.en_passant_file[index] >= 0:
+            en_passant = 'abcdefgh'[self.en_passant_file[index]] + ('6' if active == 'w' else '3')
+        return Position.from_record(([int(bitboard) for bitboard in self.bitboards[index]],
+                                     active, castling_availability, en_passant,
+                                     int(self.halfmove_clock[index]), int(self.fullmove_number[index])))
+
+
+    def piece_square_planes(self, dtype=numpy.uint8):
+        """Return an (N, 12, 8, 8) array of piece planes indexed [piece, rank, file], rank 1 first"""
+        octets = numpy.ascontiguousarray(self.bitboards, dtype='<u8').view(numpy.uint8)
+        bits = numpy.unpackbits(octets.reshape(len(self), 12, 8), axis=-1, bitorder='little')
+        return bits.reshape(len(self), 12, 8, 8).astype(dtype, copy=False)
+
+
+    def material_counts(self):
+        """Return an (N, 12) array with the number of each piece in each position"""
+        return self.piece_square_planes().sum(axis=(2, 3), dtype=numpy.int32)
+
+
+    def material_balance(self, values=PIECE_VALUES):
+        """Return the white minus black material of each position in pawn units"""
+        counts = self.material_counts()
+        return counts[:, :6] @ values - counts[:, 6:] @ values
+
+
+    def side_to_move(self):
+        """Return 1 where white is to move and -1 where black is"""
+        return numpy.where(self.white_to_move, 1, -1).astype(numpy.int8)
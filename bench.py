@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite for parsing, moving, FEN construction and rendering
+
+Runs each benchmark over the bundled corpus of positions taken from real
+games (bench_positions.fen), reports operations per second and the peak
+bytes allocated per operation, and compares them with a stored baseline.
+A benchmark slower or hungrier than the baseline by more than the
+tolerance is reported as a regression and makes the run fail. Baselines
+are machine specific: record one with --save before comparing.
+"""
+import argparse
+from collections import OrderedDict
+import json
+import os
+import time
+import tracemalloc
+
+from display import render_ascii_board
+from fen import Position
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CORPUS = os.path.join(HERE, 'bench_positions.fen')
+BASELINE = os.path.join(HERE, 'bench_baseline.json')
+# The share by which a result may be worse than the baseline before it counts as a regression
+TOLERANCE = 0.25
+# The number of times the whole suite is run before comparing, the best result of each benchmark counts
+REPEATS = 3
+
+
+def load_corpus(path=CORPUS):
+    """Return the FEN strings of a corpus file, one per non-blank line"""
+    with open(path) as corpus_file:
+        return [line.strip() for line in corpus_file if line.strip()]
+
+
+def _parse(fens):
+    return [(Position, (fen,)) for fen in fens]
+
+
+def _move(fens):
+    calls = []
+    for fen in fens:
+        position = Position(fen)
+        for move in position.legal_moves():
+            calls.append((position.move_piece, (move,)))
+            break
+    return calls
+
+
+def _construct_fen(fens):
+    # Positions rebuilt from records have no FEN string until one is constructed
+    return [(Position.from_record(Position(fen).to_record())._Position__construct_updated_fen, ())
+            for fen in fens]
+
+
+def _render(fens):
+    return [(render_ascii_board, (Position(fen).board,)) for fen in fens]
+
+
+def _round_trip(fens):
+    return [(_fen_of, (fen,)) for fen in fens]
+
+
+def _fen_of(fen):
+    # A Position rebuilt from its record has to construct its FEN from the bitboards
+    return Position.from_record(Position(fen).to_record()).fen
+
+
+# Each benchmark builds (function, arguments) calls from the corpus; one call is one operation
+BENCHMARKS = OrderedDict([
+    ('parse', _parse),
+    ('move_piece', _move),
+    ('construct_fen', _construct_fen),
+    ('render_ascii_board', _render),
+    ('fen_round_trip', _round_trip),
+])
+
+
+def run_benchmark(name, fens, rounds=5):
+    """Return ops/sec (best of rounds) and peak bytes allocated per op for one benchmark"""
+    setup = BENCHMARKS[name]
+    best = None
+    for _ in range(rounds):
+        # Calls are rebuilt every round so that no round sees state cached by another
+        calls = setup(fens)
+        start = time.perf_counter()
+        for function, arguments in calls:
+            function(*arguments)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    calls = setup(fens)
+    tracemalloc.start()
+    try:
+        peak_total = 0
+        for function, arguments in calls:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            function(*arguments)
+            peak_total += tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+    return {
+        'ops': len(calls),
+        'ops_per_sec': len(calls) / best if best else 0.0,
+        'bytes_per_op': peak_total / len(calls) if calls else 0.0,
+    }
+
+
+def run_benchmarks(fens, names=None, rounds=5, repeats=1):
+    """Run the named benchmarks (all by default) and return their best results by name.
+
+    The suite is run repeats times over and every benchmark keeps its
+    highest ops/sec and lowest bytes/op, so that one run slowed down by the
+    rest of the machine does not count as a regression.
+    """
+    results = OrderedDict()
+    for _ in range(repeats):
+        for name in (names or BENCHMARKS):
+            result = run_benchmark(name, fens, rounds)
+            if name in results:
+                best = results[name]
+                result['ops_per_sec'] = max(result['ops_per_sec'], best['ops_per_sec'])
+                result['bytes_per_op'] = min(result['bytes_per_op'], best['bytes_per_op'])
+            results[name] = result
+    return results
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Return a message for every result worse than its baseline by more than the tolerance"""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        expected = baseline[name]
+        if result['ops_per_sec'] < expected['ops_per_sec'] * (1 - tolerance):
+            regressions.append('%s: %.0f ops/sec is below the baseline of %.0f' %
+                               (name, result['ops_per_sec'], expected['ops_per_sec']))
+        if result['bytes_per_op'] > expected['bytes_per_op'] * (1 + tolerance):
+            regressions.append('%s: %.0f bytes/op is above the baseline of %.0f' %
+                               (name, result['bytes_per_op'], expected['bytes_per_op']))
+    return regressions
+
+
+def main(args):
+    fens = load_corpus(args.corpus)
+    results = run_benchmarks(fens, args.benchmark, args.rounds, args.repeats)
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+    for name, result in results.items():
+        change = ''
+        if name in baseline and baseline[name]['ops_per_sec']:
+            change = '%+6.1f%%' % (100.0 * (result['ops_per_sec'] / baseline[name]['ops_per_sec'] - 1))
+        print('%-20s %10.0f ops/sec %9.0f bytes/op %s' %
+              (name, result['ops_per_sec'], result['bytes_per_op'], change))
+    if args.save:
+        baseline.update(results)
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write('\n')
+        print('baseline saved to %s' % args.baseline)
+        return 0
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print('REGRESSION %s' % regression)
+    return len(regressions)
+
+
+def parse_args():
+    """Parse the arguments entered by the user. Run bench.py --help for more information."""
+    parser = argparse.ArgumentParser(
+        description='Benchmark parsing, moves, FEN construction and rendering against a stored baseline.'
+    )
+    parser.add_argument('-b', '--benchmark', action='append', choices=list(BENCHMARKS),
+        help='a benchmark to run, may be given more than once (default all)')
+    parser.add_argument('-r', '--rounds', type=int, default=5,
+        help='the number of timed rounds, the best one counts (default %(default)s)')
+    parser.add_argument('--repeats', type=int, default=REPEATS,
+        help='the number of times the suite is run, the best result of each benchmark counts (default %(default)s)')
+    parser.add_argument('--corpus', default=CORPUS,
+        help='the file of FEN strings to run over (default the bundled corpus)')
+    parser.add_argument('--baseline', default=BASELINE,
+        help='the baseline JSON file (default %(default)s)')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+        help='the share by which a result may be worse than the baseline (default %(default)s)')
+    parser.add_argument('--save', action='store_true',
+        help='store the results as the new baseline instead of comparing')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    raise SystemExit(1 if main(parse_args()) else 0)
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""This is the bitboard module holding the square and piece tables.
+
+Squares are numbered a1 = 0, b1 = 1, ... h8 = 63 so that bit ``n`` of a
+64-bit integer stands for square ``n``.
+"""
+
+PIECE_SYMBOLS = 'PNBRQKpnbrqk'
+PIECE_INDEX = dict((symbol, index) for index, symbol in enumerate(PIECE_SYMBOLS))
+
+WHITE = 0
+BLACK = 1
+
+FILE_NAMES = 'abcdefgh'
+RANK_NAMES = '12345678'
+SQUARE_NAMES = [file_name + rank_name for rank_name in RANK_NAMES for file_name in FILE_NAMES]
+SQUARE_INDEX = dict((name, index) for index, name in enumerate(SQUARE_NAMES))
+
+BB_EMPTY = 0
+BB_ALL = 0xFFFFFFFFFFFFFFFF
+BB_SQUARES = [1 << index for index in range(64)]
+BB_RANK_1 = 0xFF
+BB_RANK_8 = BB_RANK_1 << 56
+
+
+def square(file_index, rank_index):
+    """Return the square index for a zero based file and rank"""
+    return rank_index * 8 + file_index
+
+
+def scan(bitboard):
+    """Yield the index of every set square of a bitboard, lowest first"""
+    while bitboard:
+        lowest = bitboard & -bitboard
+        yield lowest.bit_length() - 1
+        bitboard ^= lowest
+
+
+def popcount(bitboard):
+    """Return the number of set squares of a bitboard"""
+    return bin(bitboard).count('1')
+
+
+def flip_vertical(bitboard):
+    """Return a bitboard mirrored rank for rank, a1 becoming a8"""
+    return int.from_bytes(bitboard.to_bytes(8, 'little'), 'big')
+
+
+def _step_attacks(square_index, deltas):
+    """Return the squares reached from a square by single (file, rank) steps"""
+    attacks = BB_EMPTY
+    file_index, rank_index = square_index % 8, square_index // 8
+    for file_delta, rank_delta in deltas:
+        to_file, to_rank = file_index + file_delta, rank_index + rank_delta
+        if 0 <= to_file < 8 and 0 <= to_rank < 8:
+            attacks |= BB_SQUARES[square(to_file, to_rank)]
+    return attacks
+
+
+def _ray(square_index, delta):
+    """Return the squares from a square to the board edge in one direction, nearest first"""
+    file_delta, rank_delta = delta
+    ray = []
+    to_file, to_rank = square_index % 8 + file_delta, square_index // 8 + rank_delta
+    while 0 <= to_file < 8 and 0 <= to_rank < 8:
+        ray.append(BB_SQUARES[square(to_file, to_rank)])
+        to_file, to_rank = to_file + file_delta, to_rank + rank_delta
+    return ray
+
+
+def _subsets(mask):
+    """Yield every subset of a bitboard using the carry-rippler trick"""
+    subset = BB_EMPTY
+    while True:
+        yield subset
+        subset = (subset - mask) & mask
+        if not subset:
+            return
+
+
+def _ray_table(ray):
+    """Return (occupancy, attacks) for every occupancy of a ray's relevant squares.
+
+    The last square of the ray is left out of the occupancy since a blocker
+    there does not shorten the ray. Occupancies are grouped by their nearest
+    blocker, which alone decides where the attacks stop.
+    """
+    entries = [(BB_EMPTY, sum(ray))]
+    attacks = BB_EMPTY
+    for index, blocker in enumerate(ray[:-1]):
+        attacks |= blocker
+        beyond = sum(ray[index + 1:-1])
+        entries.extend((blocker | subset, attacks) for subset in _subsets(beyond))
+    return entries
+
+
+def _sliding_table(deltas):
+    """Build the relevant masks and the occupancy keyed attack lookup for a slider.
+
+    The rays of a square do not overlap, so every entry is the union of one
+    entry from the table of each ray.
+    """
+    masks = []
+    tables = []
+    for square_index in range(64):
+        rays = [_ray(square_index, delta) for delta in deltas]
+        masks.append(sum(sum(ray[:-1]) for ray in rays))
+        table = dict(_ray_table(rays[0]))
+        for ray in rays[1:]:
+            ray_table = _ray_table(ray)
+            table = dict((occupancy | ray_occupancy, attacks | ray_attacks)
+                         for occupancy, attacks in table.items()
+                         for ray_occupancy, ray_attacks in ray_table)
+        tables.append(table)
+    return masks, tables
+
+
+KNIGHT_ATTACKS = [_step_attacks(index, [(1, 2), (2, 1), (2, -1), (1, -2),
+                                        (-1, -2), (-2, -1), (-2, 1), (-1, 2)])
+                  for index in range(64)]
+KING_ATTACKS = [_step_attacks(index, [(0, 1), (1, 1), (1, 0), (1, -1),
+                                      (0, -1), (-1, -1), (-1, 0), (-1, 1)])
+                for index in range(64)]
+# The squares a pawn of each colour standing on a square attacks
+PAWN_ATTACKS = [
+    [_step_attacks(index, [(-1, 1), (1, 1)]) for index in range(64)],
+    [_step_attacks(index, [(-1, -1), (1, -1)]) for index in range(64)],
+]
+DIAGONAL_MASKS, DIAGONAL_ATTACKS = _sliding_table([(1, 1), (1, -1), (-1, -1), (-1, 1)])
+RANK_MASKS, RANK_ATTACKS = _sliding_table([(1, 0), (-1, 0)])
+FILE_MASKS, FILE_ATTACKS = _sliding_table([(0, 1), (0, -1)])
+
+
+def bishop_attacks(square_index, occupied):
+    """Return the squares a bishop on a square attacks given the occupancy"""
+    return DIAGONAL_ATTACKS[square_index][occupied & DIAGONAL_MASKS[square_index]]
+
+
+def rook_attacks(square_index, occupied):
+    """Return the squares a rook on a square attacks given the occupancy"""
+    return (RANK_ATTACKS[square_index][occupied & RANK_MASKS[square_index]] |
+            FILE_ATTACKS[square_index][occupied & FILE_MASKS[square_index]])
+
+
+def queen_attacks(square_index, occupied):
+    """Return the squares a queen on a square attacks given the occupancy"""
+    return bishop_attacks(square_index, occupied) | rook_attacks(square_index, occupied)
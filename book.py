@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""This is the position book module.
+
+A book file is a sorted key file (see keyfile) of the Zobrist keys of its
+positions, with one fixed-size annotation per key: an evaluation in
+centipawns, a game count and a best move.  Books are written from FEN
+strings through Position and memory-mapped for reading, so any number of
+processes share one copy of the pages through the OS and a lookup is a
+binary search touching a handful of them.  lookup_many answers a whole
+batch of positions in one sorted pass.
+"""
+from collections import namedtuple
+import struct
+
+from bitboard import SQUARE_INDEX, SQUARE_NAMES
+from fen import Position
+from keyfile import SortedKeyFile, write_sorted_key_file
+
+ANNOTATION = struct.Struct('<iIH2x')
+MAGIC = b'FENBOOK1'
+# A packed move is from | to << 6 | promotion << 12, where 0 stands for no move
+PROMOTION_CODES = {None: 0, 'q': 1, 'r': 2, 'b': 3, 'n': 4}
+PROMOTION_PIECES = dict((code, piece) for piece, code in PROMOTION_CODES.items())
+
+BookEntry = namedtuple('BookEntry', ['evaluation', 'games', 'move'])
+
+
+def pack_move(move):
+    """Pack a UCI move (or None) into 16 bits"""
+    if move is None:
+        return 0
+    if len(move) not in (4, 5) or move[0:2] not in SQUARE_INDEX or move[2:4] not in SQUARE_INDEX or \
+            (move[4:] or None) not in PROMOTION_CODES:
+        raise ValueError('Invalid UCI move: %s' % move)
+    return SQUARE_INDEX[move[0:2]] | SQUARE_INDEX[move[2:4]] << 6 | PROMOTION_CODES[move[4:] or None] << 12
+
+
+def unpack_move(packed):
+    if not packed:
+        return None
+    return (SQUARE_NAMES[packed & 63] + SQUARE_NAMES[packed >> 6 & 63] +
+            (PROMOTION_PIECES[packed >> 12] or ''))
+
+
+def book_key(position):
+    """Return the book key of a Position, a FEN string or a key given as is"""
+    if isinstance(position, int):
+        return position
+    if isinstance(position, str):
+        position = Position(position)
+    return position.zobrist
+
+
+def write_book(path, entries):
+    """Write (FEN or Position, evaluation, games, best move) entries to a book file.
+
+    Entries for the same position are merged: their game counts are added
+    up and the evaluation and move of the entry with the most games kept.
+    Returns the number of positions written.
+    """
+    merged = {}
+    for position, evaluation, games, move in entries:
+        key = book_key(position)
+        pack_move(move)
+        if key in merged:
+            previous = merged[key]
+            best = previous if previous.games >= games else BookEntry(evaluation, games, move)
+            merged[key] = BookEntry(best.evaluation, previous.games + games, best.move)
+        else:
+            merged[key] = BookEntry(evaluation, games, move)
+    return write_sorted_key_file(path, MAGIC, dict(
+        (key, ANNOTATION.pack(entry.evaluation, entry.games, pack_move(entry.move)))
+        for key, entry in merged.items()))
+
+
+class PositionBook(object):
+    """A memory-mapped, read-only book of annotated positions"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = SortedKeyFile(path, MAGIC, ANNOTATION.size, 'position book')
+        self.count = self._file.count
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def __len__(self):
+        return self.count
+
+
+    def __contains__(self, position):
+        return self._file.find(book_key(position)) is not None
+
+
+    def get(self, position, default=None):
+        """Return the BookEntry of a Position, FEN string or key, or default when absent"""
+        index = self._file.find(book_key(position))
+        if index is None:
+            return default
+        return self.__entry(index)
+
+
+    def lookup_many(self, positions):
+        """Return the BookEntry (or None) of every position, answering the batch in key order"""
+        keys = [book_key(position) for position in positions]
+        entries = [None] * len(keys)
+        low = 0
+        for slot in sorted(range(len(keys)), key=keys.__getitem__):
+            index = self._file.find(keys[slot], low)
+            if index is None:
+                continue
+            entries[slot] = self.__entry(index)
+            low = index
+        return entries
+
+
+    def close(self):
+        self._file.close()
+
+
+    def __entry(self, index):
+        evaluation, games, move = ANNOTATION.unpack_from(self._file.map, self._file.value_offset(index))
+        return BookEntry(evaluation, games, unpack_move(move))
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""This is the cache module.
+
+LRUCache is a bounded mapping safe to share between threads.  Values are
+built by a factory on a miss, outside the lock so that slow factories do
+not serialize the other threads, and the least recently used entries are
+evicted once the cache holds more than maxsize of them.
+"""
+from collections import OrderedDict
+import threading
+
+
+class LRUCache(object):
+    """A thread-safe least recently used cache with hit, miss and eviction counters"""
+
+    def __init__(self, maxsize=1024):
+        if maxsize < 1:
+            raise ValueError('The cache size must be at least 1: %r' % maxsize)
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def __len__(self):
+        return len(self._entries)
+
+
+    def __contains__(self, key):
+        return key in self._entries
+
+
+    def get(self, key, factory):
+        """Return the value cached for key, building it with factory(key) on a miss"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        value = factory(key)
+        with self._lock:
+            # Another thread may have built the same value meanwhile, keep the first one
+            value = self._entries.setdefault(key, value)
+            self._entries.move_to_end(key)
+            self.__evict()
+        return value
+
+
+    def resize(self, maxsize):
+        """Change the bound, evicting entries at once if the cache shrinks"""
+        if maxsize < 1:
+            raise ValueError('The cache size must be at least 1: %r' % maxsize)
+        with self._lock:
+            self.maxsize = maxsize
+            self.__evict()
+
+
+    def clear(self):
+        """Drop every entry and reset the counters"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+
+    def stats(self):
+        """Return the counters, size and bound of the cache as a dictionary"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+            }
+
+
+    def __evict(self):
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
@@ -1,15 +1,124 @@
 # -*- coding: utf-8 -*-
-"""This is the display module to show a chess board"""
+"""This is the display module to show a chess board
+
+Every renderer takes the board as eight strings of eight squares, rank 8
+first and a space for an empty square, and fills a template built once at
+import time in a single formatting step.  render_many writes a whole run
+of boards to one writer.
+"""
+import io
+
+UNICODE_PIECES = dict(zip('PNBRQKpnbrqk ', '♙♘♗♖♕♔♟♞♝♜♛♚·'))
+UNICODE_TRANSLATION = str.maketrans(UNICODE_PIECES)
+HTML_PIECES = dict([(symbol, '&#%i;' % ord(UNICODE_PIECES[symbol])) for symbol in 'PNBRQKpnbrqk'] + [(' ', '')])
+SVG_SQUARE_SIZE = 45
+SVG_LIGHT = '#f0d9b5'
+SVG_DARK = '#b58863'
+
+
+def _ascii_template():
+    end_line = '  ---------------------------------\n'
+    intermediary_line = '  |-------------------------------|\n'
+    file_line = '    a   b   c   d   e   f   g   h\n'
+    ranks = ['%i |' % (8 - index) + ' %s |' * 8 + '\n' for index in range(8)]
+    return end_line + intermediary_line.join(ranks) + end_line + file_line
+
+
+def _unicode_template():
+    ranks = ['%i' % (8 - index) + ' %s' * 8 + '\n' for index in range(8)]
+    return ''.join(ranks) + '  a b c d e f g h\n'
+
+
+def _html_template():
+    rows = []
+    for index in range(8):
+        cells = ''.join('<td class="%s">%%s</td>' % ('light' if (index + file_index) % 2 == 0 else 'dark')
+                        for file_index in range(8))
+        rows.append('<tr><th>%i</th>%s</tr>' % (8 - index, cells))
+    files = ''.join('<th>%s</th>' % file_name for file_name in 'abcdefgh')
+    return '<table class="chess-board">%s<tr><th></th>%s</tr></table>\n' % (''.join(rows), files)
+
+
+def _svg_parts():
+    size = SVG_SQUARE_SIZE
+    head = ['<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 %i %i" width="%i" height="%i">'
+            % (8 * size, 8 * size, 8 * size, 8 * size)]
+    for index in range(64):
+        rank_index, file_index = divmod(index, 8)
+        head.append('<rect x="%i" y="%i" width="%i" height="%i" fill="%s"/>' % (
+            file_index * size, rank_index * size, size, size,
+            SVG_LIGHT if (rank_index + file_index) % 2 == 0 else SVG_DARK))
+    # One ready-made text element per square and piece
+    pieces = []
+    for index in range(64):
+        rank_index, file_index = divmod(index, 8)
+        pieces.append(dict(
+            (symbol, '<text x="%i" y="%i" font-size="%i" text-anchor="middle">%s</text>' % (
+                file_index * size + size // 2, rank_index * size + size * 4 // 5,
+                size * 4 // 5, UNICODE_PIECES[symbol]))
+            for symbol in 'PNBRQKpnbrqk'))
+    return ''.join(head), pieces, '</svg>\n'
+
+
+ASCII_TEMPLATE = _ascii_template()
+UNICODE_TEMPLATE = _unicode_template()
+HTML_TEMPLATE = _html_template()
+SVG_HEAD, SVG_PIECES, SVG_TAIL = _svg_parts()
+
 
 def render_ascii_board(matrix):
-    end_line_template = '  ---------------------------------\n'
-    intermediary_line_template = '  |-------------------------------|\n'
-    file_template = '    a   b   c   d   e   f   g   h\n'
-    rank_template = '%s | %s | %s | %s | %s | %s | %s | %s | %s |\n'
-    board = end_line_template
-    for index, rank in enumerate(matrix):
-        board += rank_template % tuple(str(8 - index) + rank)
-        if index < 7:
-            board += intermediary_line_template
-    board += end_line_template + file_template
-    return board
+    return ASCII_TEMPLATE % tuple(''.join(matrix))
+
+
+def render_unicode_board(matrix):
+    return UNICODE_TEMPLATE % tuple(''.join(matrix).translate(UNICODE_TRANSLATION))
+
+
+def render_compact_board(matrix):
+    return '\n'.join(matrix).replace(' ', '.') + '\n'
+
+
+def render_html_board(matrix):
+    return HTML_TEMPLATE % tuple(map(HTML_PIECES.__getitem__, ''.join(matrix)))
+
+
+def render_svg_board(matrix):
+    squares = ''.join(matrix)
+    return ''.join([SVG_HEAD] + [SVG_PIECES[index][square] for index, square in enumerate(squares)
+                                 if square != ' '] + [SVG_TAIL])
+
+
+# The renderers by name, for Position(renderer=...) and command line options
+RENDERERS = {
+    'ascii': render_ascii_board,
+    'unicode': render_unicode_board,
+    'compact': render_compact_board,
+    'html': render_html_board,
+    'svg': render_svg_board,
+}
+
+
+def get_renderer(renderer):
+    """Return a renderer given as a function or by its name in RENDERERS"""
+    if callable(renderer):
+        return renderer
+    if renderer not in RENDERERS:
+        raise ValueError('Unknown renderer %r, choose one of %s' % (renderer, ', '.join(sorted(RENDERERS))))
+    return RENDERERS[renderer]
+
+
+def render_many(boards, renderer=render_ascii_board, writer=None, separator='\n'):
+    """Render many boards (or Positions) one after another.
+
+    Each board is written to writer as soon as it is rendered; without a
+    writer the boards are gathered in one buffer and returned as a string.
+    """
+    renderer = get_renderer(renderer)
+    output = writer if writer is not None else io.StringIO()
+    write = output.write
+    for number, board in enumerate(boards):
+        if number and separator:
+            write(separator)
+        write(renderer(getattr(board, 'board', board)))
+    if writer is None:
+        return output.getvalue()
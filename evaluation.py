@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""This is the static evaluation module.
+
+A position is scored by material and by piece-square tables, one set for
+the middlegame and one for the endgame, blended by the game phase: the
+knights, bishops, rooks and queens left on the board. Every term is a sum
+over the pieces, so Position keeps them up to date as pieces move, are
+captured and are promoted instead of rescanning the board. The terms are
+kept together as a [material, midgame, endgame, phase] list, with scores
+in centipawns from White's point of view.
+"""
+from bitboard import scan
+
+# Centipawn values by piece type, in PIECE_SYMBOLS order for each color
+PIECE_VALUES = [100, 320, 330, 500, 900, 0]
+# What each piece type adds to the phase, which is MAX_PHASE with all of them on the board
+PHASE_WEIGHTS = [0, 1, 1, 2, 4, 0]
+MAX_PHASE = 24
+
+# Piece-square bonuses for White, written with rank 8 on top as a board is drawn
+PAWN_TABLE = (
+      0,   0,   0,   0,   0,   0,   0,   0,
+     50,  50,  50,  50,  50,  50,  50,  50,
+     10,  10,  20,  30,  30,  20,  10,  10,
+      5,   5,  10,  25,  25,  10,   5,   5,
+      0,   0,   0,  20,  20,   0,   0,   0,
+      5,  -5, -10,   0,   0, -10,  -5,   5,
+      5,  10,  10, -20, -20,  10,  10,   5,
+      0,   0,   0,   0,   0,   0,   0,   0,
+)
+KNIGHT_TABLE = (
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20,   0,   0,   0,   0, -20, -40,
+    -30,   0,  10,  15,  15,  10,   0, -30,
+    -30,   5,  15,  20,  20,  15,   5, -30,
+    -30,   0,  15,  20,  20,  15,   0, -30,
+    -30,   5,  10,  15,  15,  10,   5, -30,
+    -40, -20,   0,   5,   5,   0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50,
+)
+BISHOP_TABLE = (
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,  10,  10,   5,   0, -10,
+    -10,   5,   5,  10,  10,   5,   5, -10,
+    -10,   0,  10,  10,  10,  10,   0, -10,
+    -10,  10,  10,  10,  10,  10,  10, -10,
+    -10,   5,   0,   0,   0,   0,   5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20,
+)
+ROOK_TABLE = (
+      0,   0,   0,   0,   0,   0,   0,   0,
+      5,  10,  10,  10,  10,  10,  10,   5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+      0,   0,   0,   5,   5,   0,   0,   0,
+)
+QUEEN_TABLE = (
+    -20, -10, -10,  -5,  -5, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,   5,   5,   5,   0, -10,
+     -5,   0,   5,   5,   5,   5,   0,  -5,
+      0,   0,   5,   5,   5,   5,   0,  -5,
+    -10,   5,   5,   5,   5,   5,   0, -10,
+    -10,   0,   5,   0,   0,   0,   0, -10,
+    -20, -10, -10,  -5,  -5, -10, -10, -20,
+)
+KING_MIDGAME_TABLE = (
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+     20,  20,   0,   0,   0,   0,  20,  20,
+     20,  30,  10,   0,   0,  10,  30,  20,
+)
+KING_ENDGAME_TABLE = (
+    -50, -40, -30, -20, -20, -30, -40, -50,
+    -30, -20, -10,   0,   0, -10, -20, -30,
+    -30, -10,  20,  30,  30,  20, -10, -30,
+    -30, -10,  30,  40,  40,  30, -10, -30,
+    -30, -10,  30,  40,  40,  30, -10, -30,
+    -30, -10,  20,  30,  30,  20, -10, -30,
+    -30, -30,   0,   0,   0,   0, -30, -30,
+    -50, -30, -30, -30, -30, -30, -30, -50,
+)
+MIDGAME_PIECE_TABLES = [PAWN_TABLE, KNIGHT_TABLE, BISHOP_TABLE, ROOK_TABLE, QUEEN_TABLE, KING_MIDGAME_TABLE]
+ENDGAME_PIECE_TABLES = [PAWN_TABLE, KNIGHT_TABLE, BISHOP_TABLE, ROOK_TABLE, QUEEN_TABLE, KING_ENDGAME_TABLE]
+
+
+def _square_tables(piece_tables):
+    """Return the signed value plus bonus of every piece on every square, by piece index and square"""
+    tables = []
+    for sign, flip in ((1, 0), (-1, 56)):
+        for piece_type, table in enumerate(piece_tables):
+            # Row 0 of a drawn table is rank 8, and Black reads the table mirrored
+            tables.append([sign * (PIECE_VALUES[piece_type] + table[(square ^ 56) ^ flip])
+                           for square in range(64)])
+    return tables
+
+
+# Indexed by piece index and then square, White positive and Black negative
+MIDGAME_TABLES = _square_tables(MIDGAME_PIECE_TABLES)
+ENDGAME_TABLES = _square_tables(ENDGAME_PIECE_TABLES)
+PIECE_MATERIAL = PIECE_VALUES + [-value for value in PIECE_VALUES]
+PIECE_PHASES = PHASE_WEIGHTS * 2
+
+
+def evaluate_bitboards(bitboards):
+    """Return the [material, midgame, endgame, phase] terms of twelve piece bitboards"""
+    material = midgame = endgame = phase = 0
+    for piece_index, bitboard in enumerate(bitboards):
+        midgame_table = MIDGAME_TABLES[piece_index]
+        endgame_table = ENDGAME_TABLES[piece_index]
+        for square in scan(bitboard):
+            material += PIECE_MATERIAL[piece_index]
+            midgame += midgame_table[square]
+            endgame += endgame_table[square]
+            phase += PIECE_PHASES[piece_index]
+    return [material, midgame, endgame, phase]
+
+
+def add_piece(terms, piece_index, square):
+    """Update terms for a piece put on a square"""
+    terms[0] += PIECE_MATERIAL[piece_index]
+    terms[1] += MIDGAME_TABLES[piece_index][square]
+    terms[2] += ENDGAME_TABLES[piece_index][square]
+    terms[3] += PIECE_PHASES[piece_index]
+
+
+def remove_piece(terms, piece_index, square):
+    """Update terms for a piece taken off a square"""
+    terms[0] -= PIECE_MATERIAL[piece_index]
+    terms[1] -= MIDGAME_TABLES[piece_index][square]
+    terms[2] -= ENDGAME_TABLES[piece_index][square]
+    terms[3] -= PIECE_PHASES[piece_index]
+
+
+def tapered(midgame, endgame, phase):
+    """Blend the middlegame and endgame scores by the phase, rounding towards zero"""
+    phase = min(phase, MAX_PHASE)
+    score = midgame * phase + endgame * (MAX_PHASE - phase)
+    return score // MAX_PHASE if score >= 0 else -(-score // MAX_PHASE)
@@ -1,8 +1,87 @@
 # -*- coding: utf-8 -*-
 """This is the FEN notation parsing module."""
-import copy
+from collections import deque, namedtuple
+import itertools
 import re
-from display import render_ascii_board
+import struct
+
+from bitboard import (BB_EMPTY, BB_RANK_1, BB_RANK_8, BB_SQUARES, BLACK, FILE_NAMES,
+                      KING_ATTACKS, KNIGHT_ATTACKS, PAWN_ATTACKS, PIECE_INDEX,
+                      PIECE_SYMBOLS, RANK_NAMES, SQUARE_INDEX, SQUARE_NAMES, WHITE,
+                      bishop_attacks, flip_vertical, popcount, queen_attacks, rook_attacks, scan)
+from cache import LRUCache
+from display import get_renderer, render_ascii_board
+from evaluation import add_piece, evaluate_bitboards, remove_piece, tapered
+from zobrist import (BLACK_TO_MOVE_KEY, PIECE_KEYS, castling_key, en_passant_key,
+                     hash_position)
+
+ACTIVE_COLORS = ('w', 'b')
+CASTLING_SYMBOLS = frozenset('KQkq-')
+# The order of the pieces within a side of a material signature, most valuable first
+MATERIAL_ORDER = 'KQRBNP'
+DIGITS = frozenset('0123456789')
+EN_PASSANT_TARGETS = frozenset(['-'] + [file_name + rank_name
+                                        for file_name in FILE_NAMES for rank_name in '36'])
+# The number of empty squares each placement digit stands for
+EMPTY_RUNS = dict((str(run), run) for run in range(1, 9))
+# Maps placement digits to runs of spaces and drops the rank separators
+PLACEMENT_EXPANSION = dict([(ord(str(run)), ' ' * run) for run in range(1, 9)] + [(ord('/'), None)])
+# The rook corner squares and the castling right each one guards
+CASTLING_ROOK_SQUARES = {0: 'Q', 7: 'K', 56: 'q', 63: 'k'}
+# Per color: the right, king and rook squares, the squares that must be
+# empty and the squares the king passes, ending on its destination
+CASTLING_PATHS = [
+    [('K', 4, 7, BB_SQUARES[5] | BB_SQUARES[6], (4, 5, 6)),
+     ('Q', 4, 0, BB_SQUARES[1] | BB_SQUARES[2] | BB_SQUARES[3], (4, 3, 2))],
+    [('k', 60, 63, BB_SQUARES[61] | BB_SQUARES[62], (60, 61, 62)),
+     ('q', 60, 56, BB_SQUARES[57] | BB_SQUARES[58] | BB_SQUARES[59], (60, 59, 58))],
+]
+PROMOTION_PIECES = 'qrbn'
+# A move in standard algebraic notation, without check or annotation suffixes
+SAN_PATTERN = re.compile(r'^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$')
+# A move in long algebraic notation, such as Ng1-f3 or e7xd8=Q
+LAN_PATTERN = re.compile(r'^([NBRQK])?([a-h][1-8])[-x]([a-h][1-8])(?:=?([NBRQnbrq]))?$')
+# The king moves written as O-O and O-O-O
+SAN_CASTLING = {'O-O': (4, 6), 'O-O-O': (4, 2)}
+# The number of Positions Position.cached keeps by default
+POSITION_CACHE_SIZE = 4096
+# What Position.apply_moves returns
+REPLAY_EMITS = ('final', 'each', 'hashes')
+BB_RANK_2 = BB_RANK_1 << 8
+BB_RANK_7 = BB_RANK_8 >> 8
+BB_RANK_4 = BB_RANK_1 << 24
+BB_RANK_5 = BB_RANK_8 >> 24
+# The 32 byte packed position: occupancy, one nibble per occupied square
+# naming its piece, side and castling flags, en passant file + 1, the two
+# move counters and two reserved bytes
+PACKED_POSITION = struct.Struct('<Q16sBBHHH')
+PACKED_CASTLING = (('K', 2), ('Q', 4), ('k', 8), ('q', 16))
+
+
+class FENError(ValueError):
+    """A FEN string rejected by the parser, with the offset of the first bad character"""
+
+    def __init__(self, message, fen, offset):
+        super(FENError, self).__init__('%s (at offset %i of %r)' % (message, offset, fen))
+        self.fen = fen
+        self.offset = offset
+
+
+def _invalid_offset(field, allowed):
+    """Return the offset of the first character of field not in allowed, or None"""
+    if not field:
+        return 0
+    for offset, ch in enumerate(field):
+        if ch not in allowed:
+            return offset
+    return None
+
+
+def _black_is_stronger(white, black):
+    """Return whether Black's pieces come first in a material signature, as the Syzygy tables order them"""
+    return (len(white), [MATERIAL_ORDER.index(piece) for piece in black]) < \
+        (len(black), [MATERIAL_ORDER.index(piece) for piece in white])
+
 
 class Position(object):
     """A FEN position as parsed from the FEN argument string
@@ -27,171 +106,946 @@ class Position(object):
     1 | R | N | B | Q | K | B | N | R |
       ---------------------------------
     """
-    rank_translation = {
-        'a': 0,
-        'b': 1,
-        'c': 2,
-        'd': 3,
-        'e': 4,
-        'f': 5,
-        'g': 6,
-        'h': 7,
-    }
-    algebraic_translation = {
-        0: 'a',
-        1: 'b',
-        2: 'c',
-        3: 'd',
-        4: 'e',
-        5: 'f',
-        6: 'g',
-        7: 'h',
-    }
-
-    def __init__(self, fen, renderer=render_ascii_board):
-        """Initialize a Position instance from a FEN string"""
-        castle_validator = re.compile('^[KQkq-]+$')
-        en_passant_validator = re.compile('^[a-h1-8-]+$')
-        self.board = None
-        self.active = None
-        self.castling_availability = None
-        self.en_passant = None
-        self.halfmove_clock = None
-        self.fullmove_number = None
-        self.fen = fen
+    __slots__ = (
+        'bitboards', 'occupancy', 'occupied', 'active', 'castling_availability',
+        'en_passant', 'halfmove_clock', 'fullmove_number', '_fen', 'piece_moved',
+        'piece_captured', 'capture', '_board', '_from_square', '_to_square',
+        '_captured_square', '_promotion', '_stack', 'zobrist', '_rendered', '_frozen',
+        'renderer', '_attack_cache', '_history', '_repetitions', '_terms',
+    )
+
+    def __init__(self, fen, renderer=render_ascii_board, history=False):
+        """Initialize a Position instance from a FEN string.
+
+        renderer draws the board for str(); it is a function taking the
+        board view or the name of one in display.RENDERERS. With history
+        the Zobrist keys of the positions played through since the last
+        capture or pawn move are kept, for is_repetition and
+        can_claim_draw, and carried over to every Position played from
+        this one.
+        """
         if not fen or not isinstance(fen, str):
             raise ValueError('FEN must be a string with six space-delimited fields')
+        fields = fen.split(' ')
+        if len(fields) != 6:
+            offset = len(fen) if len(fields) < 6 else len(' '.join(fields[:6]))
+            raise FENError('FEN must be a string with six space-delimited fields', fen, offset)
+        (placement, active, castling_availability, en_passant,
+                halfmove_clock, fullmove_number) = fields
+        bitboards = self.__build_board(fen, placement)
+        offset = len(placement) + 1
+        if active not in ACTIVE_COLORS:
+            raise FENError('Invalid active color: %s' % active, fen, offset)
+        offset += len(active) + 1
+        invalid = _invalid_offset(castling_availability, CASTLING_SYMBOLS)
+        if invalid is not None:
+            raise FENError('Invalid castling availability: %s' % castling_availability, fen, offset + invalid)
+        offset += len(castling_availability) + 1
+        if en_passant not in EN_PASSANT_TARGETS:
+            raise FENError('Invalid en passant target: %s' % en_passant, fen, offset)
+        offset += len(en_passant) + 1
+        invalid = _invalid_offset(halfmove_clock, DIGITS)
+        if invalid is not None:
+            raise FENError('The half move clock is not an integer: %s' % halfmove_clock, fen, offset + invalid)
+        offset += len(halfmove_clock) + 1
+        invalid = _invalid_offset(fullmove_number, DIGITS)
+        if invalid is not None:
+            raise FENError('The full move number is not an integer: %s' % fullmove_number, fen, offset + invalid)
+        self.__initialize(fen, bitboards, active, castling_availability, en_passant,
+                          int(halfmove_clock), int(fullmove_number))
+        self.renderer = get_renderer(renderer)
+        if history:
+            self._history = []
+            self._repetitions = {}
+
+
+    @classmethod
+    def cached(cls, fen):
+        """Return a shared, frozen Position for a FEN from POSITION_CACHE.
+
+        The Position is parsed once and then handed to every caller asking
+        for the same FEN string, so it cannot be pushed on or have its
+        attributes set and its board is a tuple; move_piece and copy return
+        ordinary Positions. Resize the cache with
+        POSITION_CACHE.resize and read its counters with POSITION_CACHE.stats.
+        """
+        return POSITION_CACHE.get(fen, cls.__build_frozen)
+
+
+    @classmethod
+    def __build_frozen(cls, fen):
+        position = cls(fen)
+        position.bitboards = tuple(position.bitboards)
+        position.occupancy = tuple(position.occupancy)
+        position._frozen = True
+        position.__class__ = FrozenPosition
+        return position
+
+
+    @classmethod
+    def from_fen_fast(cls, fen):
+        """Build a Position from a trusted FEN string, skipping all validation"""
         (placement, active, castling_availability, en_passant,
-                halfmove_clock, fullmove_number) = self.fen.split(' ')
-        self.board = self.__build_board(placement)
-        if active in ('w', 'b'):
-            self.active = active
+                halfmove_clock, fullmove_number) = fen.split(' ')
+        bitboards = [BB_EMPTY] * 12
+        for index, ch in enumerate(placement.translate(PLACEMENT_EXPANSION)):
+            if ch != ' ':
+                # The expansion runs from a8 to h1 so flipping the rank bits gives the square
+                bitboards[PIECE_INDEX[ch]] |= BB_SQUARES[index ^ 56]
+        position = cls.__new__(cls)
+        position.__initialize(fen, bitboards, active, castling_availability, en_passant,
+                              int(halfmove_clock), int(fullmove_number))
+        return position
+
+
+    @classmethod
+    def from_record(cls, record):
+        """Build a Position from the tuple returned by to_record"""
+        (bitboards, active, castling_availability, en_passant,
+                halfmove_clock, fullmove_number) = record
+        position = cls.__new__(cls)
+        position.__initialize(None, list(bitboards), active, castling_availability,
+                              en_passant, halfmove_clock, fullmove_number)
+        return position
+
+
+    def to_record(self):
+        """Return the position as a compact tuple of bitboards and FEN fields"""
+        return (tuple(self.bitboards), self.active, self.castling_availability,
+                self.en_passant, self.halfmove_clock, self.fullmove_number)
+
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Build a Position from the 32 bytes returned by to_bytes"""
+        (occupied, pieces, flags, en_passant_file, halfmove_clock,
+                fullmove_number, reserved) = PACKED_POSITION.unpack(data)
+        codes = int.from_bytes(pieces, 'little')
+        bitboards = [BB_EMPTY] * 12
+        for index, occupied_square in enumerate(scan(occupied)):
+            piece = (codes >> 4 * index) & 0xF
+            if piece > 11:
+                raise ValueError('Invalid piece code %i in packed position' % piece)
+            bitboards[piece] |= BB_SQUARES[occupied_square]
+        active = 'b' if flags & 1 else 'w'
+        castling_availability = ''.join(right for right, flag in PACKED_CASTLING if flags & flag) or '-'
+        en_passant = '-'
+        if en_passant_file:
+            en_passant = FILE_NAMES[en_passant_file - 1] + ('3' if active == 'b' else '6')
+        return cls.from_record((bitboards, active, castling_availability, en_passant,
+                                halfmove_clock, fullmove_number))
+
+
+    def to_bytes(self):
+        """Pack the position into 32 bytes, see PACKED_POSITION for the layout"""
+        if popcount(self.occupied) > 32:
+            raise ValueError('Only positions with at most 32 pieces can be packed: %s' % self.fen)
+        if self.halfmove_clock > 0xFFFF or self.fullmove_number > 0xFFFF:
+            raise ValueError('Move counters too large to pack: %s' % self.fen)
+        piece_on = {}
+        for piece, bitboard in enumerate(self.bitboards):
+            for occupied_square in scan(bitboard):
+                piece_on[occupied_square] = piece
+        codes = 0
+        for index, occupied_square in enumerate(scan(self.occupied)):
+            codes |= piece_on[occupied_square] << 4 * index
+        flags = 1 if self.active == 'b' else 0
+        for right, flag in PACKED_CASTLING:
+            if right in self.castling_availability:
+                flags |= flag
+        en_passant_file = 0
+        if self.en_passant != '-':
+            en_passant_file = FILE_NAMES.index(self.en_passant[0]) + 1
+        return PACKED_POSITION.pack(self.occupied, codes.to_bytes(16, 'little'), flags,
+                                    en_passant_file, self.halfmove_clock, self.fullmove_number, 0)
+
+
+    def __initialize(self, fen, bitboards, active, castling_availability, en_passant,
+                     halfmove_clock, fullmove_number):
+        self.bitboards = bitboards
+        self.occupancy = [
+            bitboards[0] | bitboards[1] | bitboards[2] |
+            bitboards[3] | bitboards[4] | bitboards[5],
+            bitboards[6] | bitboards[7] | bitboards[8] |
+            bitboards[9] | bitboards[10] | bitboards[11],
+        ]
+        self.occupied = self.occupancy[WHITE] | self.occupancy[BLACK]
+        self.active = active
+        self.castling_availability = castling_availability
+        self.en_passant = en_passant
+        self.halfmove_clock = halfmove_clock
+        self.fullmove_number = fullmove_number
+        self._fen = fen
+        self.zobrist = hash_position(bitboards, active, castling_availability, en_passant)
+        self.piece_moved = None
+        self.piece_captured = None
+        self.capture = None
+        self._board = None
+        self._stack = None
+        self._rendered = None
+        self._frozen = False
+        self.renderer = render_ascii_board
+        self._attack_cache = None
+        self._history = None
+        self._repetitions = None
+        self._terms = None
+
+
+    @staticmethod
+    def __build_board(fen, placement):
+        """Validate and decode a FEN placement string in a single scan"""
+        bitboards = [BB_EMPTY] * 12
+        # Squares are filled from a8 towards h1, one rank of eight at a time
+        rank_end = 64
+        index = 56
+        for offset, ch in enumerate(placement):
+            piece = PIECE_INDEX.get(ch)
+            if piece is not None:
+                if index >= rank_end:
+                    raise FENError('Too many squares in rank of FEN placement string: %s' % placement, fen, offset)
+                bitboards[piece] |= BB_SQUARES[index]
+                index += 1
+            elif ch in EMPTY_RUNS:
+                index += EMPTY_RUNS[ch]
+                if index > rank_end:
+                    raise FENError('Too many squares in rank of FEN placement string: %s' % placement, fen, offset)
+            elif ch == '/':
+                if index != rank_end or rank_end == 8:
+                    raise FENError('Invalid FEN placement string: %s' % placement, fen, offset)
+                rank_end -= 8
+                index = rank_end - 8
+            else:
+                raise FENError('Invalid FEN placement string: %s' % placement, fen, offset)
+        if index != rank_end or rank_end != 8:
+            raise FENError('Invalid FEN placement string: %s' % placement, fen, len(placement))
+        return bitboards
+
+
+    @property
+    def board(self):
+        """The placement as eight strings of eight characters, rank 8 first"""
+        if self._board is None:
+            squares = self.__mailbox()
+            self._board = [''.join(squares[rank_index * 8:rank_index * 8 + 8])
+                           for rank_index in range(7, -1, -1)]
+        return self._board
+
+
+    @property
+    def fen(self):
+        """The FEN string of the position, only generated when first asked for"""
+        if self._fen is None:
+            self.__construct_updated_fen()
+        return self._fen
+
+
+    @property
+    def material(self):
+        """The material balance in centipawns, White minus Black"""
+        return self.__terms()[0]
+
+
+    @property
+    def midgame_score(self):
+        """Material plus middlegame piece-square bonuses, White minus Black"""
+        return self.__terms()[1]
+
+
+    @property
+    def endgame_score(self):
+        """Material plus endgame piece-square bonuses, White minus Black"""
+        return self.__terms()[2]
+
+
+    @property
+    def phase(self):
+        """The game phase, from evaluation.MAX_PHASE with every piece on the board down to 0"""
+        return self.__terms()[3]
+
+
+    @property
+    def evaluation(self):
+        """The middlegame and endgame scores blended by the phase, in centipawns for White"""
+        terms = self.__terms()
+        return tapered(terms[1], terms[2], terms[3])
+
+
+    def __terms(self):
+        """Return the evaluation terms, scanning the board only the first time they are asked for.
+
+        From then on the move path updates them, and the Positions played
+        from this one inherit them.
+        """
+        if self._terms is None:
+            self._terms = evaluate_bitboards(self.bitboards)
+        return self._terms
+
+
+    @property
+    def material_signature(self):
+        """The Syzygy material key of the position such as KQvKR, stronger side first.
+
+        The side with more pieces, or with the same number and the most
+        valuable ones, is written first whatever its color, as the Syzygy
+        tables are named: a lone black queen against the white king is KQvK
+        just like a lone white one. is_mirrored_material tells them apart.
+        """
+        white, black = self.__material_sides()
+        if _black_is_stronger(white, black):
+            return '%sv%s' % (black, white)
+        return '%sv%s' % (white, black)
+
+
+    @property
+    def is_mirrored_material(self):
+        """Whether Black is the side listed first in material_signature"""
+        return _black_is_stronger(*self.__material_sides())
+
+
+    def __material_sides(self):
+        return (
+            ''.join(PIECE_SYMBOLS[index] * popcount(self.bitboards[index]) for index in (5, 4, 3, 2, 1, 0)),
+            ''.join(PIECE_SYMBOLS[index].upper() * popcount(self.bitboards[index]) for index in (11, 10, 9, 8, 7, 6)),
+        )
+
+
+    @property
+    def checkers(self):
+        """The bitboard of the pieces giving check to the side to move"""
+        cache = self.__attacks()
+        if 'checkers' not in cache:
+            us = WHITE if self.active == 'w' else BLACK
+            king = self.bitboards[6 * us + 5]
+            cache['checkers'] = king and self.__attackers(king.bit_length() - 1, 1 - us)
+        return cache['checkers']
+
+
+    @property
+    def is_check(self):
+        """Whether the side to move is in check"""
+        return bool(self.checkers)
+
+
+    @property
+    def is_checkmate(self):
+        """Whether the side to move is in check and has no legal move"""
+        return self.is_check and not self.__has_legal_moves()
+
+
+    @property
+    def is_stalemate(self):
+        """Whether the side to move is not in check but has no legal move"""
+        return not self.is_check and not self.__has_legal_moves()
+
+
+    @property
+    def pinned(self):
+        """The bitboard of the pieces of the side to move pinned to their king"""
+        cache = self.__attacks()
+        if 'pinned' not in cache:
+            us = WHITE if self.active == 'w' else BLACK
+            king = self.bitboards[6 * us + 5]
+            pinned = BB_EMPTY
+            if king:
+                king_square = king.bit_length() - 1
+                offset = 6 * (1 - us)
+                queens = self.bitboards[offset + 4]
+                snipers = [(rook_attacks, rook_attacks(king_square, BB_EMPTY) & (self.bitboards[offset + 3] | queens)),
+                           (bishop_attacks, bishop_attacks(king_square, BB_EMPTY) & (self.bitboards[offset + 2] | queens))]
+                for attacks, pieces in snipers:
+                    for sniper in scan(pieces):
+                        # The squares strictly between the sniper and the king
+                        between = attacks(king_square, BB_SQUARES[sniper]) & attacks(sniper, king)
+                        blockers = between & self.occupied
+                        if blockers and not blockers & (blockers - 1) and blockers & self.occupancy[us]:
+                            pinned |= blockers
+            cache['pinned'] = pinned
+        return cache['pinned']
+
+
+    def attackers(self, square, color=None):
+        """Return the bitboard of the pieces of a color ('w', 'b' or both for None) attacking a square"""
+        cache = self.__attacks()
+        key = (square, color)
+        if key not in cache:
+            if color is None:
+                cache[key] = self.__attackers(square, WHITE) | self.__attackers(square, BLACK)
+            elif color in ACTIVE_COLORS:
+                cache[key] = self.__attackers(square, ACTIVE_COLORS.index(color))
+            else:
+                raise ValueError('Invalid color: %s' % color)
+        return cache[key]
+
+
+    def __attacks(self):
+        """Return the cache of attack queries, dropped whenever the position changes"""
+        if self._attack_cache is None:
+            self._attack_cache = {}
+        return self._attack_cache
+
+
+    def __attackers(self, square, by):
+        offset = 6 * by
+        bitboards = self.bitboards
+        queens = bitboards[offset + 4]
+        return (KNIGHT_ATTACKS[square] & bitboards[offset + 1] |
+                PAWN_ATTACKS[1 - by][square] & bitboards[offset] |
+                KING_ATTACKS[square] & bitboards[offset + 5] |
+                bishop_attacks(square, self.occupied) & (bitboards[offset + 2] | queens) |
+                rook_attacks(square, self.occupied) & (bitboards[offset + 3] | queens))
+
+
+    def __has_legal_moves(self):
+        cache = self.__attacks()
+        if 'has_legal_moves' not in cache:
+            cache['has_legal_moves'] = any(True for move in self.__legal_moves())
+        return cache['has_legal_moves']
+
+
+    def piece_at(self, square):
+        """Return the piece symbol on a square index, or a space if it is empty"""
+        mask = BB_SQUARES[square]
+        if self.occupancy[WHITE] & mask:
+            first = 0
+        elif self.occupancy[BLACK] & mask:
+            first = 6
         else:
-            raise ValueError('Invalid active color: %s' % active)
-        if castle_validator.match(castling_availability):
-            self.castling_availability = castling_availability
+            return ' '
+        for index in range(first, first + 6):
+            if self.bitboards[index] & mask:
+                return PIECE_SYMBOLS[index]
+
+
+    def __mailbox(self):
+        """Return the 64 piece symbols from a1 to h8, spaces for empty squares"""
+        squares = [' '] * 64
+        for index, bitboard in enumerate(self.bitboards):
+            symbol = PIECE_SYMBOLS[index]
+            for occupied_square in scan(bitboard):
+                squares[occupied_square] = symbol
+        return squares
+
+
+    def __str__(self):
+        if self._rendered is None:
+            self._rendered = self.renderer(self.board)
+        return self._rendered
+
+
+    def __hash__(self):
+        return self.zobrist
+
+
+    def __eq__(self, other):
+        """Positions are equal when their Zobrist keys match, whatever the move counters"""
+        if not isinstance(other, Position):
+            return NotImplemented
+        return self.zobrist == other.zobrist
+
+
+    def mirror(self):
+        """Return the Position with the board flipped rank for rank and the colors swapped"""
+        castling_availability = ''.join(right for right in 'KQkq'
+                                        if right.swapcase() in self.castling_availability) or '-'
+        en_passant = self.en_passant
+        if en_passant != '-':
+            en_passant = en_passant[0] + ('6' if en_passant[1] == '3' else '3')
+        return Position.from_record((
+            [flip_vertical(self.bitboards[(index + 6) % 12]) for index in range(12)],
+            'b' if self.active == 'w' else 'w', castling_availability, en_passant,
+            self.halfmove_clock, self.fullmove_number,
+        ))
+
+
+    def copy(self):
+        """Return an independent Position, copying only the mutable bitboards"""
+        if self._frozen:
+            # A frozen Position holds tuples, its copy gets lists it can change
+            new_position = Position.__new__(Position)
+            new_position.bitboards = list(self.bitboards)
+            new_position.occupancy = list(self.occupancy)
         else:
-            raise ValueError('Invalid castling availability: %s' % castling_availability)
-        if en_passant_validator.match(en_passant):
-            self.en_passant = en_passant
+            new_position = self.__class__.__new__(self.__class__)
+            new_position.bitboards = self.bitboards[:]
+            new_position.occupancy = self.occupancy[:]
+        new_position.occupied = self.occupied
+        new_position.active = self.active
+        new_position.castling_availability = self.castling_availability
+        new_position.en_passant = self.en_passant
+        new_position.halfmove_clock = self.halfmove_clock
+        new_position.fullmove_number = self.fullmove_number
+        new_position._fen = self._fen
+        new_position.zobrist = self.zobrist
+        new_position.piece_moved = self.piece_moved
+        new_position.piece_captured = self.piece_captured
+        new_position.capture = self.capture
+        new_position._board = None if self._frozen else self._board
+        new_position._stack = None
+        new_position._rendered = self._rendered
+        new_position._attack_cache = self._attack_cache
+        new_position._frozen = False
+        new_position.renderer = self.renderer
+        new_position._terms = self._terms
+        if self._history is None:
+            new_position._history = None
+            new_position._repetitions = None
         else:
-            raise ValueError('Invalid en passant target: %s' % en_passant)
-        if halfmove_clock.isdigit():
-            self.halfmove_clock = int(halfmove_clock)
+            new_position._history = self._history[:]
+            new_position._repetitions = dict(self._repetitions)
+        return new_position
+
+
+    def move_piece(self, move):
+        """Return the Position reached by playing a move, leaving this one as is"""
+        new_position = self.copy()
+        new_position.__make(*self.__parse_move(move))
+        return new_position
+
+
+    def push(self, move):
+        """Play a move on this Position in place so that pop can take it back"""
+        self.__push(move, *self.__parse_move(move))
+
+
+    def __push(self, move, from_square, to_square, promotion):
+        if self._frozen:
+            raise TypeError('Cached positions are shared and cannot be changed, push on a copy instead.')
+        if self._stack is None:
+            self._stack = []
+        self._stack.append((
+            move, self.bitboards, self.occupancy, self.occupied, self.active,
+            self.castling_availability, self.en_passant, self.halfmove_clock,
+            self.fullmove_number, self._fen, self.zobrist, self.piece_moved,
+            self.piece_captured, self.capture, self._board, self._history, self._repetitions,
+            len(self._history) if self._history is not None else 0, self._terms,
+        ))
+        self.bitboards = self.bitboards[:]
+        self.occupancy = self.occupancy[:]
+        try:
+            self.__make(from_square, to_square, promotion)
+        except ValueError:
+            self.pop()
+            raise
+
+
+    def pop(self):
+        """Take back the last move played with push and return it"""
+        if not self._stack:
+            raise IndexError('There is no move to take back.')
+        (move, self.bitboards, self.occupancy, self.occupied, self.active,
+                self.castling_availability, self.en_passant, self.halfmove_clock,
+                self.fullmove_number, self._fen, self.zobrist, self.piece_moved,
+                self.piece_captured, self.capture, self._board, self._history, self._repetitions,
+                history_length, self._terms) = self._stack.pop()
+        if self._history is not None and len(self._history) > history_length:
+            # The move was reversible so its key went onto the same history, take it off again
+            key = self._history.pop()
+            if self._repetitions[key] == 1:
+                del self._repetitions[key]
+            else:
+                self._repetitions[key] -= 1
+        self._rendered = None
+        self._attack_cache = None
+        return move
+
+
+    def __parse_move(self, move):
+        """Split a UCI, LAN or SAN move into its from square, to square and promotion piece"""
+        if not isinstance(move, str):
+            raise ValueError('Invalid move: %r' % (move,))
+        if len(move) in (4, 5) and move[0:2] in SQUARE_INDEX and move[2:4] in SQUARE_INDEX:
+            if move[4:] and move[4] not in PROMOTION_PIECES:
+                raise ValueError('Invalid move: %s' % move)
+            return SQUARE_INDEX[move[0:2]], SQUARE_INDEX[move[2:4]], move[4:] or None
+        match = LAN_PATTERN.match(move.rstrip('+#!?'))
+        if match is None:
+            return self.__resolve_san(move)
+        piece, from_name, to_name, promotion = match.groups()
+        if piece and self.piece_at(SQUARE_INDEX[from_name]).upper() != piece:
+            raise ValueError('There is no %s on %s: %s' % (piece, from_name, move))
+        return SQUARE_INDEX[from_name], SQUARE_INDEX[to_name], promotion and promotion.lower()
+
+
+    def __resolve_san(self, san):
+        """Find the one legal move a SAN string stands for, looking only at the pieces able to reach its square"""
+        text = san.rstrip('+#!?').replace('0', 'O')
+        us = WHITE if self.active == 'w' else BLACK
+        if text in SAN_CASTLING:
+            from_square, to_square = SAN_CASTLING[text]
+            if us == BLACK:
+                from_square, to_square = from_square + 56, to_square + 56
+            if (from_square, to_square, None) not in self.__castling_moves(us):
+                raise ValueError('Illegal SAN move: %s' % san)
+            return from_square, to_square, None
+        match = SAN_PATTERN.match(text)
+        if match is None:
+            raise ValueError('Invalid move: %s' % san)
+        piece, from_file, from_rank, target, promotion = match.groups()
+        to_square = SQUARE_INDEX[target]
+        piece_index = PIECE_INDEX[piece or 'P']
+        en_passant_mask = BB_EMPTY
+        if self.en_passant != '-':
+            en_passant_mask = BB_SQUARES[SQUARE_INDEX[self.en_passant]]
+        origins = self.__origins(us, piece_index, to_square, from_file is not None, en_passant_mask)
+        candidates = [from_square for from_square in scan(origins)
+                      if (from_file is None or FILE_NAMES[from_square & 7] == from_file) and
+                      (from_rank is None or RANK_NAMES[from_square >> 3] == from_rank) and
+                      self.__is_safe(us, from_square, to_square, en_passant_mask)]
+        if len(candidates) != 1:
+            raise ValueError('%s SAN move: %s' % ('Ambiguous' if candidates else 'Illegal', san))
+        last_rank = BB_SQUARES[to_square] & (BB_RANK_1 | BB_RANK_8)
+        if bool(promotion) != bool(piece_index == 0 and last_rank):
+            raise ValueError('Invalid promotion in SAN move: %s' % san)
+        return candidates[0], to_square, promotion and promotion.lower()
+
+
+    def __origins(self, us, piece_index, to_square, pawn_capture, en_passant_mask):
+        """Return the squares from which a piece of ours could move to a square, ignoring pins"""
+        to_mask = BB_SQUARES[to_square]
+        pieces = self.bitboards[6 * us + piece_index]
+        if piece_index == 0:
+            if pawn_capture:
+                if not to_mask & (self.occupancy[1 - us] | en_passant_mask):
+                    return BB_EMPTY
+                return PAWN_ATTACKS[1 - us][to_square] & pieces
+            if to_mask & self.occupied:
+                return BB_EMPTY
+            behind = to_square - 8 if us == WHITE else to_square + 8
+            if not 0 <= behind < 64:
+                return BB_EMPTY
+            if BB_SQUARES[behind] & pieces:
+                return BB_SQUARES[behind]
+            double_rank = BB_RANK_4 if us == WHITE else BB_RANK_5
+            if to_mask & double_rank and not BB_SQUARES[behind] & self.occupied:
+                return pieces & BB_SQUARES[behind - 8 if us == WHITE else behind + 8]
+            return BB_EMPTY
+        if to_mask & self.occupancy[us]:
+            return BB_EMPTY
+        if piece_index == 1:
+            return KNIGHT_ATTACKS[to_square] & pieces
+        if piece_index == 2:
+            return bishop_attacks(to_square, self.occupied) & pieces
+        if piece_index == 3:
+            return rook_attacks(to_square, self.occupied) & pieces
+        if piece_index == 4:
+            return queen_attacks(to_square, self.occupied) & pieces
+        return KING_ATTACKS[to_square] & pieces
+
+
+    def __push_san(self, move):
+        """Push a move and return it in standard algebraic notation"""
+        from_square, to_square, promotion = self.__parse_move(move)
+        piece = self.piece_at(from_square)
+        us = WHITE if self.active == 'w' else BLACK
+        piece_index = PIECE_INDEX.get(piece.upper())
+        capture = self.occupancy[1 - us] & BB_SQUARES[to_square]
+        if piece_index == 0:
+            if self.en_passant != '-' and to_square == SQUARE_INDEX[self.en_passant]:
+                capture = True
+            text = (FILE_NAMES[from_square & 7] + 'x' if capture else '') + SQUARE_NAMES[to_square]
+            if promotion:
+                text += '=' + promotion.upper()
+        elif piece_index == 5 and abs(from_square - to_square) == 2:
+            text = 'O-O' if to_square > from_square else 'O-O-O'
+        elif piece_index is None:
+            raise ValueError('There is no piece on %s: %s' % (SQUARE_NAMES[from_square], move))
         else:
-            raise ValueError('The half move clock is not an integer: %s' % halfmove_clock)
-        if fullmove_number.isdigit():
-            self.fullmove_number = int(fullmove_number)
+            en_passant_mask = BB_EMPTY
+            if self.en_passant != '-':
+                en_passant_mask = BB_SQUARES[SQUARE_INDEX[self.en_passant]]
+            others = [other for other in scan(self.__origins(us, piece_index, to_square, False, en_passant_mask))
+                      if other != from_square and self.__is_safe(us, other, to_square, en_passant_mask)]
+            text = piece.upper()
+            if others:
+                if all(other & 7 != from_square & 7 for other in others):
+                    text += FILE_NAMES[from_square & 7]
+                elif all(other >> 3 != from_square >> 3 for other in others):
+                    text += RANK_NAMES[from_square >> 3]
+                else:
+                    text += SQUARE_NAMES[from_square]
+            text += ('x' if capture else '') + SQUARE_NAMES[to_square]
+        self.__push(move, from_square, to_square, promotion)
+        if self.is_check:
+            text += '#' if self.is_checkmate else '+'
+        return text
+
+
+    def __make(self, from_square, to_square, promotion):
+        previous_key = self.__repetition_key() if self._history is not None else None
+        self._from_square = from_square
+        self._to_square = to_square
+        self._promotion = promotion
+        self.__set_piece_moved()
+        self.__set_capture()
+        self.__set_en_passant()
+        self.__set_castling()
+        self.__set_active()
+        self.__set_fullmove_number()
+        self.__set_halfmove_clock()
+        self.__execute_move()
+        if self._history is not None:
+            self.__record_history(previous_key)
+
+
+    def __record_history(self, previous_key):
+        """Add the key of the position just left to the history, or start afresh after an irreversible move"""
+        if self.halfmove_clock == 0:
+            self._history = []
+            self._repetitions = {}
         else:
-            raise ValueError('The full move number is not an integer: %s' % fullmove_number)
+            self._history.append(previous_key)
+            self._repetitions[previous_key] = self._repetitions.get(previous_key, 0) + 1
 
 
-    @staticmethod
-    def __build_board(placement):
-        """Expand a FEN placement string to replace integers with spaces"""
-        validator = re.compile('^[RrNnBbQqKkPp1-8/]+$')
-        match = validator.match(placement)
-        if match:
-            expander = {
-                '1': ' ',
-                '2': ' ' * 2,
-                '3': ' ' * 3,
-                '4': ' ' * 4,
-                '5': ' ' * 5,
-                '6': ' ' * 6,
-                '7': ' ' * 7,
-                '8': ' ' * 8,
-            }
-            expansion = ''.join(map(lambda ch: expander.get(ch, ch), placement))
-            return expansion.split('/')
+    @property
+    def history(self):
+        """The Zobrist keys of the positions since the last irreversible move, oldest first, or None"""
+        return self._history
+
+
+    def is_repetition(self, count=3):
+        """Return whether this position has now occurred at least count times"""
+        if self._history is None:
+            raise ValueError('Repetitions are only known for Positions built with history=True')
+        return self._repetitions.get(self.__repetition_key(), 0) + 1 >= count
+
+
+    def __repetition_key(self):
+        """Return the Zobrist key, leaving out an en passant target no pawn can legally capture on"""
+        if self.en_passant == '-':
+            return self.zobrist
+        us = WHITE if self.active == 'w' else BLACK
+        to_square = SQUARE_INDEX[self.en_passant]
+        for from_square in scan(PAWN_ATTACKS[1 - us][to_square] & self.bitboards[6 * us]):
+            if self.__is_safe(us, from_square, to_square, BB_SQUARES[to_square]):
+                return self.zobrist
+        return self.zobrist ^ en_passant_key(self.en_passant)
+
+
+    @property
+    def can_claim_draw(self):
+        """Whether a draw can be claimed by threefold repetition or the fifty-move rule"""
+        return self.halfmove_clock >= 100 or self.is_repetition(3)
+
+
+    def apply_moves(self, moves, emit='final'):
+        """Replay a sequence of UCI moves from this Position without generating FEN on the way.
+
+        With emit='final' the Position reached is returned, with 'each' the
+        list of FEN strings after every move, and with 'hashes' the list of
+        Zobrist keys after every move. This Position is left as is.
+        """
+        if emit not in REPLAY_EMITS:
+            raise ValueError('emit must be one of %s: %s' % (', '.join(REPLAY_EMITS), emit))
+        position = self.copy()
+        emitted = []
+        for ply, move in enumerate(moves):
+            try:
+                position.__make(*position.__parse_move(move))
+            except ValueError as error:
+                raise ValueError('%s (ply %i of the replay)' % (error, ply + 1))
+            if emit == 'each':
+                emitted.append(position.fen)
+            elif emit == 'hashes':
+                emitted.append(position.zobrist)
+        return position if emit == 'final' else emitted
+
+
+    def parse_san(self, san):
+        """Return the UCI form of a legal move given in standard algebraic notation"""
+        from_square, to_square, promotion = self.__resolve_san(san)
+        return SQUARE_NAMES[from_square] + SQUARE_NAMES[to_square] + (promotion or '')
+
+
+    def san(self, move):
+        """Return a move of this Position, in any accepted notation, in standard algebraic notation"""
+        position = self.copy() if self._frozen else self
+        text = position.__push_san(move)
+        position.pop()
+        return text
+
+
+    def san_moves(self, moves):
+        """Return a sequence of moves played from this Position in standard algebraic notation"""
+        position = self.copy()
+        return [position.__push_san(move) for move in moves]
+
+
+    def legal_moves(self):
+        """Yield every legal move of the active color in UCI notation"""
+        for from_square, to_square, promotion in self.__legal_moves():
+            yield SQUARE_NAMES[from_square] + SQUARE_NAMES[to_square] + (promotion or '')
+
+
+    def perft(self, depth):
+        """Count the leaf nodes of the legal move tree down to the given depth"""
+        if depth < 1:
+            return 1
+        if self._frozen:
+            return self.copy().perft(depth)
+        moves = list(self.__legal_moves())
+        if depth == 1:
+            return len(moves)
+        nodes = 0
+        for from_square, to_square, promotion in moves:
+            self.__push(None, from_square, to_square, promotion)
+            nodes += self.perft(depth - 1)
+            self.pop()
+        return nodes
+
+
+    def __legal_moves(self):
+        """Yield the legal moves as (from square, to square, promotion) tuples"""
+        us = WHITE if self.active == 'w' else BLACK
+        en_passant_mask = BB_EMPTY
+        if self.en_passant != '-':
+            en_passant_mask = BB_SQUARES[SQUARE_INDEX[self.en_passant]]
+        for from_square, to_square, promotion in self.__pseudo_legal_moves(us, en_passant_mask):
+            if self.__is_safe(us, from_square, to_square, en_passant_mask):
+                yield from_square, to_square, promotion
+
+
+    def __is_safe(self, us, from_square, to_square, en_passant_mask):
+        """Tell whether a move leaves our king out of check"""
+        from_mask = BB_SQUARES[from_square]
+        to_mask = BB_SQUARES[to_square]
+        captured = to_mask
+        if to_mask & en_passant_mask and from_mask & self.bitboards[6 * us]:
+            # The pawn taken en passant stands behind the target square
+            captured = BB_SQUARES[to_square - 8 if us == WHITE else to_square + 8]
+        king = self.bitboards[6 * us + 5]
+        if from_mask & king:
+            king_square = to_square
+        elif king:
+            king_square = king.bit_length() - 1
         else:
-            raise ValueError('Invalid FEN placement string: %s' % placement)
+            return True
+        after = (self.occupied & ~from_mask & ~captured) | to_mask
+        return not self.__is_attacked(king_square, 1 - us, after, captured)
 
 
-    def __str__(self):
-        return render_ascii_board(self.board)
+    def __pseudo_legal_moves(self, us, en_passant_mask):
+        """Yield the moves that follow the piece rules, ignoring king safety"""
+        offset = 6 * us
+        bitboards = self.bitboards
+        own = self.occupancy[us]
+        enemy = self.occupancy[1 - us]
+        occupied = self.occupied
+        targets = ~own
+        for from_square in scan(bitboards[offset + 1]):
+            for to_square in scan(KNIGHT_ATTACKS[from_square] & targets):
+                yield from_square, to_square, None
+        for from_square in scan(bitboards[offset + 2] | bitboards[offset + 4]):
+            for to_square in scan(bishop_attacks(from_square, occupied) & targets):
+                yield from_square, to_square, None
+        for from_square in scan(bitboards[offset + 3] | bitboards[offset + 4]):
+            for to_square in scan(rook_attacks(from_square, occupied) & targets):
+                yield from_square, to_square, None
+        for from_square in scan(bitboards[offset + 5]):
+            for to_square in scan(KING_ATTACKS[from_square] & targets):
+                yield from_square, to_square, None
+        for castle in self.__castling_moves(us):
+            yield castle
+        step = 8 if us == WHITE else -8
+        start_rank = BB_RANK_2 if us == WHITE else BB_RANK_7
+        last_rank = BB_RANK_8 if us == WHITE else BB_RANK_1
+        # A pawn left on its last rank by a hand-written FEN has nowhere to go
+        for from_square in scan(bitboards[offset] & ~last_rank):
+            to_squares = PAWN_ATTACKS[us][from_square] & (enemy | en_passant_mask)
+            single = BB_SQUARES[from_square + step]
+            if not occupied & single:
+                to_squares |= single
+                if BB_SQUARES[from_square] & start_rank and not occupied & BB_SQUARES[from_square + 2 * step]:
+                    to_squares |= BB_SQUARES[from_square + 2 * step]
+            for to_square in scan(to_squares):
+                if BB_SQUARES[to_square] & last_rank:
+                    for promotion in PROMOTION_PIECES:
+                        yield from_square, to_square, promotion
+                else:
+                    yield from_square, to_square, None
 
 
-    def move_piece(self, move):
-        new_position = copy.deepcopy(self)
-        new_position._current_rank = self.rank_translation.get(move[0])
-        new_position._current_file = 8 - int(move[1])
-        new_position._new_rank = self.rank_translation.get(move[2])
-        new_position._new_file = 8 - int(move[3])
-        new_position._Position__set_piece_moved()
-        new_position._Position__set_capture()
-        new_position._Position__set_en_passant()
-        new_position._Position__set_castling()
-        new_position._Position__set_active()
-        new_position._Position__set_fullmove_number()
-        new_position._Position__set_halfmove_clock()
-        new_position._Position__execute_move()
-        new_position._Position__construct_updated_fen()
-        return new_position
+    def __castling_moves(self, us):
+        """Yield the castling king moves whose path is empty and not attacked"""
+        if self.castling_availability == '-':
+            return
+        offset = 6 * us
+        for right, king_square, rook_square, empty, passed in CASTLING_PATHS[us]:
+            if (right in self.castling_availability and
+                    self.bitboards[offset + 5] & BB_SQUARES[king_square] and
+                    self.bitboards[offset + 3] & BB_SQUARES[rook_square] and
+                    not self.occupied & empty and
+                    not any(self.__is_attacked(square, 1 - us, self.occupied) for square in passed)):
+                yield king_square, passed[-1], None
+
+
+    def __is_attacked(self, square, by, occupied, captured=BB_EMPTY):
+        """Tell whether a color attacks a square, ignoring any pieces on captured"""
+        offset = 6 * by
+        bitboards = self.bitboards
+        alive = ~captured
+        return bool(
+            KNIGHT_ATTACKS[square] & bitboards[offset + 1] & alive or
+            PAWN_ATTACKS[1 - by][square] & bitboards[offset] & alive or
+            KING_ATTACKS[square] & bitboards[offset + 5] or
+            bishop_attacks(square, occupied) & (bitboards[offset + 2] | bitboards[offset + 4]) & alive or
+            rook_attacks(square, occupied) & (bitboards[offset + 3] | bitboards[offset + 4]) & alive
+        )
 
 
     def __set_piece_moved(self):
-        #print(self)
-        #print("rank: %r" % self._current_rank)
-        #print("file: %r" % self._current_file)
-        self.piece_moved = self.board[self._current_file][self._current_rank]
-        #print("piece_moved: %r" % self.piece_moved)
+        self.piece_moved = self.piece_at(self._from_square)
         if self.active == 'w' and not self.piece_moved.isupper() or self.active == 'b' and not self.piece_moved.islower():
             raise ValueError('The piece being moved is not the correct color.')
+        reaches_last_rank = BB_SQUARES[self._to_square] & (BB_RANK_1 | BB_RANK_8)
+        if self.piece_moved in 'Pp' and reaches_last_rank and not self._promotion:
+            raise ValueError('A pawn reaching the last rank must name its promotion piece.')
+        if self._promotion and not (self.piece_moved in 'Pp' and reaches_last_rank):
+            raise ValueError('Only a pawn reaching the last rank can be promoted.')
 
 
     def __set_capture(self):
-        #print(self)
-        #print("current rank: %r" % self._current_rank)
-        #print("current file: %r" % self._current_file)
-        #print("new rank: %r" % self._new_rank)
-        #print("new file: %r" % self._new_file)
-        self.piece_captured = self.board[self._new_file][self._new_rank]
+        self._captured_square = self._to_square
+        self.piece_captured = self.piece_at(self._to_square)
+        if (self.piece_captured == ' ' and self.piece_moved in 'Pp' and
+                SQUARE_NAMES[self._to_square] == self.en_passant and
+                (self._to_square - self._from_square) % 8):
+            # The pawn taken en passant stands behind the target square
+            self._captured_square = self._to_square - 8 if self.active == 'w' else self._to_square + 8
+            self.piece_captured = self.piece_at(self._captured_square)
         self.capture = self.piece_captured != ' '
-        #print("capture: %r" % self.capture)
         if self.active == 'w' and self.piece_captured.isupper() or self.active == 'b' and self.piece_captured.islower():
             raise ValueError('The piece being captured is not the correct color.')
 
 
     def __set_en_passant(self):
-        #print("current rank: %r" % self._current_rank)
-        #print("current file: %r" % self._current_file)
-        #print("new rank: %r" % self._new_rank)
-        #print("new file: %r" % self._new_file)
-        #print("active: %r" % self.active)
-        if self.piece_moved in 'Pp':
-            if self.active == 'w' and self._current_file - self._new_file == 2 and self._new_rank == self._current_rank:
-                self.en_passant = self.algebraic_translation.get(self._new_rank) + str(8 - (self._new_file + 1))
-            elif self.active == 'b' and self._new_file - self._current_file == 2 and self._new_rank == self._current_rank:
-                self.en_passant = self.algebraic_translation.get(self._new_rank) + str(8 - (self._new_file - 1))
+        self.zobrist ^= en_passant_key(self.en_passant)
+        if self.piece_moved in 'Pp' and abs(self._to_square - self._from_square) == 16:
+            self.en_passant = SQUARE_NAMES[(self._from_square + self._to_square) // 2]
         else:
             self.en_passant = '-'
-        #print("en passant: %r" % self.en_passant)
+        self.zobrist ^= en_passant_key(self.en_passant)
 
 
     def __set_castling(self):
-        if self.piece_moved in 'Kk':
-            if self.piece_moved.isupper():
-                self.castling_availability = re.sub('([KQ]+)', '', self.castling_availability)
-            elif self.piece_moved.islower():
-                self.castling_availability = re.sub('([kq]+)', '', self.castling_availability)
-        elif self.piece_moved in 'Rr':
-            if self.piece_moved.isupper():
-                if self._current_rank == 0:
-                    remove_exp = 'Q'
-                elif self._current_rank == 8:
-                    remove_exp = 'K'
-            elif self.piece_moved_islower():
-                if self._current_rank == 0:
-                    remove_exp = 'q'
-                elif self._current_rank == 8:
-                    remove_exp = 'k'
-            self.castling_availability.replace(remove_exp, '')
-        if self.castling_availability == '':
-            self.castling_availability = '-'
+        castling_availability = self.castling_availability
+        if self.piece_moved == 'K':
+            castling_availability = castling_availability.replace('K', '').replace('Q', '')
+        elif self.piece_moved == 'k':
+            castling_availability = castling_availability.replace('k', '').replace('q', '')
+        # A rook leaving or being captured on its corner loses that side
+        for corner in (self._from_square, self._to_square):
+            if corner in CASTLING_ROOK_SQUARES:
+                castling_availability = castling_availability.replace(CASTLING_ROOK_SQUARES[corner], '')
+        if castling_availability == '':
+            castling_availability = '-'
+        if castling_availability != self.castling_availability:
+            self.zobrist ^= castling_key(self.castling_availability) ^ castling_key(castling_availability)
+        self.castling_availability = castling_availability
 
 
     def __set_active(self):
+        self.zobrist ^= BLACK_TO_MOVE_KEY
         if self.active == 'w':
             self.active = 'b'
         elif self.active == 'b':
@@ -207,46 +1061,218 @@ class Position(object):
 
     def __set_halfmove_clock(self):
         if self.piece_moved in 'Pp' or self.capture:
-            #print('halfmove_clock 1: %r' % self.halfmove_clock)
             self.halfmove_clock = 0
-            #print('halfmove_clock 2: %r' % self.halfmove_clock)
         else:
-            #print('halfmove_clock 1: %r' % self.halfmove_clock)
             self.halfmove_clock += 1
-            #print('halfmove_clock 2: %r' % self.halfmove_clock)
 
 
     def __execute_move(self, move=None):
-        from_file = list(self.board[self._current_file])
-        from_file[self._current_rank] = ' '
-        self.board[self._current_file] = ''.join(from_file)
-        to_file = list(self.board[self._new_file])
-        to_file[self._new_rank] = self.piece_moved
-        self.board[self._new_file] = ''.join(to_file)
+        color = WHITE if self.piece_moved.isupper() else BLACK
+        from_mask = BB_SQUARES[self._from_square]
+        to_mask = BB_SQUARES[self._to_square]
+        moved_index = PIECE_INDEX[self.piece_moved]
+        terms = self._terms
+        if terms is not None:
+            # Copied on write since copies and the push stack share the list
+            terms = self._terms = terms[:]
+        if self.capture:
+            captured_index = PIECE_INDEX[self.piece_captured]
+            captured_mask = BB_SQUARES[self._captured_square]
+            self.bitboards[captured_index] ^= captured_mask
+            self.occupancy[1 - color] ^= captured_mask
+            self.zobrist ^= PIECE_KEYS[captured_index][self._captured_square]
+            if terms is not None:
+                remove_piece(terms, captured_index, self._captured_square)
+        self.bitboards[moved_index] ^= from_mask
+        self.zobrist ^= PIECE_KEYS[moved_index][self._from_square]
+        if terms is not None:
+            remove_piece(terms, moved_index, self._from_square)
+        if self._promotion:
+            moved_index = PIECE_INDEX[self._promotion.upper() if color == WHITE else self._promotion]
+        self.bitboards[moved_index] ^= to_mask
+        self.zobrist ^= PIECE_KEYS[moved_index][self._to_square]
+        if terms is not None:
+            add_piece(terms, moved_index, self._to_square)
+        self.occupancy[color] ^= from_mask | to_mask
         if self.piece_moved in 'Kk':
             # If the king moved 2 spaces then castling is taking place
-            if abs(self._current_rank - self._new_rank) == 2:
-                rook_file = list(self.board[self._current_file])
-                if self._current_rank > self._new_rank:
-                    rook_current_rank = 0
-                    rook_new_rank = 3
+            if abs(self._from_square - self._to_square) == 2:
+                if self._from_square > self._to_square:
+                    rook_from = self._from_square - 4
+                    rook_to = self._from_square - 1
                 else:
-                    rook_current_rank = 7
-                    rook_new_rank = 5
-                rook_file[rook_current_rank] = ' '
-                rook_piece = 'R'
-                if self.piece_moved.islower():
-                    rook_piece = 'r'
-                rook_file[rook_new_rank] = rook_piece
-                self.board[self._current_file] = ''.join(rook_file)
-        self.__construct_updated_fen()
+                    rook_from = self._from_square + 3
+                    rook_to = self._from_square + 1
+                rook_index = PIECE_INDEX['R' if color == WHITE else 'r']
+                for rook_square, present in ((rook_from, True), (rook_to, False)):
+                    rook_mask = BB_SQUARES[rook_square]
+                    if bool(self.bitboards[rook_index] & rook_mask) == present:
+                        self.bitboards[rook_index] ^= rook_mask
+                        self.occupancy[color] ^= rook_mask
+                        self.zobrist ^= PIECE_KEYS[rook_index][rook_square]
+                        if terms is not None:
+                            (remove_piece if present else add_piece)(terms, rook_index, rook_square)
+        self.occupied = self.occupancy[WHITE] | self.occupancy[BLACK]
+        self._board = None
+        self._fen = None
+        self._rendered = None
+        self._attack_cache = None
 
 
     def __construct_updated_fen(self):
         template = "%s %s %s %s %i %i"
-        board = '/'.join(self.board)
-        board = re.sub('( +)', lambda matchobj: str(len(matchobj.group(0))), board)
-        self.fen = template % (board, self.active, self.castling_availability, self.en_passant, self.halfmove_clock, self.fullmove_number)
+        squares = self.__mailbox()
+        ranks = []
+        for rank_index in range(7, -1, -1):
+            rank = ''
+            empty = 0
+            for piece in squares[rank_index * 8:rank_index * 8 + 8]:
+                if piece == ' ':
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                rank += piece
+            if empty:
+                rank += str(empty)
+            ranks.append(rank)
+        board = '/'.join(ranks)
+        self._fen = template % (board, self.active, self.castling_availability, self.en_passant, self.halfmove_clock, self.fullmove_number)
+
+
+class FrozenPosition(Position):
+    """A Position shared through Position.cached, refusing every change"""
+    __slots__ = ()
+    # The views computed on first use, which may still be filled in
+    CACHES = frozenset(['_fen', '_board', '_rendered', '_attack_cache', '_terms'])
+
+    def __setattr__(self, name, value):
+        if name not in self.CACHES:
+            raise TypeError('Cached positions are shared and cannot be changed, set %s on a copy instead.' % name)
+        Position.__setattr__(self, name, value)
+
+
+    def __reduce__(self):
+        # Unpickled, it is the shared Position of the receiving process
+        return (Position.cached, (self.fen,))
+
+
+    @property
+    def board(self):
+        """The placement as a tuple of eight strings of eight characters, rank 8 first"""
+        if self._board is None:
+            self._board = tuple(Position.board.fget(self))
+        return self._board
+
+
+# The shared Positions handed out by Position.cached
+POSITION_CACHE = LRUCache(POSITION_CACHE_SIZE)
+
+
+ParseResult = namedtuple('ParseResult', ['line_number', 'fen', 'position', 'error'])
+
+
+def parse_many(source, workers=1, chunksize=1000, ordered=True, records=False, fast=False):
+    """Parse FEN strings from a file name, open file or iterable of strings.
+
+    A ParseResult is yielded for every non-blank line, holding either the
+    Position (or its to_record tuple when records is set) or the error
+    message for that line, so that one bad FEN does not stop the run.
+    With more than one worker the lines are parsed in chunks by a process
+    pool; ordered=False yields chunks as soon as they are done.
+    """
+    if isinstance(source, str):
+        with open(source) as lines:
+            for result in parse_many(lines, workers, chunksize, ordered, records, fast):
+                yield result
+        return
+    chunks = _chunk_lines(source, chunksize)
+    if workers <= 1:
+        for chunk in chunks:
+            for result in _parse_chunk((chunk, records, fast)):
+                yield result
+        return
+    first_chunk = next(chunks, None)
+    if first_chunk is None:
+        return
+    if len(first_chunk) < chunksize:
+        # Everything fits in one chunk so starting a pool would cost more than it saves
+        for result in _parse_chunk((first_chunk, records, fast)):
+            yield result
+        return
+    # Imported here so that programs never starting a pool do not pay for loading it
+    import multiprocessing
+    pool = multiprocessing.Pool(workers)
+    try:
+        for chunk_results in _imap_bounded(pool, itertools.chain([first_chunk], chunks),
+                                           records, fast, workers * 2, ordered):
+            for result in chunk_results:
+                yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _chunk_lines(lines, chunksize):
+    """Group the non-blank lines into lists of (line number, FEN) pairs"""
+    chunk = []
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        chunk.append((line_number, line))
+        if len(chunk) >= chunksize:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _parse_chunk(job):
+    """Parse one chunk of (line number, FEN) pairs into ParseResults"""
+    chunk, records, fast = job
+    results = []
+    for line_number, line in chunk:
+        try:
+            position = Position.from_fen_fast(line) if fast else Position(line)
+        except ValueError as error:
+            results.append(ParseResult(line_number, line, None, str(error)))
+            continue
+        results.append(ParseResult(line_number, line, position.to_record() if records else position, None))
+    return results
+
+
+def _imap_bounded(pool, chunks, records, fast, window, ordered):
+    """Feed chunks to the pool keeping at most window of them in flight"""
+    if ordered:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(_parse_chunk, ((chunk, records, fast),)))
+            if len(pending) >= window:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+        return
+    import queue
+    done = queue.Queue()
+    in_flight = 0
+    for chunk in chunks:
+        pool.apply_async(_parse_chunk, ((chunk, records, fast),),
+                         callback=done.put, error_callback=done.put)
+        in_flight += 1
+        if in_flight >= window:
+            yield _raise_if_error(done.get())
+            in_flight -= 1
+    while in_flight:
+        yield _raise_if_error(done.get())
+        in_flight -= 1
+
+
+def _raise_if_error(result):
+    if isinstance(result, BaseException):
+        raise result
+    return result
 
 
 if __name__ == "__main__":
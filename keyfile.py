@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""This is the sorted key file module.
+
+A sorted key file is a 16 byte header (magic and entry count), the 64-bit
+keys of its entries in ascending order, then one fixed-size value per key
+in the same order.  The tablebase tables and the position books are such
+files: SortedKeyFile memory-maps one so that any number of processes share
+its pages through the OS, and finds a key by binary search touching only a
+handful of them.
+"""
+import mmap
+import struct
+
+HEADER = struct.Struct('<8sQ')
+KEY = struct.Struct('<Q')
+
+
+def write_sorted_key_file(path, magic, values):
+    """Write a dictionary of keys and packed values to a sorted key file"""
+    keys = sorted(values)
+    with open(path, 'wb') as key_file:
+        key_file.write(HEADER.pack(magic, len(keys)))
+        for key in keys:
+            key_file.write(KEY.pack(key))
+        for key in keys:
+            key_file.write(values[key])
+    return len(keys)
+
+
+class SortedKeyFile(object):
+    """A memory-mapped, read-only sorted key file with values of value_size bytes"""
+
+    def __init__(self, path, magic, value_size, description):
+        self.path = path
+        self.value_size = value_size
+        with open(path, 'rb') as key_file:
+            self.map = mmap.mmap(key_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.map) < HEADER.size:
+            self.map.close()
+            raise ValueError('Not a %s: %s' % (description, path))
+        file_magic, self.count = HEADER.unpack_from(self.map, 0)
+        if file_magic != magic or len(self.map) != HEADER.size + self.count * (KEY.size + value_size):
+            self.map.close()
+            raise ValueError('Not a %s: %s' % (description, path))
+        self._values_offset = HEADER.size + self.count * KEY.size
+
+
+    def __len__(self):
+        return self.count
+
+
+    def key(self, index):
+        return KEY.unpack_from(self.map, HEADER.size + index * KEY.size)[0]
+
+
+    def find(self, key, low=0):
+        """Return the index of a key among the keys at or after index low, or None"""
+        high = self.count
+        while low < high:
+            middle = (low + high) // 2
+            middle_key = self.key(middle)
+            if middle_key < key:
+                low = middle + 1
+            elif middle_key > key:
+                high = middle
+            else:
+                return middle
+        return None
+
+
+    def value_offset(self, index):
+        """Return the offset in map of the value stored at an index"""
+        return self._values_offset + index * self.value_size
+
+
+    def close(self):
+        self.map.close()
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""This is the metrics module.
+
+A MetricsRegistry holds counters and timing histograms, optionally with
+labels, and dumps them as JSON or in the Prometheus text format.
+
+instrument() swaps timing wrappers into Position for parsing, every step
+of the move path, FEN construction and rendering, and uninstrument() puts
+the original methods back. Nothing is wrapped until instrument() is
+called, so the hooks cost nothing while they are off.
+"""
+from bisect import bisect_left
+import contextlib
+import functools
+import json
+import threading
+import time
+
+from fen import Position
+
+# Upper bounds in seconds of the histogram buckets, the last one catches the rest
+DEFAULT_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+                   1e-3, 1e-2, 0.1, 1.0, 10.0, float('inf'))
+# The Position methods timed by instrument(), as (attribute, metric name, labels)
+POSITION_HOOKS = [
+    ('__init__', 'position_parse_seconds', {'parser': 'init'}),
+    ('from_fen_fast', 'position_parse_seconds', {'parser': 'fast'}),
+    ('move_piece', 'position_move_seconds', {}),
+    ('push', 'position_push_seconds', {}),
+    ('_Position__set_piece_moved', 'position_move_step_seconds', {'step': 'set_piece_moved'}),
+    ('_Position__set_capture', 'position_move_step_seconds', {'step': 'set_capture'}),
+    ('_Position__set_en_passant', 'position_move_step_seconds', {'step': 'set_en_passant'}),
+    ('_Position__set_castling', 'position_move_step_seconds', {'step': 'set_castling'}),
+    ('_Position__set_active', 'position_move_step_seconds', {'step': 'set_active'}),
+    ('_Position__set_fullmove_number', 'position_move_step_seconds', {'step': 'set_fullmove_number'}),
+    ('_Position__set_halfmove_clock', 'position_move_step_seconds', {'step': 'set_halfmove_clock'}),
+    ('_Position__execute_move', 'position_move_step_seconds', {'step': 'execute_move'}),
+    ('_Position__construct_updated_fen', 'position_fen_seconds', {}),
+    ('__str__', 'position_render_seconds', {}),
+]
+HELP = {
+    'position_parse_seconds': 'Time spent parsing FEN strings into Positions',
+    'position_parse_errors_total': 'FEN strings that failed to parse',
+    'position_move_seconds': 'Time spent in Position.move_piece',
+    'position_push_seconds': 'Time spent in Position.push',
+    'position_move_step_seconds': 'Time spent in each step of the move path',
+    'position_fen_seconds': 'Time spent building FEN strings',
+    'position_render_seconds': 'Time spent rendering boards',
+}
+
+
+class Counter(object):
+    """A value that only goes up"""
+    kind = 'counter'
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+    def snapshot(self):
+        return {'value': self.value}
+
+
+class Histogram(object):
+    """Counts of observed values by bucket, with their number and sum"""
+    kind = 'histogram'
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[min(index, len(self.counts) - 1)] += 1
+            self.count += 1
+            self.sum += value
+
+
+    @contextlib.contextmanager
+    def time(self):
+        """Observe the time spent in a with block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+    def snapshot(self):
+        cumulative = 0
+        buckets = []
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            buckets.append(['+Inf' if bound == float('inf') else bound, cumulative])
+        return {'count': self.count, 'sum': self.sum, 'buckets': buckets}
+
+
+class MetricsRegistry(object):
+    """Named, labelled metrics that can be dumped as JSON or Prometheus text"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._help = dict(HELP)
+        self._lock = threading.Lock()
+
+
+    def counter(self, name, help=None, **labels):
+        """Return the counter with this name and labels, creating it on first use"""
+        return self.__get(Counter, name, help, labels)
+
+
+    def histogram(self, name, help=None, buckets=DEFAULT_BUCKETS, **labels):
+        """Return the histogram with this name and labels, creating it on first use"""
+        return self.__get(lambda: Histogram(buckets), name, help, labels)
+
+
+    def to_dict(self):
+        """Return every metric as {name: [{'labels': ..., values...}]}"""
+        with self._lock:
+            items = sorted(self._metrics.items())
+        metrics = {}
+        for (name, labels), metric in items:
+            entry = {'labels': dict(labels), 'type': metric.kind}
+            entry.update(metric.snapshot())
+            metrics.setdefault(name, []).append(entry)
+        return metrics
+
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2, sort_keys=True)
+
+
+    def to_prometheus(self):
+        """Return every metric in the Prometheus text exposition format"""
+        lines = []
+        for name, entries in sorted(self.to_dict().items()):
+            if name in self._help:
+                lines.append('# HELP %s %s' % (name, self._help[name]))
+            lines.append('# TYPE %s %s' % (name, entries[0]['type']))
+            for entry in entries:
+                labels = entry['labels']
+                if entry['type'] == 'counter':
+                    lines.append('%s%s %s' % (name, _format_labels(labels), entry['value']))
+                    continue
+                for bound, count in entry['buckets']:
+                    bucket_labels = dict(labels, le=str(bound))
+                    lines.append('%s_bucket%s %i' % (name, _format_labels(bucket_labels), count))
+                lines.append('%s_sum%s %r' % (name, _format_labels(labels), entry['sum']))
+                lines.append('%s_count%s %i' % (name, _format_labels(labels), entry['count']))
+        return '\n'.join(lines) + '\n'
+
+
+    def dump(self, path):
+        """Write the metrics to a file, in Prometheus text for .prom or .txt files and JSON otherwise"""
+        text = self.to_prometheus() if path.endswith(('.prom', '.txt')) else self.to_json()
+        with open(path, 'w') as metrics_file:
+            metrics_file.write(text)
+
+
+    def reset(self):
+        with self._lock:
+            self._metrics.clear()
+
+
+    def __get(self, factory, name, help, labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if help is not None:
+                self._help[name] = help
+            metric = self._metrics.get(key)
+            if metric is None:
+                metric = self._metrics[key] = factory()
+            return metric
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                             for name, value in sorted(labels.items()))
+
+
+# The registry used by default by instrument() and the scripts
+REGISTRY = MetricsRegistry()
+_originals = {}
+
+
+def instrument(registry=REGISTRY):
+    """Wrap the Position methods listed in POSITION_HOOKS so that they record their timings"""
+    if _originals:
+        return
+    for attribute, name, labels in POSITION_HOOKS:
+        original = Position.__dict__[attribute]
+        _originals[attribute] = original
+        histogram = registry.histogram(name, **labels)
+        if isinstance(original, classmethod):
+            setattr(Position, attribute, classmethod(_timed(original.__func__, histogram)))
+        elif attribute == '__init__':
+            setattr(Position, attribute, _timed(original, histogram,
+                                                registry.counter('position_parse_errors_total')))
+        else:
+            setattr(Position, attribute, _timed(original, histogram))
+
+
+def uninstrument():
+    """Put the original Position methods back"""
+    for attribute, original in _originals.items():
+        setattr(Position, attribute, original)
+    _originals.clear()
+
+
+def _timed(function, histogram, errors=None):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        except ValueError:
+            if errors is not None:
+                errors.inc()
+            raise
+        finally:
+            histogram.observe(time.perf_counter() - start)
+    return wrapper
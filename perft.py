@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Perft benchmark suite for the legal move generator
+
+Runs Position.perft over the standard perft positions, checks the node
+counts against the published values and reports the nodes per second
+reached for each position and for the whole run.
+"""
+import argparse
+import time
+
+from fen import Position
+
+# (name, FEN, node counts by depth) as published on the Chess Programming Wiki
+PERFT_POSITIONS = [
+    ('initial', 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+     [20, 400, 8902, 197281, 4865609]),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+     [48, 2039, 97862, 4085603]),
+    ('position 3', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+     [14, 191, 2812, 43238, 674624]),
+    ('position 4', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+     [6, 264, 9467, 422333]),
+    ('position 5', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+     [44, 1486, 62379, 2103487]),
+    ('position 6', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+     [46, 2079, 89890, 3894594]),
+]
+
+
+def run_suite(depth, positions=PERFT_POSITIONS):
+    """Run perft to the given depth on every position.
+
+    Returns a list of (name, depth, nodes, expected nodes, seconds) tuples;
+    positions without a published count at that depth are run at their
+    deepest known depth instead.
+    """
+    results = []
+    for name, fen, counts in positions:
+        position_depth = min(depth, len(counts))
+        position = Position(fen)
+        start = time.perf_counter()
+        nodes = position.perft(position_depth)
+        elapsed = time.perf_counter() - start
+        results.append((name, position_depth, nodes, counts[position_depth - 1], elapsed))
+    return results
+
+
+def main(args):
+    total_nodes = 0
+    total_time = 0.0
+    failures = 0
+    for name, depth, nodes, expected, elapsed in run_suite(args.depth):
+        status = 'ok' if nodes == expected else 'FAILED (expected %i)' % expected
+        if nodes != expected:
+            failures += 1
+        total_nodes += nodes
+        total_time += elapsed
+        print('%-12s depth %i: %10i nodes in %7.3fs, %9.0f nps %s' %
+              (name, depth, nodes, elapsed, nodes / elapsed if elapsed else 0, status))
+    print('%-12s          %10i nodes in %7.3fs, %9.0f nps' %
+          ('total', total_nodes, total_time, total_nodes / total_time if total_time else 0))
+    return failures
+
+
+def parse_args():
+    """Parse the arguments entered by the user. Run perft.py --help for more information."""
+    parser = argparse.ArgumentParser(
+        description='Run the perft suite and report node counts and nodes per second.'
+    )
+    parser.add_argument('-d', '--depth', type=int, default=3,
+        help='the perft depth to search for every position (default 3)')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    raise SystemExit(1 if main(parse_args()) else 0)
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""This is the PGN reading module.
+
+Games are read one at a time from a binary stream, so memory use does not
+depend on the size of the archive.  Each Game keeps its tag pairs, its SAN
+moves and the byte offset it starts at; positions are only built when asked
+for, by replaying the moves through Position.  PGNFile can index the game
+offsets of a file to seek straight to a game, and parse_games splits the
+index between processes to replay independent games in parallel.
+"""
+from collections import OrderedDict, deque
+import re
+
+from fen import Position
+
+STARTING_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+RESULTS = frozenset(['1-0', '0-1', '1/2-1/2', '*'])
+TAG_PATTERN = re.compile(r'^\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+# Comments, variation brackets, NAGs and everything else as one token each
+TOKEN_PATTERN = re.compile(r'\{[^}]*\}?|;[^\n]*|\$\d+|[()]|[^\s(){};$]+')
+# Move numbers end in dots, so that the zero of 0-0 castling is left alone
+MOVE_NUMBER_PATTERN = re.compile(r'^\d+(\.+|$)')
+
+
+class Game(object):
+    """One game of a PGN file: its tags, SAN moves and result"""
+
+    def __init__(self, headers, moves, result, offset):
+        self.headers = headers
+        self.moves = moves
+        self.result = result
+        self.offset = offset
+        self.error = None
+        self._uci = None
+
+
+    def __repr__(self):
+        return '<Game %s vs %s at offset %i>' % (
+            self.headers.get('White', '?'), self.headers.get('Black', '?'), self.offset)
+
+
+    def start_position(self, history=False):
+        """Return the Position the game starts from, honouring a FEN tag"""
+        return Position(self.headers.get('FEN', STARTING_FEN), history=history)
+
+
+    def positions(self, history=False):
+        """Yield the starting Position and then the Position after every move.
+
+        With history each Position knows its repetitions, see Position.is_repetition.
+        """
+        position = self.start_position(history)
+        yield position
+        for ply, san in enumerate(self.moves):
+            position = position.move_piece(self.__to_uci(position, san, ply))
+            yield position
+
+
+    def uci_moves(self):
+        """Return the moves of the game in UCI notation"""
+        if self._uci is None:
+            uci = []
+            position = self.start_position()
+            for ply, san in enumerate(self.moves):
+                uci.append(self.__to_uci(position, san, ply))
+                position = position.move_piece(uci[-1])
+            self._uci = uci
+        return self._uci
+
+
+    def final_position(self, history=False):
+        """Return the Position at the end of the game"""
+        return self.start_position(history).apply_moves(self.uci_moves())
+
+
+    def __to_uci(self, position, san, ply):
+        try:
+            return position.parse_san(san)
+        except ValueError as error:
+            raise ValueError('%s (ply %i of the game at offset %i)' % (error, ply + 1, self.offset))
+
+
+def read_games(stream, offset=0, end=None):
+    """Yield the Games of a binary PGN stream one at a time.
+
+    offset is the position of the stream in the file, so that the offsets
+    of the games are right after a seek. Reading stops before the first
+    game starting at or after end.
+    """
+    headers = OrderedDict()
+    movetext = []
+    start = None
+    for line in stream:
+        line_offset = offset
+        offset += len(line)
+        text = line.decode('utf-8', 'replace').strip()
+        if not text or text.startswith('%'):
+            continue
+        if text.startswith('[') and TAG_PATTERN.match(text):
+            if movetext:
+                yield _build_game(headers, movetext, start)
+                headers, movetext, start = OrderedDict(), [], None
+            if start is None:
+                if end is not None and line_offset >= end:
+                    return
+                start = line_offset
+            name, value = TAG_PATTERN.match(text).groups()
+            headers[name] = value.replace('\\"', '"').replace('\\\\', '\\')
+            continue
+        if start is None:
+            if end is not None and line_offset >= end:
+                return
+            start = line_offset
+        movetext.append(text)
+    if start is not None:
+        yield _build_game(headers, movetext, start)
+
+
+def _build_game(headers, movetext, offset):
+    """Split movetext into SAN moves, dropping comments, variations and NAGs"""
+    moves = []
+    result = headers.get('Result', '*')
+    depth = 0
+    for token in TOKEN_PATTERN.findall('\n'.join(movetext)):
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth = max(depth - 1, 0)
+        elif depth or token[0] in '{;$':
+            continue
+        elif token in RESULTS:
+            result = token
+        else:
+            token = MOVE_NUMBER_PATTERN.sub('', token)
+            if token:
+                moves.append(token)
+    return Game(headers, moves, result, offset)
+
+
+class PGNFile(object):
+    """A PGN file that can be streamed or indexed by game"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._offsets = None
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def __iter__(self):
+        self._file.seek(0)
+        return read_games(self._file)
+
+
+    def __len__(self):
+        return len(self.offsets())
+
+
+    def __getitem__(self, index):
+        """Seek to a game by its number in the file and read it"""
+        return self.game_at(self.offsets()[index])
+
+
+    def offsets(self):
+        """Return the byte offset of every game, scanning the file once"""
+        if self._offsets is None:
+            self._offsets = index_games(self.path)
+        return self._offsets
+
+
+    def game_at(self, offset):
+        """Read the game starting at a byte offset"""
+        self._file.seek(offset)
+        for game in read_games(self._file, offset):
+            return game
+        raise IndexError('No game at offset %i of %s' % (offset, self.path))
+
+
+    def close(self):
+        self._file.close()
+
+
+def index_games(path):
+    """Return the byte offset of every game of a PGN file"""
+    offsets = []
+    in_headers = False
+    in_movetext = False
+    offset = 0
+    with open(path, 'rb') as stream:
+        for line in stream:
+            line_offset = offset
+            offset += len(line)
+            text = line.strip()
+            if not text or text.startswith(b'%'):
+                continue
+            if text.startswith(b'[') and TAG_PATTERN.match(text.decode('utf-8', 'replace')):
+                if not in_headers:
+                    offsets.append(line_offset)
+                in_headers, in_movetext = True, False
+            else:
+                if not in_headers and not in_movetext:
+                    offsets.append(line_offset)
+                in_headers, in_movetext = False, True
+    return offsets
+
+
+def parse_games(path, workers=1, games_per_job=100):
+    """Yield the Games of a PGN file in order with their moves replayed to UCI.
+
+    A game whose moves do not replay is yielded with the message in its
+    error attribute. With more than one worker, runs of games_per_job
+    games are read and replayed by a process pool, each worker seeking
+    straight to its own byte range of the file.
+    """
+    if workers <= 1:
+        with open(path, 'rb') as stream:
+            for game in read_games(stream):
+                yield _replay(game)
+        return
+    offsets = index_games(path)
+    jobs = [(path, offsets[index], offsets[index + games_per_job] if index + games_per_job < len(offsets) else None)
+            for index in range(0, len(offsets), games_per_job)]
+    import multiprocessing
+    pool = multiprocessing.Pool(workers)
+    try:
+        pending = deque()
+        for job in jobs:
+            pending.append(pool.apply_async(_parse_range, (job,)))
+            if len(pending) >= workers * 2:
+                for game in pending.popleft().get():
+                    yield game
+        while pending:
+            for game in pending.popleft().get():
+                yield game
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _parse_range(job):
+    """Read and replay the games between two byte offsets of a file"""
+    path, start, end = job
+    with open(path, 'rb') as stream:
+        stream.seek(start)
+        return [_replay(game) for game in read_games(stream, start, end)]
+
+
+def _replay(game):
+    try:
+        game.uci_moves()
+    except ValueError as error:
+        game.error = str(error)
+    return game
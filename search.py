@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+"""
+Alpha-beta search for suggesting moves without an external engine
+
+Searcher runs an iterative deepening negamax alpha-beta search with
+quiescence on captures over Position.push and pop. A fixed-size
+transposition table keyed by the Zobrist key of the position remembers
+scores and best moves between iterations, and moves are tried in the
+order: table move, captures by most valuable victim and least valuable
+attacker, killer moves, the rest. The search stops at a depth, a time
+budget or a node budget, and with several workers the root moves are
+split between processes.
+"""
+import argparse
+from collections import namedtuple
+import time
+
+from bitboard import SQUARE_INDEX
+from evaluation import PIECE_VALUES
+from fen import Position
+
+MATE_SCORE = 100000
+# Scores beyond this are mates, stored in the table relative to the node
+MATE_BOUND = MATE_SCORE - 1000
+INFINITY = MATE_SCORE + 1
+MAX_DEPTH = 64
+TABLE_SIZE = 1 << 18
+EXACT, LOWER, UPPER = 0, 1, 2
+# How many nodes pass between two looks at the clock
+CLOCK_INTERVAL = 1024
+SYMBOL_VALUES = dict(zip('PNBRQKpnbrqk', PIECE_VALUES * 2))
+
+SearchResult = namedtuple('SearchResult', ['move', 'score', 'depth', 'nodes', 'seconds', 'nps', 'history'])
+
+
+class SearchAborted(Exception):
+    """Raised inside the search when the time or node budget runs out"""
+
+
+def evaluate(position):
+    """Return the evaluation kept up to date by the move path, from the side to move's point of view"""
+    score = position.evaluation
+    return score if position.active == 'w' else -score
+
+
+class TranspositionTable(object):
+    """A fixed number of slots indexed by Zobrist key.
+
+    A colliding key takes the slot over, while an entry for the same key is
+    only replaced by a search at least as deep.
+    """
+
+    def __init__(self, size=TABLE_SIZE):
+        if size < 1 or size & (size - 1):
+            raise ValueError('The table size must be a power of two: %r' % size)
+        self.size = size
+        self._mask = size - 1
+        self._slots = [None] * size
+
+
+    def get(self, key):
+        """Return the (key, depth, score, bound, move) entry for a key, or None"""
+        entry = self._slots[key & self._mask]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+
+    def store(self, key, depth, score, bound, move):
+        index = key & self._mask
+        entry = self._slots[index]
+        if entry is None or entry[0] != key or entry[1] <= depth:
+            self._slots[index] = (key, depth, score, bound, move)
+
+
+    def clear(self):
+        self._slots = [None] * self.size
+
+
+class Searcher(object):
+    """An iterative deepening alpha-beta search keeping its table between searches"""
+
+    def __init__(self, table_size=TABLE_SIZE, evaluate=evaluate):
+        self.table = TranspositionTable(table_size)
+        self.evaluate = evaluate
+        self.nodes = 0
+        self._killers = []
+        self._deadline = None
+        self._node_limit = None
+        self._can_abort = False
+
+
+    def search(self, position, max_depth=MAX_DEPTH, time_limit=None, node_limit=None,
+               root_moves=None, info=None):
+        """Search a Position and return a SearchResult for the best move found.
+
+        time_limit is in seconds. Depth 1 is always completed, after that
+        the search stops as soon as a budget runs out and the result of the
+        last completed depth is returned. root_moves restricts the moves
+        searched at the root, and info is called with a dictionary after
+        every completed depth.
+        """
+        position = position.copy()
+        # Scanning the board once here lets every node inherit the evaluation terms from the root
+        position.evaluation
+        moves = list(root_moves) if root_moves is not None else list(position.legal_moves())
+        start = time.perf_counter()
+        self.nodes = 0
+        self._killers = [[None, None] for _ in range(max_depth + 1)]
+        self._deadline = start + time_limit if time_limit is not None else None
+        self._node_limit = node_limit
+        self._can_abort = False
+        best_move, best_score, depth_reached, history = None, None, 0, []
+        if not moves:
+            score = -MATE_SCORE if position.is_check else 0
+            return SearchResult(None, score, 0, 0, 0.0, 0.0, history)
+        for depth in range(1, max_depth + 1):
+            try:
+                move, score = self.__search_root(position, moves, depth, best_move)
+            except SearchAborted:
+                break
+            best_move, best_score, depth_reached = move, score, depth
+            history.append((depth, move, score))
+            self._can_abort = True
+            if info is not None:
+                elapsed = time.perf_counter() - start
+                info({'depth': depth, 'move': move, 'score': score, 'nodes': self.nodes,
+                      'seconds': elapsed, 'nps': self.nodes / elapsed if elapsed else 0.0})
+            if abs(score) > MATE_BOUND:
+                break
+        elapsed = time.perf_counter() - start
+        return SearchResult(best_move, best_score, depth_reached, self.nodes, elapsed,
+                            self.nodes / elapsed if elapsed else 0.0, history)
+
+
+    def __search_root(self, position, moves, depth, previous_best):
+        moves = self.__order(position, moves, previous_best, 0)
+        alpha = -INFINITY
+        best_move = moves[0]
+        for move in moves:
+            position.push(move)
+            try:
+                score = -self.__negamax(position, depth - 1, -INFINITY, -alpha, 1)
+            finally:
+                position.pop()
+            if score > alpha:
+                alpha, best_move = score, move
+        self.table.store(position.zobrist, depth, alpha, EXACT, best_move)
+        return best_move, alpha
+
+
+    def __negamax(self, position, depth, alpha, beta, ply):
+        self.__count_node()
+        if position.halfmove_clock >= 100:
+            return 0
+        key = position.zobrist
+        entry = self.table.get(key)
+        table_move = None
+        if entry is not None:
+            table_move = entry[4]
+            if entry[1] >= depth:
+                score = _score_from_table(entry[2], ply)
+                if (entry[3] == EXACT or entry[3] == LOWER and score >= beta or
+                        entry[3] == UPPER and score <= alpha):
+                    return score
+        if depth <= 0:
+            return self.__quiesce(position, alpha, beta, ply)
+        moves = list(position.legal_moves())
+        if not moves:
+            return -MATE_SCORE + ply if position.is_check else 0
+        original_alpha = alpha
+        best_score, best_move = -INFINITY, None
+        for move in self.__order(position, moves, table_move, ply):
+            quiet = position.piece_at(SQUARE_INDEX[move[2:4]]) == ' '
+            position.push(move)
+            try:
+                score = -self.__negamax(position, depth - 1, -beta, -alpha, ply + 1)
+            finally:
+                position.pop()
+            if score > best_score:
+                best_score, best_move = score, move
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                if quiet and ply < len(self._killers):
+                    killers = self._killers[ply]
+                    if killers[0] != move:
+                        killers[1], killers[0] = killers[0], move
+                break
+        if best_score <= original_alpha:
+            bound = UPPER
+        elif best_score >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.table.store(key, depth, _score_to_table(best_score, ply), bound, best_move)
+        return best_score
+
+
+    def __quiesce(self, position, alpha, beta, ply):
+        """Search captures only until the position is quiet"""
+        stand_pat = self.evaluate(position)
+        if stand_pat >= beta:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+        captures = [move for move in position.legal_moves()
+                    if position.piece_at(SQUARE_INDEX[move[2:4]]) != ' ']
+        for move in self.__order(position, captures, None, None):
+            self.__count_node()
+            position.push(move)
+            try:
+                score = -self.__quiesce(position, -beta, -alpha, ply + 1)
+            finally:
+                position.pop()
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+
+    def __order(self, position, moves, table_move, ply):
+        """Sort moves: table move, captures by MVV-LVA, promotions, killers, then the rest"""
+        killers = self._killers[ply] if ply is not None and ply < len(self._killers) else ()
+        piece_at = position.piece_at
+
+        def key(move):
+            if move == table_move:
+                return -1000000
+            victim = piece_at(SQUARE_INDEX[move[2:4]])
+            if victim != ' ':
+                return -10 * SYMBOL_VALUES[victim] + SYMBOL_VALUES[piece_at(SQUARE_INDEX[move[0:2]])] // 100 - 1000
+            if len(move) == 5:
+                return -500
+            if move in killers:
+                return -100
+            return 0
+
+        return sorted(moves, key=key)
+
+
+    def __count_node(self):
+        self.nodes += 1
+        if not self._can_abort:
+            return
+        if self._node_limit is not None and self.nodes >= self._node_limit:
+            raise SearchAborted()
+        if self._deadline is not None and self.nodes % CLOCK_INTERVAL == 0 and time.perf_counter() >= self._deadline:
+            raise SearchAborted()
+
+
+def _score_to_table(score, ply):
+    """Make mate scores relative to the node before storing them"""
+    if score > MATE_BOUND:
+        return score + ply
+    if score < -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def _score_from_table(score, ply):
+    if score > MATE_BOUND:
+        return score - ply
+    if score < -MATE_BOUND:
+        return score + ply
+    return score
+
+
+def search(position, max_depth=MAX_DEPTH, time_limit=None, node_limit=None, workers=1,
+           table_size=TABLE_SIZE, info=None):
+    """Search a Position for its best move, splitting the root moves between workers processes.
+
+    With several workers each process searches its share of the root moves
+    with its own table and the same budget (node_limit is shared out); the
+    move with the best score at the deepest depth every process completed
+    is returned, with the nodes of all processes added up.
+    """
+    moves = list(position.legal_moves())
+    if workers <= 1 or len(moves) < 2:
+        return Searcher(table_size).search(position, max_depth, time_limit, node_limit, info=info)
+    workers = min(workers, len(moves))
+    shares = [moves[index::workers] for index in range(workers)]
+    worker_node_limit = node_limit // workers if node_limit is not None else None
+    jobs = [(position.fen, share, max_depth, time_limit, worker_node_limit, table_size) for share in shares]
+    start = time.perf_counter()
+    import multiprocessing
+    pool = multiprocessing.Pool(workers)
+    try:
+        results = pool.map(_search_share, jobs)
+    finally:
+        pool.terminate()
+        pool.join()
+    elapsed = time.perf_counter() - start
+    nodes = sum(result.nodes for result in results)
+    depth = min(result.depth for result in results)
+    history = []
+    for history_depth in range(1, depth + 1):
+        entries = [result.history[history_depth - 1] for result in results]
+        history.append(max(entries, key=lambda entry: entry[2]))
+    move, score = history[-1][1], history[-1][2]
+    return SearchResult(move, score, depth, nodes, elapsed, nodes / elapsed if elapsed else 0.0, history)
+
+
+def _search_share(job):
+    """Search one share of the root moves in a worker process"""
+    fen, moves, max_depth, time_limit, node_limit, table_size = job
+    return Searcher(table_size).search(Position(fen), max_depth, time_limit, node_limit, root_moves=moves)
+
+
+def main(args):
+    position = Position(args.fen)
+
+    def report(line):
+        print('depth %2i  score %6i  nodes %9i  %7.3fs  %9.0f nps  %s' %
+              (line['depth'], line['score'], line['nodes'], line['seconds'], line['nps'], line['move']))
+
+    result = search(position, args.depth, args.time, args.nodes, args.workers,
+                    info=report if args.workers <= 1 else None)
+    if args.workers > 1:
+        for depth, move, score in result.history:
+            print('depth %2i  score %6i  %s' % (depth, score, move))
+    print('best move %s (%s) at depth %i: %i nodes in %.3fs, %.0f nps' % (
+        result.move, result.move and position.san(result.move), result.depth,
+        result.nodes, result.seconds, result.nps))
+    return result
+
+
+def parse_args():
+    """Parse the arguments entered by the user. Run search.py --help for more information."""
+    parser = argparse.ArgumentParser(
+        description='Search a position for its best move and report depth and nodes per second.'
+    )
+    parser.add_argument('fen', metavar='FEN', nargs='?',
+        default='rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+        help='the FEN position string to search')
+    parser.add_argument('-d', '--depth', type=int, default=MAX_DEPTH,
+        help='the deepest iteration to search (default %(default)s)')
+    parser.add_argument('-t', '--time', type=float, default=5.0,
+        help='the time budget in seconds (default %(default)s)')
+    parser.add_argument('-n', '--nodes', type=int,
+        help='the node budget')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+        help='the number of processes splitting the root moves (default %(default)s)')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    main(parse_args())
@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+"""
+A long-lived position service speaking JSON lines over TCP
+
+Each request is one JSON object on one line, answered by one JSON line in
+the order the requests arrived on the connection:
+
+    {"id": 1, "fen": "...", "moves": ["e2e4", "e7e5"], "probe": true, "render": "unicode"}
+
+All fields are optional; the FEN defaults to the initial position, the
+moves may be in UCI, LAN or SAN, "probe" asks the local tablebase for the
+position reached and "render" names a display renderer. The answer echoes
+the id and gives the "fen" reached, with "probe" and "board" when asked,
+or an "error" message.
+
+Requests from every connection go through one bounded queue and are
+handled in batches on a bounded pool of worker threads, so the event loop
+stays free for I/O. When the queue is full a connection stops being read
+until there is room, which pushes back on clients through TCP. Parsed
+Positions (Position.cached), the memory-mapped tables and the answers to
+earlier probes stay warm for the life of the service.
+"""
+import argparse
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+import time
+
+from cache import LRUCache
+from display import get_renderer
+from fen import Position
+from metrics import REGISTRY
+from tablebase import MissingTableError, Tablebase
+
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+# The most requests handed to a worker in one batch
+BATCH_SIZE = 64
+# How long in seconds the first request of a batch waits for others to join it
+BATCH_DELAY = 0.002
+# The most requests waiting for a worker before connections stop being read
+QUEUE_SIZE = 1024
+WORKERS = 2
+PROBE_CACHE_SIZE = 65536
+# The longest request line accepted, in bytes
+LINE_LIMIT = 1 << 20
+
+
+class PositionService(object):
+    """Parse, play, probe and render positions for clients of a JSON lines socket"""
+
+    def __init__(self, tablebase=None, workers=WORKERS, batch_size=BATCH_SIZE, batch_delay=BATCH_DELAY,
+                 queue_size=QUEUE_SIZE, registry=REGISTRY):
+        if workers < 1 or batch_size < 1 or queue_size < 1:
+            raise ValueError('workers, batch_size and queue_size must be at least 1')
+        self.tablebase = Tablebase(tablebase) if tablebase else None
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.queue_size = queue_size
+        self.probe_cache = LRUCache(PROBE_CACHE_SIZE)
+        self.port = None
+        self._requests = registry.counter('service_requests_total', 'Requests answered by the service')
+        self._errors = registry.counter('service_errors_total', 'Requests the service answered with an error')
+        self._batch_seconds = registry.histogram('service_batch_seconds', 'Time spent handling one batch')
+        self._queue = None
+        self._executor = None
+        self._server = None
+        self._batcher = None
+        self._clients = {}
+
+
+    def warm(self, fens):
+        """Parse FEN strings into the shared Position cache ahead of the requests for them"""
+        count = 0
+        for fen in fens:
+            fen = fen.strip()
+            if fen:
+                Position.cached(fen)
+                count += 1
+        return count
+
+
+    def handle(self, request):
+        """Answer one decoded request, raising ValueError for a bad one"""
+        if not isinstance(request, dict):
+            raise ValueError('A request must be a JSON object: %r' % (request,))
+        fen = request.get('fen') or START_FEN
+        moves = request.get('moves') or []
+        if not isinstance(fen, str):
+            raise ValueError('fen must be a string: %r' % (fen,))
+        if not isinstance(moves, list) or not all(isinstance(move, str) for move in moves):
+            raise ValueError('moves must be a list of strings: %r' % (moves,))
+        position = Position.cached(fen)
+        if moves:
+            position = position.apply_moves(moves)
+        answer = OrderedDict([('fen', position.fen)])
+        if request.get('probe'):
+            answer['probe'] = self.probe(position)
+        renderer = request.get('render')
+        if renderer is not None and not isinstance(renderer, str):
+            raise ValueError('render must be the name of a renderer: %r' % (renderer,))
+        if renderer:
+            answer['board'] = get_renderer(renderer)(position.board)
+        return answer
+
+
+    def probe(self, position):
+        """Return the tablebase answer for a Position, cached by Zobrist key"""
+        if self.tablebase is None:
+            raise ValueError('No tablebase is configured')
+        return self.probe_cache.get(position.zobrist, lambda key: self.tablebase.probe(position))
+
+
+    async def start(self, host='127.0.0.1', port=0):
+        """Start listening and return the server; port 0 picks a free port, read back from self.port"""
+        self._queue = asyncio.Queue(self.queue_size)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers)
+        self._batcher = asyncio.ensure_future(self.__run_batches())
+        self._server = await asyncio.start_server(self.__serve_client, host, port, limit=LINE_LIMIT)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self._server
+
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        # Closing the connections ends their handlers once the requests already read are answered
+        for writer in list(self._clients):
+            writer.close()
+        await asyncio.gather(*self._clients.values(), return_exceptions=True)
+        if self._batcher is not None:
+            self._batcher.cancel()
+            try:
+                await self._batcher
+            except asyncio.CancelledError:
+                pass
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        if self.tablebase is not None:
+            self.tablebase.close()
+
+
+    async def __serve_client(self, reader, writer):
+        """Queue the requests of one connection and write their answers back in order"""
+        self._clients[writer] = asyncio.current_task()
+        answers = asyncio.Queue()
+        responder = asyncio.ensure_future(self.__respond(answers, writer))
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # The line went over LINE_LIMIT; the stream cannot be resynchronized
+                    future = loop.create_future()
+                    future.set_result(self.__error(None, 'Request line too long'))
+                    await answers.put(future)
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                future = loop.create_future()
+                await answers.put(future)
+                # Blocks while the queue is full, which stops this connection being read
+                await self._queue.put((line, future))
+        except ConnectionError:
+            pass
+        finally:
+            await answers.put(None)
+            await responder
+            del self._clients[writer]
+
+
+    async def __respond(self, answers, writer):
+        try:
+            while True:
+                future = await answers.get()
+                if future is None:
+                    break
+                writer.write(json.dumps(await future).encode('utf-8') + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+    async def __run_batches(self):
+        """Gather queued requests into batches and hand each one to a worker thread"""
+        loop = asyncio.get_running_loop()
+        slots = asyncio.Semaphore(self.workers)
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_delay
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Only as many batches as workers are taken off the queue, the rest wait there
+            await slots.acquire()
+            job = loop.run_in_executor(self._executor, self.__handle_batch, [line for line, _ in batch])
+            job.add_done_callback(lambda job, batch=batch: self.__deliver(job, batch, slots))
+
+
+    def __handle_batch(self, lines):
+        with self._batch_seconds.time():
+            return [self.__handle_line(line) for line in lines]
+
+
+    def __handle_line(self, line):
+        request_id = None
+        try:
+            request = json.loads(line)
+            if isinstance(request, dict):
+                request_id = request.get('id')
+            answer = self.handle(request)
+        except (ValueError, MissingTableError) as error:
+            return self.__error(request_id, error)
+        except Exception as error:
+            # Whatever one request raises, the other requests of its batch are still answered
+            logging.getLogger(__name__).exception('Request %r failed', request_id)
+            return self.__error(request_id, 'Internal error: %s: %s' % (type(error).__name__, error))
+        self._requests.inc()
+        if request_id is not None:
+            answer['id'] = request_id
+            answer.move_to_end('id', last=False)
+        return answer
+
+
+    def __error(self, request_id, error):
+        self._requests.inc()
+        self._errors.inc()
+        if isinstance(error, KeyError):
+            error = error.args[0]
+        answer = OrderedDict([('error', str(error))])
+        if request_id is not None:
+            answer['id'] = request_id
+            answer.move_to_end('id', last=False)
+        return answer
+
+
+    @staticmethod
+    def __deliver(job, batch, slots):
+        slots.release()
+        if job.cancelled():
+            return
+        error = job.exception()
+        for index, (_, future) in enumerate(batch):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_result(OrderedDict([('error', 'Internal error: %s' % error)]))
+            else:
+                future.set_result(job.result()[index])
+
+
+async def serve(args):
+    logger = logging.getLogger(__name__)
+    service = PositionService(args.tablebase, args.workers, args.batch_size, queue_size=args.queue_size)
+    if args.warm:
+        start = time.perf_counter()
+        with open(args.warm) as warm_file:
+            count = service.warm(warm_file)
+        logger.info('Warmed %i positions in %.3f seconds.', count, time.perf_counter() - start)
+    server = await service.start(args.host, args.port)
+    logger.info('Listening on %s:%i', args.host, service.port)
+    try:
+        await server.serve_forever()
+    finally:
+        await service.close()
+        if args.metrics:
+            REGISTRY.dump(args.metrics)
+
+
+def parse_args():
+    """Parse the arguments entered by the user. Run service.py --help for more information."""
+    parser = argparse.ArgumentParser(
+        description='Serve FEN parsing, moves, tablebase probes and boards as JSON lines over TCP.'
+    )
+    parser.add_argument('--host', default='127.0.0.1',
+        help='the address to listen on (default %(default)s)')
+    parser.add_argument('-p', '--port', type=int, default=8765,
+        help='the port to listen on, 0 for any free port (default %(default)s)')
+    parser.add_argument('--tablebase', metavar='DIR',
+        help='answer probe requests from the tables in DIR')
+    parser.add_argument('-w', '--workers', type=int, default=WORKERS,
+        help='the number of worker threads handling batches (default %(default)s)')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+        help='the most requests handled in one batch (default %(default)s)')
+    parser.add_argument('--queue-size', type=int, default=QUEUE_SIZE,
+        help='the most requests waiting before clients are pushed back (default %(default)s)')
+    parser.add_argument('--warm', metavar='FILE',
+        help='parse the FEN strings in FILE, one per line, before accepting requests')
+    parser.add_argument('--metrics', metavar='FILE',
+        help='write the service metrics to FILE on shutdown, as Prometheus text for .prom files and JSON otherwise')
+    parser.add_argument('-v', '--verbose', action='store_true',
+        help='log startup and shutdown')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    logging.basicConfig(format='%(asctime)s %(levelname)-8s %(message)s',
+                        level=logging.INFO if args.verbose else logging.WARNING)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
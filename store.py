@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""This is the position store module.
+
+A store file is a 16 byte header (magic and record count) followed by one
+32 byte Position.to_bytes record per position.  PositionStore memory-maps
+the file so positions can be read by index or iterated without loading the
+file, and array() exposes the records as a zero-copy NumPy structured array
+when NumPy is installed.
+"""
+import mmap
+import struct
+
+from fen import PACKED_POSITION, Position
+
+HEADER = struct.Struct('<8sQ')
+MAGIC = b'FENPOS1\n'
+RECORD_SIZE = PACKED_POSITION.size
+# The NumPy view of one record, matching PACKED_POSITION field for field
+RECORD_FIELDS = [
+    ('occupied', '<u8'),
+    ('pieces', 'u1', (16,)),
+    ('flags', 'u1'),
+    ('en_passant_file', 'u1'),
+    ('halfmove_clock', '<u2'),
+    ('fullmove_number', '<u2'),
+    ('reserved', '<u2'),
+]
+
+
+def write_store(path, positions):
+    """Write Positions (or their to_bytes records) to a store file and return the count"""
+    count = 0
+    with open(path, 'wb') as store_file:
+        store_file.write(HEADER.pack(MAGIC, 0))
+        for position in positions:
+            record = position if isinstance(position, bytes) else position.to_bytes()
+            if len(record) != RECORD_SIZE:
+                raise ValueError('Position records must be %i bytes long' % RECORD_SIZE)
+            store_file.write(record)
+            count += 1
+        store_file.seek(0)
+        store_file.write(HEADER.pack(MAGIC, count))
+    return count
+
+
+class PositionStore(object):
+    """A memory-mapped, read-only file of packed positions"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as store_file:
+            self._map = mmap.mmap(store_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < HEADER.size:
+            self._map.close()
+            raise ValueError('Not a position store: %s' % path)
+        magic, self.count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or len(self._map) != HEADER.size + self.count * RECORD_SIZE:
+            self._map.close()
+            raise ValueError('Not a position store: %s' % path)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def __len__(self):
+        return self.count
+
+
+    def __getitem__(self, index):
+        return Position.from_bytes(self.record(index))
+
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield self[index]
+
+
+    def record(self, index):
+        """Return the packed bytes of a position as a view into the mapped file"""
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError('Position store index out of range: %i' % index)
+        offset = HEADER.size + index * RECORD_SIZE
+        return memoryview(self._map)[offset:offset + RECORD_SIZE]
+
+
+    def array(self):
+        """Return the records as a NumPy structured array sharing the mapped memory"""
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError('PositionStore.array() requires NumPy to be installed')
+        return numpy.frombuffer(self._map, dtype=numpy.dtype(RECORD_FIELDS),
+                                count=self.count, offset=HEADER.size)
+
+
+    def close(self):
+        self._map.close()
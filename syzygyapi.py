@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""This is the syzygy-tables.info API client module.
+
+SyzygyClient keeps one pooled keep-alive session for all its requests,
+retries failed calls with exponential backoff and can probe thousands of
+positions concurrently through probe_many.  Answers can be kept across
+runs in a ResponseCache, an SQLite file keyed by the normalized FEN with
+an optional time to live and a bound on the number of entries.
+
+requests, sqlite3 and asyncio are only imported once a client, a cache or
+a concurrent probe is created, so importing this module stays cheap for
+programs that never reach the network.
+"""
+import json
+import threading
+import time
+
+API_URL = 'https://syzygy-tables.info/api/v2'
+# Status codes worth another attempt after a pause
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+
+def normalize_fen(fen):
+    """Return the part of a FEN the tablebase answer depends on.
+
+    The move counters are dropped so positions reached at different points
+    of a game share one cache entry.
+    """
+    fields = fen.split()
+    if len(fields) < 4:
+        raise ValueError('FEN must have at least four space-delimited fields: %s' % fen)
+    return ' '.join(fields[:4])
+
+
+class ResponseCache(object):
+    """A persistent cache of API answers with TTL and least recently used eviction"""
+
+    def __init__(self, path, ttl=None, max_entries=None):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        import sqlite3
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS responses ('
+                'fen TEXT PRIMARY KEY, body TEXT NOT NULL, '
+                'stored REAL NOT NULL, used REAL NOT NULL)'
+            )
+            self._connection.execute('CREATE INDEX IF NOT EXISTS responses_used ON responses (used)')
+
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+
+    def get(self, fen):
+        """Return the cached answer for a FEN, or None when it is missing or expired"""
+        key = normalize_fen(fen)
+        now = time.time()
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                'SELECT body, stored FROM responses WHERE fen = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            if self.ttl is not None and now - row[1] > self.ttl:
+                self._connection.execute('DELETE FROM responses WHERE fen = ?', (key,))
+                return None
+            self._connection.execute('UPDATE responses SET used = ? WHERE fen = ?', (now, key))
+        return json.loads(row[0])
+
+
+    def set(self, fen, response):
+        """Store the answer for a FEN, evicting the least recently used entries beyond the bound"""
+        key = normalize_fen(fen)
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO responses (fen, body, stored, used) VALUES (?, ?, ?, ?)',
+                (key, json.dumps(response), now, now))
+            if self.max_entries is not None:
+                self._connection.execute(
+                    'DELETE FROM responses WHERE fen IN ('
+                    'SELECT fen FROM responses ORDER BY used DESC LIMIT -1 OFFSET ?)',
+                    (self.max_entries,))
+
+
+    def close(self):
+        self._connection.close()
+
+
+class SyzygyClient(object):
+    """A reusable client for the syzygy-tables.info API"""
+
+    def __init__(self, url=API_URL, timeout=10, retries=3, backoff=0.5,
+                 pool_size=10, cache=None):
+        self.url = url
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.cache = cache
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def probe(self, fen):
+        """Return the API answer for a FEN, from the cache when possible"""
+        if self.cache is not None:
+            cached = self.cache.get(fen)
+            if cached is not None:
+                return cached
+        response = self.__get(fen)
+        if self.cache is not None:
+            self.cache.set(fen, response)
+        return response
+
+
+    def probe_many(self, fens, concurrency=None):
+        """Probe many FENs concurrently and return the answers in input order.
+
+        At most concurrency requests (the pool size by default) are in
+        flight at once. A FEN whose request failed for good has the
+        exception in its place instead of an answer.
+        """
+        import asyncio
+        return asyncio.run(self.probe_async(fens, concurrency))
+
+
+    async def probe_async(self, fens, concurrency=None):
+        """Coroutine behind probe_many for callers already running an event loop"""
+        import asyncio
+        from concurrent.futures import ThreadPoolExecutor
+        concurrency = concurrency or self.pool_size
+        semaphore = asyncio.Semaphore(concurrency)
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            async def bounded_probe(fen):
+                async with semaphore:
+                    return await loop.run_in_executor(executor, self.probe, fen)
+            return await asyncio.gather(*[bounded_probe(fen) for fen in fens],
+                                        return_exceptions=True)
+
+
+    def close(self):
+        self.session.close()
+
+
+    def __get(self, fen):
+        import requests
+        attempt = 0
+        while True:
+            try:
+                response = self.session.get(self.url, params={ 'fen': fen }, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.retries:
+                    raise
+                delay = self.backoff * 2 ** attempt
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt >= self.retries:
+                    response.raise_for_status()
+                    return response.json()
+                delay = self.__retry_after(response) or self.backoff * 2 ** attempt
+                response.close()
+            attempt += 1
+            time.sleep(delay)
+
+
+    @staticmethod
+    def __retry_after(response):
+        """Return the delay the server asked for in seconds, if it gave a plain number"""
+        try:
+            return float(response.headers.get('Retry-After', ''))
+        except ValueError:
+            return None
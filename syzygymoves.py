@@ -3,49 +3,70 @@
 Script to call the chess move API at https://syzygy.info/api/v2
 
 When provided a FEN string to start from this script will display the initial
-position, call the API, choose the first move provided from the returned JSON,
+position, call the API (or probe a local tablebase directory given with
+--tablebase), choose the first move provided from the returned JSON,
 generate the next FEN string and display the game board created by the given
 move. If no FEN string is provided, the script will start with the default
 initial position of the board.
+
+Given --input, the script streams a whole file (or standard input) of FEN
+strings through parsing, probing and move_piece in one run, and with
+--output jsonl writes one JSON object per position.
 """
-import argparse
 from collections import OrderedDict
-import datetime
+import contextlib
 import json
 import logging
-import logging.handlers
 import os
 import sys
-import traceback
+import time
+
+from fen import parse_many
+from metrics import REGISTRY, instrument
+from syzygyapi import API_URL, ResponseCache, SyzygyClient
+from tablebase import Tablebase
 
-import requests
-from fen import Position
+
+# The number of parsed positions probed together in batch mode
+BATCH_SIZE = 256
 
 
 def main(args):
     logger = logging.getLogger(__name__)
+    run_seconds = REGISTRY.histogram('syzygymoves_run_seconds', 'Time spent in one syzygymoves run')
+    positions = REGISTRY.counter('syzygymoves_positions_total', 'Positions analysed by syzygymoves')
+    failures = REGISTRY.counter('syzygymoves_failures_total', 'Positions syzygymoves could not analyse')
+    if args.metrics:
+        instrument()
 
-    start = datetime.datetime.now()
+    start = time.perf_counter()
 
     # Do something cool in here
     try:
-        logger.debug('args.fen: %r', args.fen)
-        p1 = Position(args.fen)
-        syzygy_params = { 'fen': p1.fen }
-        response = requests.get('https://syzygy-tables.info/api/v2', params=syzygy_params)
-        j = response.json(object_pairs_hook=OrderedDict)
-        print(p1)
-        moves = list(j['moves'].keys())
-        print(moves)
-        move = moves[0]
-        p2 = p1.move_piece(move)
-        print(p2)
+        if args.input:
+            logger.debug('args.input: %r', args.input)
+            lines = sys.stdin if args.input == '-' else open(args.input)
+        else:
+            logger.debug('args.fen: %r', args.fen)
+            lines = [args.fen]
+        try:
+            with open_prober(args) as probe_many:
+                # A single FEN raises its errors, a batch reports them per line
+                for record, p1, p2 in analyse(lines, probe_many, args.jobs, strict=not args.input):
+                    positions.inc()
+                    if 'error' in record:
+                        failures.inc()
+                    emit(record, p1, p2, args)
+        finally:
+            if args.input and args.input != '-':
+                lines.close()
 
     # Handle specific errors
     except ValueError:
         raise
     # Handle any unknown errors here
     except:
+        import traceback
         tb = sys.exc_info()[2]
         tbinfo = traceback.format_tb(tb)[0]
         pymsg = 'PYTHON ERRORS:\nTraceback info:\n' + tbinfo + '\nError Info:\n' + str(sys.exc_info()[1])
@@ -54,17 +75,95 @@ def main(args):
         raise
     # Run this code no matter what happens with the errors
     finally:
-        end = datetime.datetime.now()
-        total = end - start
-        days = total.days
-        hours = divmod(total.seconds, 3600)
-        minutes = divmod(hours[1], 60)
-        seconds = minutes[1]
-        logger.info('Processing took {0} days, {1} hours, {2} minutes and {3} seconds.'.format(days, hours[0], minutes[0], seconds))
+        total = time.perf_counter() - start
+        run_seconds.observe(total)
+        logger.info('Processing took %.3f seconds.', total)
+        if args.metrics:
+            REGISTRY.dump(args.metrics)
+
+
+@contextlib.contextmanager
+def open_prober(args):
+    """Yield a function mapping a list of Positions to their tablebase answers"""
+    if args.tablebase:
+        with Tablebase(args.tablebase) as tablebase:
+            yield lambda positions: [tablebase.probe(position) for position in positions]
+        return
+    cache = ResponseCache(args.cache) if args.cache else None
+    try:
+        with SyzygyClient(url=args.api_url, cache=cache) as client:
+            yield lambda positions: client.probe_many([position.fen for position in positions],
+                                                      concurrency=args.jobs)
+    finally:
+        if cache is not None:
+            cache.close()
+
+
+def analyse(lines, probe_many, jobs=1, strict=False):
+    """Parse, probe and play the best move for every FEN line.
+
+    Yields a (record, position, next position) tuple per non-blank line,
+    where record is the dictionary written out as one JSON line. Lines
+    that fail to parse or probe carry an 'error' entry instead of moves,
+    unless strict is set, in which case the error is raised.
+    """
+    pending = []
+    for result in parse_many(lines, workers=jobs):
+        pending.append(result)
+        if len(pending) >= BATCH_SIZE:
+            for analysed in _analyse_batch(pending, probe_many, strict):
+                yield analysed
+            pending = []
+    for analysed in _analyse_batch(pending, probe_many, strict):
+        yield analysed
+
+
+def _analyse_batch(results, probe_many, strict):
+    answers = iter(probe_many([result.position for result in results if result.error is None]))
+    for result in results:
+        record = OrderedDict([('line', result.line_number), ('fen', result.fen)])
+        if result.error is not None:
+            if strict:
+                raise ValueError(result.error)
+            record['error'] = result.error
+            yield record, None, None
+            continue
+        answer = next(answers)
+        if isinstance(answer, Exception):
+            if strict:
+                raise answer
+            record['error'] = '%s: %s' % (type(answer).__name__, answer)
+            yield record, result.position, None
+            continue
+        moves = list(answer['moves'].keys())
+        record['moves'] = moves
+        next_position = None
+        if moves:
+            next_position = result.position.move_piece(moves[0])
+            record['move'] = moves[0]
+            record['next_fen'] = next_position.fen
+        yield record, result.position, next_position
+
+
+def emit(record, position, next_position, args, output=None):
+    """Write one analysed position as a JSON line or as text and boards"""
+    output = output or sys.stdout
+    if args.output == 'jsonl':
+        output.write(json.dumps(record) + '\n')
+        return
+    if 'error' in record:
+        output.write('line %i: %s\n' % (record['line'], record['error']))
+        return
+    if not args.no_render:
+        output.write('%s\n' % position)
+    output.write('%s\n' % record['moves'])
+    if next_position is not None:
+        output.write('%s\n' % (record['next_fen'] if args.no_render else next_position))
 
 
 def parse_args():
     """Parse the arguments entered by the user. Run syzygymoves.py --help for more information."""
+    import argparse
     logger = logging.getLogger(__name__)
 
     class VerboseAction(argparse.Action):
@@ -118,6 +217,24 @@ def parse_args():
     parser.add_argument('fen', metavar='FEN', type=str, action='store',
         default = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
         help='The FEN position string to start from', nargs='?')
+    parser.add_argument('--tablebase', metavar='DIR',
+        help='probe the tables in DIR instead of calling the syzygy-tables.info API')
+    parser.add_argument('--api-url', default=API_URL,
+        help='the tablebase API endpoint to call (default %(default)s)')
+    parser.add_argument('--cache', metavar='FILE',
+        help='keep API answers in the SQLite cache FILE across runs')
+    batch_group = parser.add_argument_group('batch options')
+    batch_group.add_argument('--input', metavar='FILE',
+        help='read one FEN per line from FILE, or from standard input for -, instead of FEN')
+    batch_group.add_argument('--output', choices=('text', 'jsonl'), default='text',
+        help='print boards and moves as text or one JSON object per position (default %(default)s)')
+    batch_group.add_argument('-j', '--jobs', type=int, default=1,
+        help='the number of parsing processes and concurrent API calls (default %(default)s)')
+    batch_group.add_argument('--no-render', action='store_true',
+        help='print FEN strings instead of ASCII boards in text output')
+    parser.add_argument('--metrics', metavar='FILE',
+        help='time the parsing, move and rendering steps and write the metrics to FILE, '
+             'as Prometheus text for .prom files and JSON otherwise')
     log_group = parser.add_argument_group('logging options')
     log_group.add_argument('-v', '--verbose', const=1, dest='verbose',
         default=logging.WARNING, action=VerboseAction,
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""This is the local endgame tablebase probing module.
+
+Tables live in one directory with a WDL file and a DTZ file per material
+signature, as returned by Position.material_signature, which lists the
+stronger side first whatever its color.  Two kinds of tables are read:
+
+* Syzygy tables (``<signature>.rtbw`` and ``<signature>.rtbz``), as
+  distributed by the Syzygy project, probed through chess.syzygy when
+  python-chess is installed.
+* Key/value tables (``<signature>.fentbw`` and ``<signature>.fentbz``), as
+  written by write_key_value_table for tests and small hand-made sets.
+  Each is a sorted key file (see keyfile) memory-mapped on first use,
+  holding the Zobrist keys of its positions with one signed 16-bit value
+  per key, so a probe is a binary search that only touches the pages it
+  needs.  Positions where Black is the stronger side are stored and looked
+  up with their colors mirrored, as in the Syzygy tables.
+
+The values are given from the point of view of the side to move: WDL is -2
+(loss) to 2 (win) and DTZ is the signed distance to the next zeroing move.
+"""
+from collections import OrderedDict
+import os
+import struct
+import threading
+
+from keyfile import SortedKeyFile, write_sorted_key_file
+
+VALUE = struct.Struct('<h')
+MAGIC = {
+    'wdl': b'FENTBW1\n',
+    'dtz': b'FENTBZ1\n',
+}
+EXTENSIONS = {
+    'wdl': '.fentbw',
+    'dtz': '.fentbz',
+}
+SYZYGY_EXTENSIONS = {
+    'wdl': '.rtbw',
+    'dtz': '.rtbz',
+}
+
+
+class MissingTableError(KeyError):
+    """Raised when no table covers the material or the position probed"""
+
+
+def table_key(position):
+    """Return the Zobrist key a position is stored under in a key/value table"""
+    if position.is_mirrored_material:
+        return position.mirror().zobrist
+    return position.zobrist
+
+
+class KeyValueTable(object):
+    """A memory-mapped key/value table of Zobrist keys and their WDL or DTZ values"""
+
+    def __init__(self, path, kind):
+        self.path = path
+        self.kind = kind
+        self._file = SortedKeyFile(path, MAGIC[kind], VALUE.size, '%s key/value table' % kind.upper())
+        self.count = self._file.count
+
+
+    def __len__(self):
+        return self.count
+
+
+    def get(self, key):
+        """Return the value stored for a Zobrist key, or None when it is absent"""
+        index = self._file.find(key)
+        if index is None:
+            return None
+        return VALUE.unpack_from(self._file.map, self._file.value_offset(index))[0]
+
+
+    def close(self):
+        self._file.close()
+
+
+class Tablebase(object):
+    """The Syzygy and key/value tables found in a directory, opened lazily by material signature"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._paths = {}
+        self._tables = {}
+        self._syzygy_tables = set()
+        self._syzygy = None
+        # Guards opening tables, so threads probing at once map each file only once
+        self._lock = threading.Lock()
+        for name in os.listdir(directory):
+            signature, extension = os.path.splitext(name)
+            for kind in EXTENSIONS:
+                if extension == EXTENSIONS[kind]:
+                    self._paths[(signature, kind)] = os.path.join(directory, name)
+                elif extension == SYZYGY_EXTENSIONS[kind]:
+                    self._syzygy_tables.add((signature, kind))
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def signatures(self):
+        """Return the material signatures that have a WDL table"""
+        return sorted(set(signature for signature, kind in self._paths if kind == 'wdl') |
+                      set(signature for signature, kind in self._syzygy_tables if kind == 'wdl'))
+
+
+    def probe_wdl(self, position):
+        """Return the win/draw/loss value of a position for the side to move"""
+        return self.__probe(position, 'wdl')
+
+
+    def probe_dtz(self, position):
+        """Return the distance to zeroing of a position for the side to move"""
+        return self.__probe(position, 'dtz')
+
+
+    def probe(self, position):
+        """Probe a position and rank its legal moves, best first.
+
+        The result has the shape of the syzygy-tables.info API answer: the
+        position's own 'wdl' and 'dtz' and an ordered 'moves' mapping of UCI
+        moves to the values of the position each one leads to, seen from
+        the opponent, so the first move leaves the opponent worst off.
+        Moves into positions missing from the tables are ranked last.
+        """
+        moves = []
+        for move in position.legal_moves():
+            child = position.move_piece(move)
+            wdl = self.__probe_or_none(child, 'wdl')
+            dtz = self.__probe_or_none(child, 'dtz')
+            moves.append(OrderedDict([
+                ('uci', move),
+                ('wdl', wdl),
+                ('dtz', dtz),
+                ('zeroing', child.halfmove_clock == 0),
+            ]))
+        moves.sort(key=self.__move_rank)
+        return OrderedDict([
+            ('wdl', self.__probe_or_none(position, 'wdl')),
+            ('dtz', self.__probe_or_none(position, 'dtz')),
+            ('moves', OrderedDict((move['uci'], move) for move in moves)),
+        ])
+
+
+    def close(self):
+        with self._lock:
+            for table in self._tables.values():
+                table.close()
+            self._tables = {}
+            if self._syzygy is not None:
+                self._syzygy.close()
+                self._syzygy = None
+
+
+    @staticmethod
+    def __move_rank(move):
+        if move['wdl'] is None:
+            return (1, 0, 0)
+        # Leave the opponent the worst result, then the shortest loss or longest win for them
+        return (0, move['wdl'], -(move['dtz'] or 0))
+
+
+    def __probe_or_none(self, position, kind):
+        try:
+            return self.__probe(position, kind)
+        except MissingTableError:
+            return None
+
+
+    def __probe(self, position, kind):
+        signature = position.material_signature
+        table = self._tables.get((signature, kind))
+        if table is None:
+            path = self._paths.get((signature, kind))
+            if path is None:
+                if (signature, kind) in self._syzygy_tables:
+                    return self.__probe_syzygy(position, kind)
+                raise MissingTableError('No %s table for %s' % (kind.upper(), signature))
+            with self._lock:
+                table = self._tables.get((signature, kind))
+                if table is None:
+                    table = self._tables[(signature, kind)] = KeyValueTable(path, kind)
+        value = table.get(table_key(position))
+        if value is None:
+            raise MissingTableError('Position not in the %s table for %s: %s' % (kind.upper(), signature, position.fen))
+        return value
+
+
+    def __probe_syzygy(self, position, kind):
+        try:
+            import chess
+            import chess.syzygy
+        except ImportError:
+            raise ImportError('Probing Syzygy tables requires python-chess to be installed')
+        with self._lock:
+            if self._syzygy is None:
+                self._syzygy = chess.syzygy.open_tablebase(self.directory)
+        probe = self._syzygy.probe_wdl if kind == 'wdl' else self._syzygy.probe_dtz
+        try:
+            return probe(chess.Board(position.fen))
+        except KeyError as error:
+            # chess.syzygy raises its own KeyError for missing tables and positions with castling rights
+            raise MissingTableError('%s: %s' % (error.args[0] if error.args else error, position.fen))
+
+
+def write_key_value_table(path, entries, kind='wdl'):
+    """Write a key/value table file from (Position or table_key, value) pairs"""
+    values = {}
+    for position, value in entries:
+        key = position if isinstance(position, int) else table_key(position)
+        if key in values and values[key] != value:
+            raise ValueError('Conflicting %s values for key %i' % (kind.upper(), key))
+        values[key] = value
+    write_sorted_key_file(path, MAGIC[kind], dict((key, VALUE.pack(value)) for key, value in values.items()))
@@ -31,6 +31,10 @@ def samples():
          {'fen': '8/8/2P5/4B3/1Q6/4K3/6P1/3k4 w - - 5 67', 'log_file': 'chess.log'}],
         [[],
          {'fen': 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'}],
+        [['--input', '-', '--output', 'jsonl', '--jobs', '4', '--no-render'],
+         {'input': '-', 'output': 'jsonl', 'jobs': 4, 'no_render': True}],
+        [['--metrics', 'metrics.prom'],
+         {'metrics': 'metrics.prom'}],
     ]
     return { 'valid': fen_move_samples , 'arguments': argument_test_samples }
 
@@ -43,6 +47,11 @@ def test_argument_parser(samples):
         assert args.verbose == argument_test_set[1].get('verbosity', 30)
         assert args.quiet == argument_test_set[1].get('quiet', False)
         assert args.log_file == argument_test_set[1].get('log_file', None)
+        assert args.input == argument_test_set[1].get('input', None)
+        assert args.output == argument_test_set[1].get('output', 'text')
+        assert args.jobs == argument_test_set[1].get('jobs', 1)
+        assert args.no_render == argument_test_set[1].get('no_render', False)
+        assert args.metrics == argument_test_set[1].get('metrics', None)
 
 
 # Not quite sure how to effectively test this without refactoring the main method.
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for attack, check and pin queries on positions
+"""
+import pytest
+from bitboard import SQUARE_INDEX, SQUARE_NAMES, scan
+from fen import Position
+
+
+@pytest.fixture
+def samples():
+    return {
+        # FEN, checkers, pinned, checkmate, stalemate
+        'states': [
+            ('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1', [], [], False, False),
+            ('rnb1kbnr/pppp1ppp/8/4p3/6Pq/5P2/PPPPP2P/RNBQKBNR w KQkq - 1 3', ['h4'], [], True, False),
+            ('4k3/4r3/8/8/8/8/4N3/4K3 w - - 0 1', [], ['e2'], False, False),
+            ('4k3/8/8/b7/8/2P5/8/4K2r w - - 0 1', ['h1'], ['c3'], False, False),
+            ('7k/5Q2/6K1/8/8/8/8/8 b - - 0 1', [], [], False, True),
+            ('k7/8/8/4q3/8/8/1B6/K5r1 w - - 0 1', ['g1'], ['b2'], False, False),
+        ],
+        'attackers': [
+            ('r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3', 'e5', 'w', ['f3']),
+            ('r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3', 'd4', None, ['c6', 'e5', 'f3']),
+            ('r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3', 'f7', 'b', ['e8']),
+        ],
+    }
+
+
+def names(bitboard):
+    return sorted(SQUARE_NAMES[square] for square in scan(bitboard))
+
+
+def test_check_pins_and_game_end(samples):
+    for fen, checkers, pinned, checkmate, stalemate in samples['states']:
+        p = Position(fen)
+        assert names(p.checkers) == checkers
+        assert p.is_check == bool(checkers)
+        assert names(p.pinned) == pinned
+        assert p.is_checkmate == checkmate
+        assert p.is_stalemate == stalemate
+
+
+def test_attackers(samples):
+    for fen, square, color, attackers in samples['attackers']:
+        assert names(Position(fen).attackers(SQUARE_INDEX[square], color)) == attackers
+    with pytest.raises(ValueError) as excinfo:
+        Position(samples['attackers'][0][0]).attackers(0, 'x')
+
+
+def test_queries_follow_push_and_pop():
+    p = Position('rnbqkbnr/pppp1ppp/8/4p3/6P1/5P2/PPPPP2P/RNBQKBNR b KQkq - 0 2')
+    assert not p.is_check
+    p.push('d8h4')
+    assert p.is_checkmate
+    assert names(p.attackers(SQUARE_INDEX['e1'], 'b')) == ['h4']
+    p.pop()
+    assert not p.is_check and not p.is_checkmate
+    assert names(p.attackers(SQUARE_INDEX['e1'], 'b')) == []
+    assert p.move_piece('d8h4').is_checkmate
+    assert not p.is_check
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for NumPy position batches
+"""
+import pytest
+numpy = pytest.importorskip('numpy')
+from batch import PositionBatch
+from fen import Position
+
+
+@pytest.fixture
+def samples():
+    return [
+        'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+        'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1',
+        'rnb1kbnr/ppp1pppp/8/3q4/8/8/PPPP1PPP/RNBQKBNR w KQkq - 0 3',
+        '8/4npk1/5p1p/1Q5P/1p4P1/4r3/7q/3K1R2 b - - 1 49',
+        '5r1k/6pp/4Qpb1/p7/8/6PP/P4PK1/3q4 b - - 4 37',
+        'r2q1rk1/pp2ppbp/2p2np1/6B1/3PP1b1/Q1P2N2/P4PPP/3RKB1R b K - 0 13',
+    ]
+
+
+def test_vectorized_decoding_matches_parser(samples):
+    batch = PositionBatch.from_fens(samples)
+    assert len(batch) == len(samples)
+    assert batch.bitboards.shape == (len(samples), 12)
+    assert batch.bitboards.dtype == numpy.uint64
+    for index, sample in enumerate(samples):
+        assert [int(bitboard) for bitboard in batch.bitboards[index]] == Position(sample).bitboards
+        assert batch[index].fen == sample
+
+
+def test_from_positions_matches_from_fens(samples):
+    from_fens = PositionBatch.from_fens(samples)
+    from_positions = PositionBatch.from_positions(Position(sample) for sample in samples)
+    for name in ('bitboards', 'white_to_move', 'castling', 'en_passant_file',
+                 'halfmove_clock', 'fullmove_number'):
+        assert (getattr(from_fens, name) == getattr(from_positions, name)).all()
+
+
+def test_features(samples):
+    batch = PositionBatch.from_fens(samples)
+    planes = batch.piece_square_planes()
+    assert planes.shape == (len(samples), 12, 8, 8)
+    # A white pawn on e4 in the second position: piece 0, rank 4, file e
+    assert planes[1, 0, 3, 4] == 1
+    assert planes[1, 0, 1, 4] == 0
+    assert list(batch.material_counts()[0]) == [8, 2, 2, 2, 1, 1] * 2
+    assert list(batch.material_balance()) == [0, 0, 0, -5, -8, 0]
+    assert list(batch.side_to_move()) == [1, -1, 1, -1, -1, -1]
+    for index, sample in enumerate(samples):
+        board = Position(sample).board
+        for rank in range(8):
+            for file_index in range(8):
+                symbol = board[7 - rank][file_index]
+                assert planes[index, :, rank, file_index].sum() == (symbol != ' ')
+
+
+def test_invalid_placements_raise_error(samples):
+    for bad in ['rnbqkbnr/ppppptpp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+                'rnbqkbnr/ppppppppp/7/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+                'rnbqkbnr/pppppppp/8/8/8/PPPPPPPP/RNBQKBNR/8 x KQkq - 0 1',
+                'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP w KQkq - 0 1',
+                'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQxq - 0 1',
+                'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w Kk1 - 0 1',
+                'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq z3 0 1',
+                'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq e4 0 1']:
+        with pytest.raises(ValueError) as excinfo:
+            PositionBatch.from_fens(samples + [bad])
+        assert ('FEN %i' % len(samples)) in str(excinfo.value)
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Smoke tests for the benchmark harness
+"""
+import json
+import sys
+
+import pytest
+from bench import BENCHMARKS, _fen_of, compare, load_corpus, main, parse_args, run_benchmarks
+from fen import Position
+
+
+@pytest.fixture
+def samples():
+    return load_corpus()[:10]
+
+
+def test_corpus_positions_parse():
+    fens = load_corpus()
+    assert len(fens) > 100
+    for fen in fens:
+        assert Position(fen).fen == fen
+        assert _fen_of(fen) == fen
+
+
+def test_every_benchmark_runs(samples):
+    results = run_benchmarks(samples, rounds=1, repeats=2)
+    assert list(results) == list(BENCHMARKS)
+    for name, result in results.items():
+        assert result['ops'] > 0
+        assert result['ops_per_sec'] > 0
+        assert result['bytes_per_op'] > 0
+
+
+def test_regressions_are_reported():
+    results = {'parse': {'ops': 10, 'ops_per_sec': 700.0, 'bytes_per_op': 1000.0}}
+    assert compare(results, {'parse': {'ops_per_sec': 800.0, 'bytes_per_op': 1000.0}}) == []
+    regressions = compare(results, {'parse': {'ops_per_sec': 1000.0, 'bytes_per_op': 500.0}})
+    assert len(regressions) == 2
+    assert regressions[0].startswith('parse: 700 ops/sec is below')
+
+
+def test_script_saves_and_compares_baseline(samples, tmpdir, capsys):
+    corpus = tmpdir.join('corpus.fen')
+    corpus.write('\n'.join(samples) + '\n')
+    baseline = str(tmpdir.join('baseline.json'))
+    sys.argv = ['', '-b', 'parse', '-r', '1', '--corpus', str(corpus), '--baseline', baseline, '--save']
+    assert main(parse_args()) == 0
+    with open(baseline) as baseline_file:
+        stored = json.load(baseline_file)
+    stored['parse']['ops_per_sec'] *= 100
+    with open(baseline, 'w') as baseline_file:
+        json.dump(stored, baseline_file)
+    sys.argv = ['', '-b', 'parse', '-r', '1', '--corpus', str(corpus), '--baseline', baseline]
+    assert main(parse_args()) == 1
+    assert 'REGRESSION parse' in capsys.readouterr()[0]
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the memory-mapped position book
+"""
+import pytest
+from book import PositionBook, pack_move, unpack_move, write_book
+from fen import Position
+
+
+@pytest.fixture
+def samples(tmpdir):
+    start = Position('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1')
+    entries = [
+        (start.fen, 20, 100, 'e2e4'),
+        (start.move_piece('e2e4'), 30, 60, 'c7c5'),
+        (start.move_piece('d2d4').fen, 25, 40, 'g8f6'),
+        ('8/P7/8/8/8/8/8/k6K w - - 0 1', 900, 1, 'a7a8q'),
+        ('8/8/8/8/8/8/1k6/K7 w - - 0 2', 0, 3, None),
+        # The same position again, with fewer games
+        (start.fen, -5, 10, 'd2d4'),
+    ]
+    path = str(tmpdir.join('openings.book'))
+    return { 'path': path, 'entries': entries, 'start': start, 'written': write_book(path, entries) }
+
+
+def test_pack_move():
+    for move in ('e2e4', 'a7a8q', 'h2h1n', 'a1h8'):
+        assert unpack_move(pack_move(move)) == move
+    assert pack_move(None) == 0 and unpack_move(0) is None
+    for move in ('e2e9', 'a7a8k', 'e2', 'O-O'):
+        with pytest.raises(ValueError):
+            pack_move(move)
+
+
+def test_lookup(samples):
+    assert samples['written'] == 5
+    start = samples['start']
+    with PositionBook(samples['path']) as book:
+        assert len(book) == 5
+        entry = book.get(start)
+        assert entry == (20, 110, 'e2e4')
+        assert book.get(start.fen) == book.get(start.zobrist) == entry
+        assert book.get(start.move_piece('e2e4')).move == 'c7c5'
+        assert book.get('8/P7/8/8/8/8/8/k6K w - - 0 1').move == 'a7a8q'
+        assert book.get('8/8/8/8/8/8/1k6/K7 w - - 0 2') == (0, 3, None)
+        assert start.move_piece('g1f3') not in book
+        assert book.get(start.move_piece('g1f3'), 'missing') == 'missing'
+
+
+def test_lookup_many(samples):
+    start = samples['start']
+    queries = [start.move_piece(move) for move in sorted(start.legal_moves())] + [start]
+    with PositionBook(samples['path']) as book:
+        entries = book.lookup_many(queries)
+        assert entries == [book.get(position) for position in queries]
+    found = dict((move, entry) for move, entry in zip(sorted(start.legal_moves()) + ['start'], entries) if entry)
+    assert found == {'e2e4': (30, 60, 'c7c5'), 'd2d4': (25, 40, 'g8f6'), 'start': (20, 110, 'e2e4')}
+
+
+def test_invalid_files(samples, tmpdir):
+    with pytest.raises(ValueError):
+        write_book(str(tmpdir.join('bad.book')), [('8/8/8 w - - 0 1', 0, 1, None)])
+    truncated = str(tmpdir.join('truncated.book'))
+    with open(samples['path'], 'rb') as book_file:
+        data = book_file.read()
+    with open(truncated, 'wb') as book_file:
+        book_file.write(data[:-1])
+    with pytest.raises(ValueError):
+        PositionBook(truncated)
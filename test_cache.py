@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the LRU cache and the shared Positions of Position.cached
+"""
+import pickle
+import threading
+
+import pytest
+from cache import LRUCache
+from fen import POSITION_CACHE, Position
+
+
+@pytest.fixture
+def samples():
+    return [
+        'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+        '8/4npk1/5p1p/1Q5P/1p4P1/4r3/7q/3K1R2 b - - 1 49',
+        '5r1k/6pp/4Qpb1/p7/8/6PP/P4PK1/3q4 b - - 4 37',
+        '8/8/2P5/4B3/1Q6/4K3/6P1/3k4 w - - 5 67',
+    ]
+
+
+def test_lru_cache_counts_and_evicts():
+    built = []
+    cache = LRUCache(2)
+    factory = lambda key: built.append(key) or key.upper()
+    assert cache.get('a', factory) == 'A'
+    assert cache.get('b', factory) == 'B'
+    assert cache.get('a', factory) == 'A'
+    assert cache.get('c', factory) == 'C'
+    assert 'b' not in cache and 'a' in cache
+    assert built == ['a', 'b', 'c']
+    assert cache.stats() == {'hits': 1, 'misses': 3, 'evictions': 1, 'size': 2, 'maxsize': 2}
+    cache.resize(1)
+    assert len(cache) == 1 and 'c' in cache
+    cache.clear()
+    assert cache.stats()['misses'] == 0
+    with pytest.raises(ValueError) as excinfo:
+        LRUCache(0)
+
+
+def test_cached_positions_are_shared_and_frozen(samples):
+    POSITION_CACHE.clear()
+    first = Position.cached(samples[0])
+    assert Position.cached(samples[0]) is first
+    assert POSITION_CACHE.stats()['hits'] == 1
+    with pytest.raises(TypeError) as excinfo:
+        first.push('e2e4')
+    assert first.move_piece('e2e4').fen == 'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1'
+    assert first.san('g1f3') == 'Nf3'
+    assert first.perft(2) == 400
+    copy = first.copy()
+    copy.push('e2e4')
+    assert first.fen == samples[0]
+    assert str(first) is str(first)
+    assert str(copy) != str(first)
+
+
+def test_cached_positions_cannot_be_changed(samples):
+    POSITION_CACHE.clear()
+    position = Position.cached(samples[1])
+    assert isinstance(position.board, tuple)
+    with pytest.raises(TypeError) as excinfo:
+        position.board[0] = '8'
+    with pytest.raises(TypeError) as excinfo:
+        position.active = 'w'
+    with pytest.raises(TypeError) as excinfo:
+        position.bitboards[0] = 0
+    assert Position.cached(samples[1]).fen == samples[1]
+    copy = position.copy()
+    copy.active = 'w'
+    assert type(copy) is Position and isinstance(copy.board, list)
+    assert pickle.loads(pickle.dumps(position)) is position
+
+
+def test_cached_positions_across_threads(samples):
+    POSITION_CACHE.clear()
+    found = []
+
+    def worker():
+        for _ in range(50):
+            for sample in samples:
+                found.append(Position.cached(sample))
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(id(position) for position in found)) == len(samples)
+    stats = POSITION_CACHE.stats()
+    assert stats['hits'] + stats['misses'] == 4 * 50 * len(samples)
+    assert stats['size'] == len(samples)
@@ -2,9 +2,12 @@
 """
 Tests for board display engine
 """
+import io
+
 import pytest
 from fen import Position
-from display import render_ascii_board
+from display import (render_ascii_board, render_compact_board, render_html_board,
+                     render_many, render_svg_board, render_unicode_board)
 
 @pytest.fixture
 def samples():
@@ -47,3 +50,37 @@ def samples():
 
 def test_ascii_display(samples):
     assert render_ascii_board(samples['boards'][0]) == samples['output']['ascii']
+
+
+def test_other_renderers(samples):
+    board = samples['boards'][0]
+    assert render_unicode_board(board).splitlines()[0] == '8 ♜ ♞ ♝ ♛ ♚ ♝ ♞ ♜'
+    assert render_unicode_board(board).splitlines()[2] == '6 · · · · · · · ·'
+    assert render_compact_board(board) == '\n'.join(board).replace(' ', '.') + '\n'
+    html = render_html_board(board)
+    assert html.startswith('<table class="chess-board"><tr><th>8</th><td class="light">&#9820;</td>')
+    assert html.count('<td') == 64
+    svg = render_svg_board(board)
+    assert svg.startswith('<svg ') and svg.endswith('</svg>\n')
+    assert svg.count('<rect') == 64
+    assert svg.count('<text') == 32
+
+
+def test_position_honors_renderer(samples):
+    fen = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+    assert str(Position(fen)) == samples['output']['ascii']
+    assert str(Position(fen, renderer='compact')) == render_compact_board(samples['boards'][0])
+    moved = Position(fen, renderer=render_unicode_board).move_piece('e2e4')
+    assert str(moved).splitlines()[4] == '4 · · · · ♙ · · ·'
+    with pytest.raises(ValueError) as excinfo:
+        Position(fen, renderer='braille')
+
+
+def test_render_many(samples):
+    positions = [Position('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'),
+                 Position('8/8/2P5/4B3/1Q6/4K3/6P1/3k4 w - - 5 67')]
+    output = io.StringIO()
+    assert render_many(positions, 'compact', writer=output) is None
+    expected = render_compact_board(positions[0].board) + '\n' + render_compact_board(positions[1].board)
+    assert output.getvalue() == expected
+    assert render_many([position.board for position in positions], render_compact_board) == expected
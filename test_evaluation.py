@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the incrementally updated evaluation
+"""
+import pytest
+from evaluation import MAX_PHASE, evaluate_bitboards, tapered
+from fen import Position
+
+
+@pytest.fixture
+def samples():
+    return {
+        # FEN, moves covering quiet moves, captures, castling, en passant and promotions
+        'games': [
+            ('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+             ['e2e4', 'd7d5', 'e4d5', 'g8f6', 'f1b5', 'c7c6', 'd5c6', 'd8a5',
+              'c6b7', 'a5b5', 'b7a8q', 'e8d8', 'g1f3', 'b5b2', 'e1g1']),
+            ('r3k2r/1P6/8/3pP3/8/8/6p1/R3K2R w KQkq d6 0 1',
+             ['e5d6', 'e8g8', 'b7b8n', 'g2h1q', 'e1d2', 'h1e4']),
+        ],
+    }
+
+
+def terms(position):
+    return [position.material, position.midgame_score, position.endgame_score, position.phase]
+
+
+def test_start_position_is_balanced():
+    start = Position('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1')
+    assert terms(start) == [0, 0, 0, MAX_PHASE]
+    assert start.evaluation == 0
+    assert start.move_piece('e2e4').evaluation == 40
+    assert start.move_piece('e2e4').move_piece('e7e5').evaluation == 0
+
+
+def test_moves_update_the_evaluation(samples):
+    for fen, moves in samples['games']:
+        position = Position(fen)
+        pushed = Position(fen)
+        # Once asked for, the terms are only updated by the moves
+        assert terms(position) == terms(pushed) == evaluate_bitboards(position.bitboards)
+        for move in moves:
+            position = position.move_piece(move)
+            pushed.push(move)
+            assert terms(position) == evaluate_bitboards(position.bitboards)
+            assert terms(pushed) == terms(position)
+            assert position._terms is not None and pushed._terms is not None
+        assert terms(position.copy()) == terms(position)
+        assert terms(Position.from_record(position.to_record())) == terms(position)
+        while True:
+            try:
+                pushed.pop()
+            except IndexError:
+                break
+        assert terms(pushed) == terms(Position(fen))
+
+
+def test_tapered_blends_by_phase():
+    assert tapered(100, 300, MAX_PHASE) == 100
+    assert tapered(100, 300, 0) == 300
+    assert tapered(100, 300, 12) == 200
+    assert tapered(-100, -301, 12) == -tapered(100, 301, 12)
+    # Extra promoted pieces do not push the phase past the middlegame
+    assert tapered(100, 300, MAX_PHASE + 8) == 100
+    kings = Position('8/8/8/8/8/8/1k6/K7 w - - 0 1')
+    assert kings.phase == 0 and kings.evaluation == kings.endgame_score
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the import time budget of the modules loaded at startup
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# Cumulative import time allowed per module, in seconds, with bytecode already cached
+IMPORT_BUDGETS = {
+    'fen': 0.06,
+    'syzygymoves': 0.1,
+}
+# Modules only loaded when a pool, a network client or the command line is used
+LAZY_MODULES = ('requests', 'multiprocessing', 'sqlite3', 'asyncio', 'argparse')
+
+
+def import_times(module):
+    """Return {module: cumulative seconds} as reported by python -X importtime"""
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import %s' % module],
+                            cwd=HERE, env=env, capture_output=True, text=True, check=True).stderr
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_time, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+@pytest.fixture
+def samples():
+    # The first run writes the bytecode the timed runs load
+    return dict((module, [import_times(module) for _ in range(4)][1:]) for module in IMPORT_BUDGETS)
+
+
+def test_import_budget(samples):
+    for module, budget in IMPORT_BUDGETS.items():
+        best = min(times[module] for times in samples[module])
+        assert best < budget, '%s took %.3fs to import, over its %.3fs budget' % (module, best, budget)
+
+
+def test_heavy_modules_are_lazy(samples):
+    for module in IMPORT_BUDGETS:
+        loaded = set(samples[module][0])
+        assert not loaded & set(LAZY_MODULES), '%s imports %s' % (module, sorted(loaded & set(LAZY_MODULES)))
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the memory-mapped sorted key files
+"""
+import struct
+
+import pytest
+from keyfile import SortedKeyFile, write_sorted_key_file
+
+VALUE = struct.Struct('<i')
+
+
+@pytest.fixture
+def samples(tmpdir):
+    values = dict((key * 7919 % 1000003, VALUE.pack(-key)) for key in range(500))
+    path = str(tmpdir.join('keys.bin'))
+    return { 'path': path, 'values': values, 'written': write_sorted_key_file(path, b'TESTKEY1', values) }
+
+
+def test_find(samples):
+    assert samples['written'] == 500
+    key_file = SortedKeyFile(samples['path'], b'TESTKEY1', VALUE.size, 'test file')
+    assert len(key_file) == 500
+    for key, value in samples['values'].items():
+        index = key_file.find(key)
+        assert key_file.key(index) == key
+        assert key_file.map[key_file.value_offset(index):key_file.value_offset(index) + VALUE.size] == value
+        assert key_file.find(key, index) == index
+        assert key_file.find(key, index + 1) is None
+    assert key_file.find(1000003) is None
+    key_file.close()
+
+
+def test_invalid_files_raise_error(samples, tmpdir):
+    with pytest.raises(ValueError) as excinfo:
+        SortedKeyFile(samples['path'], b'OTHERKEY', VALUE.size, 'test file')
+    assert 'Not a test file' in str(excinfo.value)
+    with pytest.raises(ValueError) as excinfo:
+        SortedKeyFile(samples['path'], b'TESTKEY1', VALUE.size + 1, 'test file')
+    short = tmpdir.join('short.bin')
+    short.write_binary(b'TESTKEY1')
+    with pytest.raises(ValueError) as excinfo:
+        SortedKeyFile(str(short), b'TESTKEY1', VALUE.size, 'test file')
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the metrics registry and the Position instrumentation
+"""
+import json
+
+import pytest
+from fen import Position
+from metrics import MetricsRegistry, instrument, uninstrument
+
+
+@pytest.fixture
+def samples():
+    return [
+        ('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1', 'e2e4'),
+        ('r2q1rk1/pp2ppbp/2p2np1/6B1/3PP1b1/Q1P2N2/P4PPP/3RKB1R b K - 0 13', 'a7a5'),
+    ]
+
+
+def test_registry_formats():
+    registry = MetricsRegistry()
+    registry.counter('jobs_total', 'Jobs run', queue='fast').inc(3)
+    histogram = registry.histogram('job_seconds', 'Job time', buckets=(0.1, 1.0, float('inf')))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value)
+    data = json.loads(registry.to_json())
+    assert data['jobs_total'] == [{'labels': {'queue': 'fast'}, 'type': 'counter', 'value': 3}]
+    assert data['job_seconds'][0]['buckets'] == [[0.1, 1], [1.0, 2], ['+Inf', 3]]
+    assert data['job_seconds'][0]['sum'] == 5.55
+    text = registry.to_prometheus()
+    assert '# HELP jobs_total Jobs run\n# TYPE jobs_total counter\njobs_total{queue="fast"} 3\n' in text
+    assert 'job_seconds_bucket{le="1.0"} 2\n' in text
+    assert 'job_seconds_bucket{le="+Inf"} 3\n' in text
+    assert 'job_seconds_count 3\n' in text
+    assert registry.counter('jobs_total', queue='fast').value == 3
+
+
+def test_position_instrumentation(samples):
+    registry = MetricsRegistry()
+    originals = Position.__dict__['move_piece'], Position.__dict__['__init__']
+    instrument(registry)
+    try:
+        for fen, move in samples:
+            position = Position(fen)
+            str(position.move_piece(move))
+            position.move_piece(move).fen
+        with pytest.raises(ValueError) as excinfo:
+            Position('8/8/8 w - - 0 1')
+    finally:
+        uninstrument()
+    assert (Position.__dict__['move_piece'], Position.__dict__['__init__']) == originals
+    data = registry.to_dict()
+    parse = [entry for entry in data['position_parse_seconds'] if entry['labels'] == {'parser': 'init'}]
+    assert parse[0]['count'] == 3
+    assert data['position_parse_errors_total'][0]['value'] == 1
+    assert data['position_move_seconds'][0]['count'] == 4
+    steps = dict((entry['labels']['step'], entry['count']) for entry in data['position_move_step_seconds'])
+    assert steps['set_capture'] == steps['execute_move'] == 4
+    assert data['position_fen_seconds'][0]['count'] == 2
+    assert data['position_render_seconds'][0]['count'] == 2
+    Position(samples[0][0]).move_piece(samples[0][1])
+    assert registry.to_dict()['position_move_seconds'][0]['count'] == 4
@@ -55,6 +55,34 @@ def samples():
         ('r1b1k2r/1pq3pp/2n1p3/pB1P1p2/3N4/2P5/P4PPP/1R1QR1K1 b kq - 2 20', 'e8f7',
          'r1b4r/1pq2kpp/2n1p3/pB1P1p2/3N4/2P5/P4PPP/1R1QR1K1 w - - 3 21'),
     ]
+    fen_rook_castling_samples = [
+        ('r3k2r/pppppppp/8/8/8/8/PPPPPPPP/R3K2R w KQkq - 0 1', 'a1b1',
+         'r3k2r/pppppppp/8/8/8/8/PPPPPPPP/1R2K2R b Kkq - 1 1'),
+        ('r3k2r/pppppppp/8/8/8/8/PPPPPPPP/R3K2R b KQkq - 0 1', 'h8g8',
+         'r3k1r1/pppppppp/8/8/8/8/PPPPPPPP/R3K2R w KQq - 1 2'),
+        ('r3k2r/1ppppppp/8/8/8/8/1PPPPPPP/R3K2R w KQkq - 0 1', 'a1a8',
+         'R3k2r/1ppppppp/8/8/8/8/1PPPPPPP/4K2R b Kk - 0 1'),
+    ]
+    fen_special_move_samples = [
+        ('rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3', 'e5f6',
+         'rnbqkbnr/ppp1p1pp/5P2/3p4/8/8/PPPP1PPP/RNBQKBNR b KQkq - 0 3'),
+        ('8/8/8/8/3pP3/8/8/4K2k b - e3 0 1', 'd4e3',
+         '8/8/8/8/8/4p3/8/4K2k w - - 0 2'),
+        ('8/P6k/8/8/8/8/8/4K3 w - - 0 1', 'a7a8q',
+         'Q7/7k/8/8/8/8/8/4K3 b - - 0 1'),
+        ('1r5k/P7/8/8/8/8/8/4K3 w - - 0 1', 'a7b8n',
+         '1N5k/8/8/8/8/8/8/4K3 b - - 0 1'),
+    ]
+    fen_legal_move_samples = [
+        ('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1', 20, []),
+        # The knight on d2 is pinned against the king by the bishop
+        ('4k3/8/8/8/1b6/8/3N4/4K3 w - - 0 1', 4, ['d2']),
+        # In check from the rook, only the block and king steps off the rank are allowed
+        ('4k3/8/8/8/8/8/3B4/r3K3 w - - 0 1', 3, ['e1d1', 'e1f1', 'd2e3']),
+        ('r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1', 26, ['e1a1', 'e1h1']),
+        # The king may not castle through the squares covered by the f8 rook
+        ('r3kr2/8/8/8/8/8/8/R3K2R w KQq - 0 1', 23, ['e1g1', 'e1f1', 'e1f2']),
+    ]
     return {
         'moves': fen_move_samples,
         'invalid_piece_moves': fen_move_error_samples,
@@ -63,6 +91,9 @@ def samples():
         'en_passant_moves': fen_en_passant_samples,
         'halfmove_clock_reset_moves': fen_halfmove_clock_reset_samples,
         'castling_moves': fen_castling_samples,
+        'rook_castling_moves': fen_rook_castling_samples,
+        'special_moves': fen_special_move_samples,
+        'legal_moves': fen_legal_move_samples,
     }
 
 
@@ -138,6 +169,13 @@ def test_castling_updates_on_castle(samples):
         assert actual.fen == sample[2]
 
 
+def test_rook_moves_and_captures_update_castling(samples):
+    for sample in samples['rook_castling_moves']:
+        p = Position(sample[0])
+        actual = p.move_piece(sample[1])
+        assert actual.fen == sample[2]
+
+
 def test_move_piece_outputs_correct_fen(samples):
     for sample in samples['moves']:
         p = Position(sample[0])
@@ -146,3 +184,161 @@ def test_move_piece_outputs_correct_fen(samples):
 
 
 
+
+
+def test_move_piece_leaves_original_untouched(samples):
+    for sample in samples['moves'] + samples['castling_moves']:
+        p = Position(sample[0])
+        board = list(p.board)
+        actual = p.move_piece(sample[1])
+        assert p.fen == sample[0]
+        assert p.board == board
+        assert actual.bitboards is not p.bitboards
+
+
+def test_push_and_pop_restore_the_position(samples):
+    for sample in samples['moves'] + samples['castling_moves'] + samples['capture_moves']:
+        p = Position(sample[0])
+        p.push(sample[1])
+        assert p.fen == sample[2]
+        assert p.pop() == sample[1]
+        assert p.fen == sample[0]
+        assert p.board == Position(sample[0]).board
+
+
+def test_push_leaves_position_intact_on_invalid_move(samples):
+    for sample in samples['invalid_piece_moves']:
+        p = Position(sample[0])
+        with pytest.raises(ValueError) as excinfo:
+            p.push(sample[1])
+        assert p.fen == sample[0]
+        assert p.bitboards == Position(sample[0]).bitboards
+        with pytest.raises(IndexError) as excinfo:
+            p.pop()
+
+
+def test_en_passant_and_promotion_moves(samples):
+    for sample in samples['special_moves']:
+        p = Position(sample[0])
+        actual = p.move_piece(sample[1])
+        assert actual.fen == sample[2]
+        assert sample[1] in list(p.legal_moves())
+
+
+def test_promotion_requires_piece_and_pawn(samples):
+    with pytest.raises(ValueError) as excinfo:
+        Position('8/P6k/8/8/8/8/8/4K3 w - - 0 1').move_piece('a7a8')
+    with pytest.raises(ValueError) as excinfo:
+        Position('8/P6k/8/8/8/8/8/4K3 w - - 0 1').move_piece('e1e2q')
+
+
+def test_legal_moves(samples):
+    for fen, count, excluded in samples['legal_moves']:
+        moves = list(Position(fen).legal_moves())
+        assert len(moves) == count
+        assert len(set(moves)) == count
+        for move in excluded:
+            assert not [legal for legal in moves if legal.startswith(move)]
+
+
+def test_pawns_on_their_last_rank_have_no_moves():
+    assert sorted(Position('P3k3/8/8/8/8/8/8/4K3 w - - 0 1').legal_moves()) == \
+        ['e1d1', 'e1d2', 'e1e2', 'e1f1', 'e1f2']
+    assert sorted(Position('4k3/8/8/8/8/8/8/1p2K3 b - - 0 1').legal_moves()) == \
+        ['e8d7', 'e8d8', 'e8e7', 'e8f7', 'e8f8']
+
+
+def test_apply_moves_replays_a_game():
+    start = Position('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1')
+    moves = ['e2e4', 'd7d5', 'e4d5', 'g8f6', 'f1b5', 'c7c6', 'd5c6', 'd8a5',
+             'c6b7', 'a5b5', 'b7a8q', 'e8d8', 'g1f3', 'b5b2', 'e1g1']
+    expected = [start]
+    for move in moves:
+        expected.append(expected[-1].move_piece(move))
+    final = start.apply_moves(moves)
+    assert final.fen == expected[-1].fen
+    assert final.zobrist == expected[-1].zobrist
+    assert start.apply_moves(moves, emit='each') == [p.fen for p in expected[1:]]
+    assert start.apply_moves(moves, emit='hashes') == [p.zobrist for p in expected[1:]]
+    assert start.fen == 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+
+def test_apply_moves_reports_the_failing_ply():
+    start = Position('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1')
+    with pytest.raises(ValueError) as excinfo:
+        start.apply_moves(['e2e4', 'e7e5', 'e7e5'])
+    assert 'ply 3' in str(excinfo.value)
+    with pytest.raises(ValueError) as excinfo:
+        start.apply_moves(['e2e4'], emit='fens')
+
+
+def test_san_and_lan_moves():
+    start = Position('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1')
+    for move in ['e4', 'e2e4', 'e2-e4', 'e4!?']:
+        assert start.move_piece(move).fen == 'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1'
+    assert start.move_piece('Ng1-f3').fen == start.move_piece('Nf3').fen
+    for bad in ['e5', 'Nd2', 'Bb5', 'Ke2', 'O-O', 'e2e4x', 'Zz9']:
+        with pytest.raises(ValueError) as excinfo:
+            start.move_piece(bad)
+    rooks = Position('3k4/8/8/R6R/8/8/8/R3K3 w Q - 0 1')
+    with pytest.raises(ValueError) as excinfo:
+        rooks.move_piece('Rd5')
+    assert rooks.parse_san('Rad5') == 'a5d5'
+    assert rooks.parse_san('R1a3') == 'a1a3'
+    assert rooks.parse_san('O-O-O') == 'e1c1'
+
+
+def test_san_output():
+    samples = [
+        ('3k4/8/8/R6R/8/8/8/R3K3 w Q - 0 1', ['h5d5', 'a5d5', 'a1a3', 'a5a3', 'e1c1', 'h5h8'],
+         ['Rhd5+', 'Rad5+', 'R1a3', 'R5a3', 'O-O-O+', 'Rh8+']),
+        ('7K/8/8/8/8/Q7/8/Q1Q4k w - - 0 1', ['a1b2', 'a3b2', 'c1b2', 'c1c2'],
+         ['Qa1b2#', 'Q3b2#', 'Qcb2#', 'Qc2#']),
+        ('rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3', ['e5f6', 'e5e6', 'f1b5'],
+         ['exf6', 'e6', 'Bb5+']),
+        ('2r5/1P1k4/8/8/8/8/8/4K3 w - - 0 1', ['b7c8q', 'b7b8n', 'b7c8r'],
+         ['bxc8=Q+', 'b8=N+', 'bxc8=R']),
+    ]
+    for fen, moves, expected in samples:
+        p = Position(fen)
+        assert [p.san(move) for move in moves] == expected
+        assert p.fen == fen
+    game = ['e4', 'e5', 'Qh5', 'Nc6', 'Bc4', 'Nf6', 'Qxf7#']
+    start = Position('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1')
+    uci = ['e2e4', 'e7e5', 'd1h5', 'b8c6', 'f1c4', 'g8f6', 'h5f7']
+    assert start.san_moves(uci) == game
+    assert start.apply_moves(game).fen == start.apply_moves(uci).fen
+
+
+def test_repetitions_with_history():
+    shuffle = ['Nf3', 'Nf6', 'Ng1', 'Ng8'] * 2
+    start = Position('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1', history=True)
+    positions = [start]
+    for move in shuffle:
+        positions.append(positions[-1].move_piece(move))
+    assert [p.is_repetition(2) for p in positions] == [False] * 4 + [True] * 5
+    assert [p.is_repetition() for p in positions] == [False] * 8 + [True]
+    assert [p.can_claim_draw for p in positions] == [False] * 8 + [True]
+    assert len(positions[-1].history) == 8 and start.history == []
+    assert start.apply_moves(shuffle).is_repetition()
+    # A pawn move or capture starts the history afresh
+    assert positions[-1].move_piece('e4').history == []
+    pushed = start.copy()
+    for move in shuffle:
+        pushed.push(move)
+    assert pushed.is_repetition() and pushed.history == positions[-1].history
+    while pushed.history:
+        pushed.pop()
+    assert not pushed.is_repetition(2)
+    assert Position('8/8/8/8/8/8/1k6/K7 w - - 100 80', history=True).can_claim_draw
+    with pytest.raises(ValueError) as excinfo:
+        Position('8/8/8/8/8/8/1k6/K7 w - - 0 80').is_repetition()
+
+
+def test_repetitions_ignore_an_en_passant_target_that_cannot_be_taken():
+    # After e4 no black pawn can take en passant, so Nf3 Nf6 Ng1 Ng8 repeats the position
+    start = Position('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1', history=True)
+    assert start.apply_moves(['e4', 'Nf6', 'Nf3', 'Ng8', 'Ng1']).is_repetition(2)
+    # With a black pawn on d4 it could, so the same shuffle does not
+    start = Position('rnbqkbnr/ppp1pppp/8/8/3p4/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1', history=True)
+    assert not start.apply_moves(['e4', 'Nf6', 'Nf3', 'Ng8', 'Ng1']).is_repetition(2)
@@ -4,7 +4,7 @@ Tests for FEN parsing
 """
 import re
 import pytest
-from fen import Position
+from fen import FENError, Position, parse_many
 
 @pytest.fixture
 def samples():
@@ -85,3 +85,89 @@ def test_fullmove_number(samples):
     for sample in samples['valid']:
         p = Position(sample)
         assert p.fullmove_number >= 0
+
+
+def test_board_view_matches_placement(samples):
+    for sample in samples['valid']:
+        p = Position(sample)
+        expected = sample.split(' ')[0]
+        for digit in '12345678':
+            expected = expected.replace(digit, ' ' * int(digit))
+        assert p.board == expected.split('/')
+
+
+def test_bitboards_round_trip_to_fen(samples):
+    for sample in samples['valid']:
+        p = Position(sample)
+        assert p.occupied == p.occupancy[0] | p.occupancy[1]
+        assert p.occupancy[0] & p.occupancy[1] == 0
+        p._Position__construct_updated_fen()
+        assert p.fen == sample
+
+
+def test_malformed_rank_lengths_raise_error():
+    for sample in ['rnbqkbnr/ppppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+                   'rnbqkbnr/pppppppp/7/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+                   'rnbqkbnr/pppppppp/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1']:
+        with pytest.raises(ValueError):
+            Position(sample)
+
+
+def test_errors_report_offsets():
+    offset_samples = [
+        ('rnbqkbnr/ppppptpp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1', 14),
+        ('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR n KQkq - 0 1', 44),
+        ('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQ0q - 0 1', 48),
+        ('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq x 0 1', 51),
+        ('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 1a 1', 54),
+        ('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1 extra', 56),
+        ('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq -', 52),
+        ('rnbqkbnr/ppppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1', 17),
+    ]
+    for sample, offset in offset_samples:
+        with pytest.raises(FENError) as excinfo:
+            Position(sample)
+        assert excinfo.value.offset == offset
+
+
+def test_fast_path_matches_validating_parser(samples):
+    for sample in samples['valid']:
+        expected = Position(sample)
+        actual = Position.from_fen_fast(sample)
+        assert actual.bitboards == expected.bitboards
+        assert actual.occupancy == expected.occupancy
+        assert actual.board == expected.board
+        assert (actual.active, actual.castling_availability, actual.en_passant,
+                actual.halfmove_clock, actual.fullmove_number) == \
+               (expected.active, expected.castling_availability, expected.en_passant,
+                expected.halfmove_clock, expected.fullmove_number)
+
+
+def test_parse_many_collects_errors_per_line(samples):
+    lines = samples['valid'] + ['', 'not a fen'] + samples['valid']
+    results = list(parse_many(lines))
+    assert len(results) == len(samples['valid']) * 2 + 1
+    errors = [result for result in results if result.error]
+    assert [result.line_number for result in errors] == [len(samples['valid']) + 2]
+    assert errors[0].position is None
+    for result in results:
+        if not result.error:
+            assert result.position.board == Position(result.fen).board
+
+
+def test_parse_many_reads_files(samples, tmpdir):
+    path = tmpdir.join('positions.fen')
+    path.write('\n'.join(samples['valid']) + '\n')
+    results = list(parse_many(str(path), records=True))
+    assert [result.fen for result in results] == samples['valid']
+    for result in results:
+        assert Position.from_record(result.position).fen == result.fen
+
+
+def test_parse_many_with_process_pool(samples):
+    lines = samples['valid'] * 4 + ['8/8/8/8/8/8/8/8 w - - 0 x']
+    ordered = list(parse_many(lines, workers=2, chunksize=5, records=True))
+    assert [result.line_number for result in ordered] == list(range(1, len(lines) + 1))
+    assert ordered[-1].error
+    unordered = list(parse_many(iter(lines), workers=2, chunksize=5, ordered=False, records=True))
+    assert sorted(unordered) == ordered
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the perft benchmark suite
+"""
+import pytest
+from fen import Position
+from perft import PERFT_POSITIONS, run_suite
+
+
+def test_suite_matches_published_counts():
+    for name, depth, nodes, expected, elapsed in run_suite(2):
+        assert nodes == expected
+
+
+def test_deeper_perft_on_small_positions():
+    fen, counts = PERFT_POSITIONS[2][1:]
+    assert Position(fen).perft(4) == counts[3]
+
+
+def test_perft_leaves_position_unchanged():
+    for name, fen, counts in PERFT_POSITIONS:
+        p = Position(fen)
+        p.perft(2)
+        assert p.fen == fen
+        assert p.bitboards == Position(fen).bitboards
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for streaming, indexing and replaying PGN games
+"""
+import pytest
+from fen import Position
+from pgn import PGNFile, index_games, parse_games, read_games
+
+
+@pytest.fixture
+def samples():
+    return {
+        'pgn': '''[Event "Paris"]
+[Site "Paris FRA"]
+[White "Morphy, Paul"]
+[Black "Duke Karl / Count Isouard"]
+[Result "1-0"]
+
+1. e4 e5 2. Nf3 d6 3. d4 Bg4 {This is a weak move already.} 4. dxe5 Bxf3 5. Qxf3
+dxe5 6. Bc4 Nf6 7. Qb3 Qe7 8. Nc3 c6 9. Bg5 b5 $2 (9... Qb4+ 10. Qxb4 Bxb4) 10.
+Nxb5 cxb5 11. Bxb5+ Nbd7 12. O-O-O Rd8 13. Rxd7 Rxd7 14. Rd1 Qe6 15. Bxd7+ Nxd7
+16. Qb8+ Nxb8 17. Rd8# 1-0
+
+[Event "Promotion study"]
+[White "A \\"quoted\\" name"]
+[SetUp "1"]
+[FEN "8/P6k/8/8/8/8/6K1/8 w - - 0 1"]
+[Result "*"]
+
+1. a8=Q Kg6 ; the king runs
+2. Qg8+ *
+
+[Event "Broken"]
+
+1. e4 e5 2. Ke3 1-0
+''',
+        'final': {
+            0: '1n1Rkb1r/p4ppp/4q3/4p1B1/4P3/8/PPP2PPP/2K5 b k - 1 17',
+            1: '6Q1/8/6k1/8/8/8/6K1/8 b - - 2 2',
+        },
+        'uci': ['e2e4', 'e7e5', 'g1f3', 'd7d6', 'd2d4', 'c8g4', 'd4e5', 'g4f3', 'd1f3',
+                'd6e5', 'f1c4', 'g8f6', 'f3b3', 'd8e7', 'b1c3', 'c7c6', 'c1g5', 'b7b5',
+                'c3b5', 'c6b5', 'c4b5', 'b8d7', 'e1c1', 'a8d8', 'd1d7', 'd8d7', 'h1d1',
+                'e7e6', 'b5d7', 'f6d7', 'b3b8', 'd7b8', 'd1d8'],
+    }
+
+
+@pytest.fixture
+def pgn_path(samples, tmpdir):
+    path = tmpdir.join('games.pgn')
+    path.write_binary(samples['pgn'].encode('utf-8'))
+    return str(path)
+
+
+def test_read_games_parses_headers_and_moves(samples, pgn_path):
+    with open(pgn_path, 'rb') as stream:
+        games = list(read_games(stream))
+    assert len(games) == 3
+    assert games[0].headers['White'] == 'Morphy, Paul'
+    assert games[0].result == '1-0'
+    assert len(games[0].moves) == 33
+    assert games[0].moves[17] == 'b5'
+    assert games[0].uci_moves() == samples['uci']
+    assert games[1].headers['White'] == 'A "quoted" name'
+    assert games[1].moves == ['a8=Q', 'Kg6', 'Qg8+']
+    assert games[1].result == '*'
+
+
+def test_zero_castling_is_not_a_move_number(tmpdir):
+    path = tmpdir.join('castling.pgn')
+    path.write_binary(b'[Event "Zeros"]\n\n1. e4 e5 2. Nf3 Nc6 3. Bc4 Bc5 4. 0-0 d6 5. d3 Be6 6. Nc3 Qd7\n'
+                      b'7. a3 0-0-0 8.b4 *\n')
+    with open(str(path), 'rb') as stream:
+        game = next(read_games(stream))
+    assert game.moves[6] == '0-0' and game.moves[13] == '0-0-0' and game.moves[14] == 'b4'
+    assert game.uci_moves()[6] == 'e1g1' and game.uci_moves()[13] == 'e8c8'
+
+
+def test_positions_are_replayed_lazily(samples, pgn_path):
+    with PGNFile(pgn_path) as pgn_file:
+        games = list(pgn_file)
+        for number, final in samples['final'].items():
+            positions = list(games[number].positions())
+            assert len(positions) == len(games[number].moves) + 1
+            assert positions[-1].fen == final
+            assert games[number].final_position().fen == final
+        positions = games[0].positions()
+        assert next(positions).fen == Position(
+            'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1').fen
+        assert next(positions).fen == 'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1'
+        with pytest.raises(ValueError) as excinfo:
+            games[2].uci_moves()
+        assert 'ply 3' in str(excinfo.value)
+
+
+def test_index_seeks_to_games(samples, pgn_path):
+    offsets = index_games(pgn_path)
+    with PGNFile(pgn_path) as pgn_file:
+        assert pgn_file.offsets() == offsets
+        assert len(pgn_file) == 3
+        assert pgn_file[1].headers['Event'] == 'Promotion study'
+        assert pgn_file[-1].headers['Event'] == 'Broken'
+        assert pgn_file[0].offset == 0
+        for offset in offsets:
+            assert pgn_file.game_at(offset).offset == offset
+
+
+def test_parse_games_in_parallel(samples, pgn_path, tmpdir):
+    path = tmpdir.join('many.pgn')
+    path.write_binary((samples['pgn'] + '\n').encode('utf-8') * 4)
+    serial = list(parse_games(str(path)))
+    parallel = list(parse_games(str(path), workers=2, games_per_job=5))
+    assert len(serial) == len(parallel) == 12
+    for one, other in zip(serial, parallel):
+        assert one.offset == other.offset
+        assert one.error == other.error
+        assert one._uci == other._uci
+    assert [game.error is None for game in parallel[:3]] == [True, True, False]
+    assert parallel[3].uci_moves() == samples['uci']
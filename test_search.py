@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the alpha-beta search
+"""
+import pytest
+from fen import Position
+from search import MATE_SCORE, Searcher, TranspositionTable, evaluate, search
+
+
+@pytest.fixture
+def samples():
+    return {
+        # FEN, depth, best move
+        'tactics': [
+            ('r1bqkbnr/pppp1ppp/2n5/4p3/2B1P3/5Q2/PPPP1PPP/RNB1K1NR w KQkq - 4 4', 2, 'f3f7'),
+            ('6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1', 2, 'd1d8'),
+            ('4k3/8/8/3q4/8/8/3R4/3K4 w - - 0 1', 2, 'd2d5'),
+            ('3k4/8/8/8/3n4/8/8/R3K3 b - - 0 1', 3, 'd4c2'),
+        ],
+        'kiwipete': 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+    }
+
+
+def test_finds_tactics(samples):
+    for fen, depth, move in samples['tactics']:
+        result = search(Position(fen), max_depth=depth)
+        assert result.move == move
+        assert result.depth == depth
+        assert result.nodes > 0
+
+
+def test_mate_scores_and_game_end():
+    result = search(Position('6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1'), max_depth=5)
+    assert result.score == MATE_SCORE - 1
+    assert result.depth == 2
+    mated = search(Position('rnb1kbnr/pppp1ppp/8/4p3/6Pq/5P2/PPPPP2P/RNBQKBNR w KQkq - 1 3'))
+    assert mated.move is None and mated.score == -MATE_SCORE
+    assert evaluate(Position('4k3/8/8/3q4/8/8/3R4/3K4 b - - 0 1')) == 405
+    assert evaluate(Position('4k3/8/8/3q4/8/8/3R4/3K4 w - - 0 1')) == -405
+
+
+def test_budgets_stop_the_search():
+    start = Position('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1')
+    lines = []
+    result = Searcher().search(start, node_limit=3000, info=lines.append)
+    assert result.depth >= 1 and result.move in list(start.legal_moves())
+    assert [line['depth'] for line in lines] == list(range(1, result.depth + 1))
+    assert result.nodes <= 3000 or result.depth == 1
+    result = Searcher().search(start, time_limit=0.2)
+    assert result.seconds < 1.0
+    assert start.fen == 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+
+def test_transposition_table_is_bounded():
+    table = TranspositionTable(4)
+    table.store(1, 3, 10, 0, 'e2e4')
+    table.store(1, 1, 20, 0, 'd2d4')
+    assert table.get(1) == (1, 3, 10, 0, 'e2e4')
+    assert table.get(5) is None
+    table.store(5, 1, 20, 0, 'd2d4')
+    assert table.get(1) is None and table.get(5)[4] == 'd2d4'
+    with pytest.raises(ValueError) as excinfo:
+        TranspositionTable(6)
+
+
+def test_root_split_between_processes(samples):
+    fen, depth, move = samples['tactics'][1]
+    result = search(Position(fen), max_depth=depth, workers=2)
+    assert result.move == move
+    assert result.depth == depth
+    assert [entry[0] for entry in result.history] == list(range(1, depth + 1))
+
+
+def test_evaluation_scans_the_board_once(samples, monkeypatch):
+    import fen
+    # Every other node updates the terms of the position before it
+    scans = []
+
+    def counting(bitboards):
+        scans.append(1)
+        return evaluate_bitboards(bitboards)
+
+    evaluate_bitboards = fen.evaluate_bitboards
+    monkeypatch.setattr(fen, 'evaluate_bitboards', counting)
+    Searcher().search(Position(samples['kiwipete']), max_depth=2)
+    assert len(scans) == 1
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the JSON lines position service
+"""
+import asyncio
+import json
+
+import pytest
+from fen import Position
+from service import PositionService
+from tablebase import write_key_value_table
+
+KQK = '8/8/8/8/8/2k5/8/KQ6 w - - 0 1'
+
+
+@pytest.fixture
+def samples(tmpdir):
+    position = Position(KQK)
+    write_key_value_table(str(tmpdir.join('KQvK.fentbw')), [(position, 2)], 'wdl')
+    write_key_value_table(str(tmpdir.join('KQvK.fentbz')), [(position, 3)], 'dtz')
+    requests = [
+        {'id': 1, 'moves': ['e2e4', 'e5', 'Nf3']},
+        {'id': 'probe', 'fen': KQK, 'probe': True},
+        {'fen': 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1', 'render': 'compact'},
+        {'id': 4, 'moves': ['Ke2']},
+        {'id': 5, 'fen': 'not a fen'},
+        {'id': 6, 'render': 'braille'},
+        [1, 2],
+    ]
+    return { 'directory': str(tmpdir), 'requests': requests }
+
+
+def exchange(service, lines):
+    """Send request lines to a started service on one connection and return the decoded answers"""
+    async def run():
+        await service.start(port=0)
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', service.port)
+            writer.write(b''.join(line + b'\n' for line in lines))
+            await writer.drain()
+            answers = [json.loads(await reader.readline()) for _ in lines]
+            writer.close()
+            return answers
+        finally:
+            await service.close()
+    return asyncio.run(run())
+
+
+def test_service_answers_in_order(samples):
+    service = PositionService(samples['directory'], workers=2, batch_size=2)
+    lines = [json.dumps(request).encode('utf-8') for request in samples['requests']] + [b'{oops']
+    answers = exchange(service, lines)
+    assert answers[0] == {'id': 1, 'fen': 'rnbqkbnr/pppp1ppp/8/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R b KQkq - 1 2'}
+    assert answers[1]['id'] == 'probe'
+    assert answers[1]['probe']['wdl'] == 2 and answers[1]['probe']['dtz'] == 3
+    assert answers[2]['board'].splitlines()[0] == 'rnbqkbnr'
+    assert 'ply 1 of the replay' in answers[3]['error'] and answers[3]['id'] == 4
+    assert answers[4]['id'] == 5 and 'error' in answers[4]
+    assert answers[5]['id'] == 6 and 'braille' in answers[5]['error']
+    assert list(answers[6]) == ['error'] and 'error' in answers[7]
+    assert service.probe_cache.stats()['misses'] == 1
+
+
+def test_service_without_tablebase_and_backpressure():
+    # A queue of one request still answers every request of a long pipeline
+    service = PositionService(workers=1, batch_size=4, queue_size=1)
+    requests = [{'id': index, 'moves': ['e2e4', 'e7e5'][:index % 3]} for index in range(200)]
+    answers = exchange(service, [json.dumps(request).encode('utf-8') for request in requests])
+    assert [answer['id'] for answer in answers] == list(range(200))
+    assert answers[2]['fen'] == 'rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq e6 0 2'
+    assert service.handle({'moves': ['d2d4']})['fen'].startswith('rnbqkbnr/pppppppp/8/8/3P4/')
+    with pytest.raises(ValueError):
+        service.handle({'probe': True})
+    assert service.warm(['8/8/8/8/8/8/1k6/K7 w - - 0 2\n', '\n']) == 1
+
+
+def test_bad_requests_do_not_fail_their_batch():
+    # A long batch delay puts the requests of both connections in one batch
+    service = PositionService(workers=1, batch_size=16, batch_delay=0.2)
+
+    async def run():
+        await service.start(port=0)
+        try:
+            first_reader, first_writer = await asyncio.open_connection('127.0.0.1', service.port)
+            second_reader, second_writer = await asyncio.open_connection('127.0.0.1', service.port)
+            first_writer.write(b'{"id": 1, "render": ["x"]}\n' + b'[' * 100000 + b'\n')
+            second_writer.write(b'{"id": 2, "moves": ["e2e4"]}\n')
+            await first_writer.drain()
+            await second_writer.drain()
+            answers = [json.loads(await first_reader.readline()) for _ in range(2)]
+            answers.append(json.loads(await second_reader.readline()))
+            first_writer.close()
+            second_writer.close()
+            return answers
+        finally:
+            await service.close()
+
+    answers = asyncio.run(run())
+    assert answers[0]['id'] == 1 and 'render must be' in answers[0]['error']
+    assert answers[1]['error'].startswith('Internal error: RecursionError')
+    assert answers[2] == {'id': 2, 'fen': 'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1'}
+    with pytest.raises(ValueError):
+        service.handle({'render': ['x']})
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for packed positions and the memory-mapped position store
+"""
+import pytest
+from fen import Position
+from store import PositionStore, write_store
+
+
+@pytest.fixture
+def samples():
+    return [
+        'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+        'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1',
+        'rnbqkbnr/ppp1pppp/8/3p4/4P3/8/PPPP1PPP/RNBQKBNR w KQkq d6 0 2',
+        'rnbqkbnr/pp1ppppp/8/2p5/4P3/5N2/PPPP1PPP/RNBQKB1R b KQkq - 1 2',
+        '8/4npk1/5p1p/1Q5P/1p4P1/4r3/7q/3K1R2 b - - 1 49',
+        'r2q1rk1/pp2ppbp/2p2np1/6B1/3PP1b1/Q1P2N2/P4PPP/3RKB1R b K - 0 13',
+        '8/8/8/8/8/8/8/8 w - - 0 1',
+    ]
+
+
+def test_positions_pack_into_32_bytes(samples):
+    for sample in samples:
+        packed = Position(sample).to_bytes()
+        assert len(packed) == 32
+        assert Position.from_bytes(packed).fen == sample
+
+
+def test_unpackable_positions_raise_error():
+    with pytest.raises(ValueError) as excinfo:
+        Position('qqqqqqqq/qqqqqqqq/qqqqqqqq/qqqqqqqq/qqqqqqqq/8/8/8 w - - 0 1').to_bytes()
+    with pytest.raises(ValueError) as excinfo:
+        Position('8/8/8/8/8/8/8/8 w - - 0 70000').to_bytes()
+    with pytest.raises(ValueError) as excinfo:
+        Position.from_bytes(b'\x01' + b'\x00' * 7 + b'\x0f' + b'\x00' * 23)
+
+
+def test_store_random_access_and_iteration(samples, tmpdir):
+    path = str(tmpdir.join('positions.store'))
+    assert write_store(path, [Position(sample) for sample in samples]) == len(samples)
+    with PositionStore(path) as store:
+        assert len(store) == len(samples)
+        assert store[3].fen == samples[3]
+        assert store[-1].fen == samples[-1]
+        assert [position.fen for position in store] == samples
+        assert bytes(store.record(1)) == Position(samples[1]).to_bytes()
+        with pytest.raises(IndexError) as excinfo:
+            store[len(samples)]
+
+
+def test_store_rejects_other_files(tmpdir):
+    path = tmpdir.join('other.store')
+    path.write_binary(b'not a position store')
+    with pytest.raises(ValueError) as excinfo:
+        PositionStore(str(path))
+    # Shorter than the header
+    path.write_binary(b'FENPOS1\n')
+    with pytest.raises(ValueError) as excinfo:
+        PositionStore(str(path))
+
+
+def test_store_numpy_view(samples, tmpdir):
+    numpy = pytest.importorskip('numpy')
+    path = str(tmpdir.join('positions.store'))
+    write_store(path, [Position(sample) for sample in samples])
+    store = PositionStore(path)
+    records = store.array()
+    assert records.shape == (len(samples),)
+    assert not records.flags.writeable
+    assert [int(occupied) for occupied in records['occupied']] == \
+        [Position(sample).occupied for sample in samples]
+    assert list(records['fullmove_number']) == [1, 1, 2, 2, 49, 13, 1]
+    assert list(records['flags'] & 1) == [0, 1, 0, 1, 1, 1, 0]
+    del records
+    store.close()
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the Syzygy API client against a local stand-in server
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import io
+import json
+import sys
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+from fen import Position
+from syzygyapi import ResponseCache, SyzygyClient, normalize_fen
+from syzygymoves import main, parse_args
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Answers like the tablebase API, listing the legal moves alphabetically"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            server.client_ports.add(self.client_address[1])
+            failing = server.failures > 0
+            if failing:
+                server.failures -= 1
+        if failing:
+            self.send_response(503)
+            self.send_header('Retry-After', '0')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        fen = parse_qs(urlparse(self.path).query)['fen'][0]
+        time.sleep(server.delay)
+        body = json.dumps({
+            'wdl': 2,
+            'dtz': 1,
+            'fen': fen,
+            'moves': dict((move, {'uci': move}) for move in sorted(Position(fen).legal_moves())),
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    httpd.lock = threading.Lock()
+    httpd.requests = 0
+    httpd.failures = 0
+    httpd.delay = 0
+    httpd.client_ports = set()
+    httpd.url = 'http://127.0.0.1:%i/api/v2' % httpd.server_address[1]
+    thread = threading.Thread(target=httpd.serve_forever, kwargs={'poll_interval': 0.05})
+    thread.daemon = True
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def samples():
+    return [
+        'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+        '8/4npk1/5p1p/1Q5P/1p4P1/4r3/7q/3K1R2 b - - 1 49',
+        '5r1k/6pp/4Qpb1/p7/8/6PP/P4PK1/3q4 b - - 4 37',
+        '8/8/2P5/4B3/1Q6/4K3/6P1/3k4 w - - 5 67',
+    ]
+
+
+def test_session_is_reused_across_calls(server, samples):
+    with SyzygyClient(url=server.url) as client:
+        for fen in samples:
+            assert client.probe(fen)['fen'] == fen
+    assert server.requests == len(samples)
+    assert len(server.client_ports) == 1
+
+
+def test_failed_calls_are_retried(server, samples):
+    server.failures = 2
+    with SyzygyClient(url=server.url, backoff=0) as client:
+        assert client.probe(samples[0])['wdl'] == 2
+    assert server.requests == 3
+
+
+def test_retries_give_up(server, samples):
+    server.failures = 5
+    with SyzygyClient(url=server.url, retries=1, backoff=0) as client:
+        with pytest.raises(requests.HTTPError) as excinfo:
+            client.probe(samples[0])
+    assert server.requests == 2
+
+
+def test_probe_many_keeps_order_and_bounds_concurrency(server, samples):
+    server.delay = 0.05
+    fens = samples * 5
+    start = time.time()
+    with SyzygyClient(url=server.url, pool_size=4) as client:
+        answers = client.probe_many(fens)
+    elapsed = time.time() - start
+    assert [answer['fen'] for answer in answers] == fens
+    assert elapsed < len(fens) * server.delay
+    assert len(server.client_ports) <= 4
+
+
+def test_cache_answers_repeated_positions(server, samples, tmpdir):
+    path = str(tmpdir.join('cache.sqlite'))
+    cache = ResponseCache(path)
+    with SyzygyClient(url=server.url, cache=cache) as client:
+        client.probe(samples[0])
+        client.probe(samples[0].replace(' 0 1', ' 7 12'))
+    cache.close()
+    assert server.requests == 1
+    cache = ResponseCache(path)
+    with SyzygyClient(url=server.url, cache=cache) as client:
+        assert client.probe(samples[0])['fen'] == samples[0]
+    cache.close()
+    assert server.requests == 1
+
+
+def test_cache_expires_and_evicts(samples, tmpdir):
+    cache = ResponseCache(str(tmpdir.join('cache.sqlite')), ttl=60, max_entries=2)
+    for fen in samples[:3]:
+        cache.set(fen, {'fen': fen})
+        time.sleep(0.01)
+    assert len(cache) == 2
+    assert cache.get(samples[0]) is None
+    assert cache.get(samples[1]) == {'fen': samples[1]}
+    cache.ttl = 0
+    time.sleep(0.01)
+    assert cache.get(samples[2]) is None
+    cache.close()
+
+
+def test_normalize_fen_drops_move_counters(samples):
+    assert normalize_fen(samples[1]) == '8/4npk1/5p1p/1Q5P/1p4P1/4r3/7q/3K1R2 b - -'
+    with pytest.raises(ValueError) as excinfo:
+        normalize_fen('8/8/8 w')
+
+
+def test_script_calls_configured_api(server, samples, tmpdir, capsys):
+    sys.argv = ['', samples[0], '--api-url', server.url,
+                '--cache', str(tmpdir.join('cache.sqlite'))]
+    main(parse_args())
+    output = capsys.readouterr()[0]
+    assert "['a2a3', 'a2a4', 'b1a3', " in output
+    assert server.requests == 1
+
+
+def test_script_batch_mode_reads_stdin(server, samples, monkeypatch, capsys):
+    monkeypatch.setattr(sys, 'stdin', io.StringIO('\n'.join(samples) + '\n'))
+    sys.argv = ['', '--api-url', server.url, '--input', '-', '--jobs', '2', '--no-render']
+    main(parse_args())
+    output = capsys.readouterr()[0].splitlines()
+    for fen, moves, next_fen in zip(samples, output[0::2], output[1::2]):
+        expected = sorted(Position(fen).legal_moves())
+        assert moves == str(expected)
+        assert next_fen == Position(fen).move_piece(expected[0]).fen
+    assert server.requests == len(samples)
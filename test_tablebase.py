@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for local tablebase probing
+"""
+import json
+import sys
+import threading
+import time
+
+import pytest
+from fen import Position
+from metrics import uninstrument
+from syzygymoves import main, parse_args
+import tablebase as tablebase_module
+from tablebase import MissingTableError, Tablebase, write_key_value_table
+
+KQK = '8/8/8/8/8/2k5/8/KQ6 w - - 0 1'
+
+
+@pytest.fixture
+def tables(tmpdir):
+    """A stub KQvK table set covering one position and its children"""
+    position = Position(KQK)
+    children = [(move, position.move_piece(move)) for move in sorted(position.legal_moves())]
+    wdl = [(position, 2)]
+    dtz = [(position, 3)]
+    for index, (move, child) in enumerate(children):
+        if move == 'b1b2':
+            continue
+        if move == 'b1c2':
+            wdl.append((child, 0))
+            dtz.append((child, 0))
+        else:
+            wdl.append((child, -2))
+            dtz.append((child, -2 - index))
+    write_key_value_table(str(tmpdir.join('KQvK.fentbw')), wdl, 'wdl')
+    write_key_value_table(str(tmpdir.join('KQvK.fentbz')), dtz, 'dtz')
+    # A WDL table without its DTZ counterpart
+    write_key_value_table(str(tmpdir.join('KvK.fentbw')), [(Position('8/8/8/8/8/8/1k6/K7 w - - 0 2'), 0)], 'wdl')
+    return { 'directory': str(tmpdir), 'position': position, 'children': dict(children) }
+
+
+def test_probe_wdl_and_dtz(tables):
+    with Tablebase(tables['directory']) as tablebase:
+        assert tablebase.signatures() == ['KQvK', 'KvK']
+        assert tablebase.probe_wdl(tables['position']) == 2
+        assert tablebase.probe_dtz(tables['position']) == 3
+        assert tablebase.probe_wdl(tables['children']['b1c2']) == 0
+
+
+def test_missing_tables_and_positions_raise(tables):
+    with Tablebase(tables['directory']) as tablebase:
+        with pytest.raises(MissingTableError) as excinfo:
+            tablebase.probe_wdl(Position('8/8/8/8/8/2k5/8/KR6 w - - 0 1'))
+        with pytest.raises(MissingTableError) as excinfo:
+            tablebase.probe_wdl(Position('8/8/8/8/8/2k5/8/K5Q1 w - - 0 1'))
+        with pytest.raises(MissingTableError) as excinfo:
+            tablebase.probe_dtz(Position('8/8/8/8/8/8/1k6/K7 w - - 0 2'))
+
+
+def test_probe_ranks_moves_like_the_api(tables):
+    with Tablebase(tables['directory']) as tablebase:
+        result = tablebase.probe(tables['position'])
+    moves = list(result['moves'].keys())
+    assert result['wdl'] == 2
+    assert sorted(moves) == sorted(tables['position'].legal_moves())
+    assert [result['moves'][move]['wdl'] for move in moves[:-2]] == [-2] * (len(moves) - 2)
+    assert moves[-2:] == ['b1c2', 'b1b2']
+    assert result['moves']['b1b2']['wdl'] is None
+    dtz = [result['moves'][move]['dtz'] for move in moves[:-2]]
+    assert dtz == sorted(dtz, reverse=True)
+
+
+def test_threads_open_each_table_once(tables, monkeypatch):
+    opened = []
+
+    class SlowTable(tablebase_module.KeyValueTable):
+        def __init__(self, path, kind):
+            opened.append(path)
+            time.sleep(0.05)
+            super(SlowTable, self).__init__(path, kind)
+
+    monkeypatch.setattr(tablebase_module, 'KeyValueTable', SlowTable)
+    found = []
+    with Tablebase(tables['directory']) as tablebase:
+        threads = [threading.Thread(target=lambda: found.append(tablebase.probe_wdl(tables['position'])))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert found == [2] * 4
+    assert len(opened) == 1
+
+
+def test_mirrored_material_uses_the_same_tables(tables):
+    mirrored = tables['position'].mirror()
+    assert mirrored.fen == 'kq6/8/2K5/8/8/8/8/8 b - - 0 1'
+    assert mirrored.material_signature == 'KQvK' and mirrored.is_mirrored_material
+    assert mirrored.mirror() == tables['position']
+    with Tablebase(tables['directory']) as tablebase:
+        assert tablebase.probe_wdl(mirrored) == 2
+        assert tablebase.probe_dtz(mirrored) == 3
+        assert tablebase.probe_wdl(tables['children']['b1c2'].mirror()) == 0
+
+
+def test_syzygy_tables_are_probed_with_python_chess(tables, tmpdir, monkeypatch):
+    syzygy = pytest.importorskip('chess.syzygy')
+    probed = []
+
+    class Tables(object):
+        def probe_wdl(self, board):
+            probed.append(board.fen())
+            return 2
+
+        def probe_dtz(self, board):
+            raise syzygy.MissingTableError('no dtz table for KRvK')
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(syzygy, 'open_tablebase', lambda directory: Tables())
+    tmpdir.join('KRvK.rtbw').write_binary(b'')
+    tmpdir.join('KRvK.rtbz').write_binary(b'')
+    with Tablebase(tables['directory']) as tablebase:
+        assert tablebase.signatures() == ['KQvK', 'KRvK', 'KvK']
+        assert tablebase.probe_wdl(Position('8/8/8/8/8/2K5/8/kr6 w - - 0 1')) == 2
+        with pytest.raises(MissingTableError) as excinfo:
+            tablebase.probe_dtz(Position('8/8/8/8/8/2K5/8/kr6 w - - 0 1'))
+        assert tablebase.probe_wdl(tables['position']) == 2
+    assert probed == ['8/8/8/8/8/2K5/8/kr6 w - - 0 1']
+
+
+def test_script_uses_local_tables(tables, capsys):
+    sys.argv = ['', KQK, '--tablebase', tables['directory']]
+    main(parse_args())
+    output = capsys.readouterr()[0]
+    assert "['a1a2', " in output
+
+
+def test_script_batch_mode_writes_json_lines(tables, tmpdir, capsys):
+    path = tmpdir.join('positions.fen')
+    path.write('\n'.join([KQK, 'not a fen', '8/8/8/8/8/2k5/8/KR6 w - - 0 1']) + '\n')
+    sys.argv = ['', '--tablebase', tables['directory'], '--input', str(path), '--output', 'jsonl']
+    main(parse_args())
+    records = [json.loads(line) for line in capsys.readouterr()[0].splitlines()]
+    assert [record['line'] for record in records] == [1, 2, 3]
+    assert records[0]['move'] == 'a1a2'
+    assert records[0]['next_fen'] == Position(KQK).move_piece('a1a2').fen
+    assert 'error' in records[1]
+    assert records[2]['moves'][0] in Position(records[2]['fen']).legal_moves()
+
+
+def test_script_writes_metrics(tables, tmpdir, capsys):
+    path = str(tmpdir.join('metrics.prom'))
+    sys.argv = ['', KQK, '--tablebase', tables['directory'], '--metrics', path]
+    try:
+        main(parse_args())
+    finally:
+        uninstrument()
+    with open(path) as metrics_file:
+        text = metrics_file.read()
+    assert '# TYPE syzygymoves_run_seconds histogram' in text
+    assert 'position_move_seconds_count ' in text
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for Zobrist position keys
+"""
+import pytest
+from fen import Position
+from perft import PERFT_POSITIONS
+from zobrist import hash_position
+
+
+def fresh_key(position):
+    return hash_position(position.bitboards, position.active,
+                         position.castling_availability, position.en_passant)
+
+
+def test_incremental_keys_match_fresh_keys():
+    for name, fen, counts in PERFT_POSITIONS:
+        p = Position(fen)
+        for move in p.legal_moves():
+            child = p.move_piece(move)
+            assert child.zobrist == fresh_key(child)
+            assert child.zobrist == Position(child.fen).zobrist
+            for reply in list(child.legal_moves())[:5]:
+                grandchild = child.move_piece(reply)
+                assert grandchild.zobrist == fresh_key(grandchild)
+
+
+def test_push_and_pop_restore_the_key():
+    p = Position(PERFT_POSITIONS[1][1])
+    key = p.zobrist
+    for move in list(p.legal_moves()):
+        p.push(move)
+        assert p.zobrist == fresh_key(p)
+        p.pop()
+        assert p.zobrist == key
+
+
+def test_transpositions_are_equal_and_hash_alike():
+    start = Position('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1')
+    returned = start
+    for move in ['g1f3', 'g8f6', 'f3g1', 'f6g8']:
+        returned = returned.move_piece(move)
+    assert returned.fen != start.fen
+    assert returned == start
+    assert hash(returned) == hash(start)
+    assert len(set([start, returned, start.move_piece('e2e4')])) == 2
+
+
+def test_keys_cover_side_castling_and_en_passant():
+    base = 'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR %s %s %s 0 1'
+    keys = set([
+        Position(base % ('b', 'KQkq', 'e3')).zobrist,
+        Position(base % ('w', 'KQkq', 'e3')).zobrist,
+        Position(base % ('b', 'KQk', 'e3')).zobrist,
+        Position(base % ('b', 'KQkq', '-')).zobrist,
+    ])
+    assert len(keys) == 4
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""This is the Zobrist hashing module.
+
+A position key is the exclusive or of one random 64-bit number per piece
+on its square, one per castling right held, one for the en passant file
+and one when black is to move, so a move only has to toggle the numbers
+of what it changed.
+"""
+import random
+
+from bitboard import scan
+
+# A fixed seed keeps keys stable across runs so they can be stored
+_generator = random.Random(0x2F0B)
+
+PIECE_KEYS = [[_generator.getrandbits(64) for square_index in range(64)] for piece in range(12)]
+CASTLING_KEYS = dict((right, _generator.getrandbits(64)) for right in 'KQkq')
+EN_PASSANT_KEYS = [_generator.getrandbits(64) for file_index in range(8)]
+BLACK_TO_MOVE_KEY = _generator.getrandbits(64)
+
+
+def castling_key(castling_availability):
+    """Return the key for a FEN castling availability field"""
+    key = 0
+    for right in set(castling_availability):
+        key ^= CASTLING_KEYS.get(right, 0)
+    return key
+
+
+def en_passant_key(en_passant):
+    """Return the key for a FEN en passant target field"""
+    if en_passant == '-':
+        return 0
+    return EN_PASSANT_KEYS[ord(en_passant[0]) - ord('a')]
+
+
+def hash_position(bitboards, active, castling_availability, en_passant):
+    """Compute the key of a position from scratch"""
+    key = 0
+    for piece, bitboard in enumerate(bitboards):
+        piece_keys = PIECE_KEYS[piece]
+        for square_index in scan(bitboard):
+            key ^= piece_keys[square_index]
+    if active == 'b':
+        key ^= BLACK_TO_MOVE_KEY
+    return key ^ castling_key(castling_availability) ^ en_passant_key(en_passant)